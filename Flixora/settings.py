@@ -44,10 +44,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'movies.query_budget.QueryBudgetMiddleware',
+    'movies.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'movies.profile_cache.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,6 +85,35 @@ DATABASES = {
     }
 }
 
+# Réplicas en lecture (movies/db_router.py) : tout alias autre que 'default'.
+# Essai en local avec une copie de la base SQLite :
+#   FLIXORA_SQLITE_REPLICA=db-replica.sqlite3 python manage.py sync_sqlite_replica
+# Un réplica PostgreSQL se déclare de la même façon (ENGINE postgresql, HOST du réplica).
+if os.environ.get('FLIXORA_SQLITE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.environ['FLIXORA_SQLITE_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['movies.db_router.PrimaryReplicaRouter']
+FLIXORA_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Après une écriture, le navigateur lit sur la base principale pendant ce délai (retard des réplicas)
+FLIXORA_PRIMARY_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# En production, utiliser un cache partagé (Redis, Memcached) pour que
+# l'invalidation du catalogue soit vue par tous les processus.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'flixora',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -126,6 +158,44 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Diffusion vidéo : None = FileResponse (sendfile via wsgi.file_wrapper),
+# 'x-accel-redirect' (nginx) ou 'x-sendfile' (Apache/lighttpd)
+FLIXORA_MEDIA_ACCEL = None
+FLIXORA_MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Tâches d'arrière-plan (optimisation des vidéos, etc.)
+FLIXORA_BACKGROUND_TASKS = True
+FLIXORA_TASK_WORKERS = 2
+# Avatars reçus en attente de traitement (None = dossier temporaire du système)
+FLIXORA_AVATAR_TEMP_DIR = None
+
+# Progression de lecture : écritures regroupées en mémoire puis vidées en lot
+FLIXORA_PROGRESS_BUFFER = True
+FLIXORA_PROGRESS_FLUSH_INTERVAL = 5  # secondes
+FLIXORA_PROGRESS_MAX_PENDING = 500
+
+# Cache du catalogue : invalidé par version, la durée ne sert qu'à libérer les anciennes clés
+FLIXORA_CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+# La version du catalogue doit être partagée entre processus ; LocMemCache n'est
+# accepté qu'en développement (un seul processus). Voir movies/catalog_cache.py
+FLIXORA_CATALOG_CACHE_ALLOW_LOCAL = DEBUG
+
+# Utilisateur et profil des sessions authentifiées gardés en cache (secondes)
+FLIXORA_PROFILE_CACHE_TIMEOUT = 60
+# Ce cache exige un backend partagé entre processus ; LocMemCache n'est accepté
+# qu'en développement (un seul processus). Voir movies/profile_cache.py
+FLIXORA_PROFILE_CACHE_ALLOW_LOCAL = DEBUG
+
+# Tendances : demi-vie des événements et durée de cache des rangées
+FLIXORA_TRENDING_HALF_LIFE = 3 * 24 * 60 * 60  # secondes
+FLIXORA_TRENDING_REFRESH = 5 * 60  # secondes
+
+# Budget de requêtes SQL par vue (voir movies/query_budget.py). Le middleware
+# enveloppe chaque requête SQL : désactivé (MiddlewareNotUsed) hors DEBUG et tests
+FLIXORA_QUERY_BUDGET = DEBUG
+FLIXORA_QUERY_BUDGET_HEADER = DEBUG
+FLIXORA_QUERY_BUDGET_STRICT = False
+
 STATIC_URL = '/static/'
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [ BASE_DIR / "static", ]
@@ -5,22 +5,16 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Flixora.settings')
 django.setup()
 
-from django.contrib.auth.models import User
 from movies.models import UserProfile
 
 print("Création des profils pour les utilisateurs existants...")
 
-users_without_profile = []
-for user in User.objects.all():
-    try:
-        profile = user.profile
-    except UserProfile.DoesNotExist:
-        users_without_profile.append(user)
-        UserProfile.objects.create(user=user)
+# Une anti-jointure trouve les utilisateurs sans profil, créés ensuite par lots
+created = UserProfile.objects.backfill(
+    progress=lambda done, total: print(f"  {done}/{total} profil(s) créé(s)")
+)
 
-if users_without_profile:
-    print(f"Profils créés pour {len(users_without_profile)} utilisateurs:")
-    for user in users_without_profile:
-        print(f"  - {user.username}")
+if created:
+    print(f"Profils créés pour {created} utilisateurs.")
 else:
     print("Tous les utilisateurs ont déjà un profil.")
\ No newline at end of file
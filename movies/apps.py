@@ -8,4 +8,6 @@ class MoviesConfig(AppConfig):
     def ready(self):
         # Importez les signaux
         import movies.signals
+        # Vérifications de configuration (manage.py check)
+        import movies.checks
         print("Signals importés")
\ No newline at end of file
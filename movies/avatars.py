@@ -0,0 +1,143 @@
+# movies/avatars.py
+"""
+Avatars traités en arrière-plan et rangés par empreinte de contenu.
+
+1. La vue recopie le fichier téléversé par blocs dans un fichier temporaire
+   en calculant son SHA-256 au passage, puis passe le profil à l'état
+   « pending » et rend la main.
+2. Une tâche d'arrière-plan recadre l'image en carrés de tailles fixes
+   (AVATAR_SIZES), supprime les métadonnées (EXIF, profil ICC) en
+   réencodant en WebP, et enregistre chaque taille sous
+   `avatars/<2 premiers caractères>/<empreinte>.<taille>.webp`.
+3. Deux images identiques ont la même empreinte : la seconde réutilise les
+   fichiers existants, sans nouveau traitement ni nouvel espace disque.
+
+Le champ `avatar` pointe vers la plus grande taille ; le client suit l'état
+du traitement via la vue `avatar_status`.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import UserProfile
+from .profile_cache import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+# Côtés des carrés produits (px) : liste de commentaires, page de profil en 1x et 2x
+AVATAR_SIZES = (64, 150, 300)
+AVATAR_WEBP_OPTIONS = {'quality': 82, 'method': 4}
+AVATAR_PREFIX = 'avatars'
+AVATAR_NAME = re.compile(rf'^{AVATAR_PREFIX}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})\.(?P<size>\d+)\.webp$')
+
+
+def avatar_name(digest, size):
+    return f'{AVATAR_PREFIX}/{digest[:2]}/{digest}.{size}.webp'
+
+
+def is_content_addressed(name):
+    return bool(name and AVATAR_NAME.match(name))
+
+
+def avatar_urls(fieldfile):
+    """URLs de l'avatar par taille ({'150': url, ...}), ou {'original': url} pour un ancien avatar."""
+    if not fieldfile:
+        return {}
+    match = AVATAR_NAME.match(fieldfile.name)
+    if match is None:
+        return {'original': fieldfile.url}
+    return {str(size): fieldfile.storage.url(avatar_name(match['digest'], size)) for size in AVATAR_SIZES}
+
+
+def receive_upload(upload):
+    """
+    Recopie un fichier téléversé dans la zone temporaire, par blocs, en
+    calculant son empreinte. Retourne (chemin temporaire, empreinte SHA-256).
+    """
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(prefix='avatar-', dir=getattr(settings, 'FLIXORA_AVATAR_TEMP_DIR', None))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in upload.chunks():
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def already_processed(digest, storage=None):
+    """Vrai si une image de même contenu a déjà été traitée (toutes les tailles existent)."""
+    storage = storage or default_storage
+    return all(storage.exists(avatar_name(digest, size)) for size in AVATAR_SIZES)
+
+
+def _render(path):
+    """Carrés WebP sans métadonnées, {taille: octets}."""
+    with Image.open(path) as image:
+        image.draft('RGB', (max(AVATAR_SIZES) * 2, max(AVATAR_SIZES) * 2))
+        # L'orientation EXIF est appliquée aux pixels avant de perdre les métadonnées
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    rendered = {}
+    for size in sorted(AVATAR_SIZES, reverse=True):
+        square = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        # Ni `exif` ni `icc_profile` : l'image réencodée ne garde aucune métadonnée
+        square.save(buffer, 'WEBP', **AVATAR_WEBP_OPTIONS)
+        rendered[size] = buffer.getvalue()
+    return rendered
+
+
+def store(path, digest, storage=None):
+    """Produit les tailles d'une image si aucune image identique ne l'a déjà été ; retourne le nom principal."""
+    storage = storage or default_storage
+    if not already_processed(digest, storage):
+        for size, data in _render(path).items():
+            name = avatar_name(digest, size)
+            if not storage.exists(name):
+                storage.save(name, ContentFile(data))
+    return avatar_name(digest, max(AVATAR_SIZES))
+
+
+def discard_legacy_avatar(name, storage=None):
+    """Supprime un ancien avatar propre à un utilisateur (les avatars par empreinte peuvent être partagés)."""
+    if name and not is_content_addressed(name):
+        (storage or default_storage).delete(name)
+
+
+def process_avatar(profile_id, path, digest):
+    """Tâche d'arrière-plan : traite l'image puis l'attribue au profil, sauf si un autre envoi l'a remplacée."""
+    try:
+        try:
+            name = store(path, digest)
+        except Exception:
+            logger.exception("Avatar illisible (profil %s)", profile_id)
+            _finish(profile_id, digest, avatar_status='failed')
+            return
+        _finish(profile_id, digest, avatar=name, avatar_status='ready')
+    finally:
+        os.remove(path)
+
+
+def _finish(profile_id, digest, **changes):
+    profile = UserProfile.objects.filter(pk=profile_id).only('user_id', 'avatar').first()
+    if profile is None:
+        return
+    # Filtré sur l'empreinte : un envoi plus récent l'emporte sur un traitement plus lent
+    if UserProfile.objects.filter(pk=profile_id, avatar_digest=digest).update(**changes):
+        if 'avatar' in changes and profile.avatar.name != changes['avatar']:
+            discard_legacy_avatar(profile.avatar.name)
+        # UPDATE sans signal : invalider le profil mis en cache
+        invalidate_user(profile.user_id)
@@ -0,0 +1,129 @@
+# movies/blob_storage.py
+"""
+Stockage des médias du catalogue par contenu (vidéos, affiches, vignettes).
+
+Chaque fichier enregistré est lu par blocs pendant le calcul de son SHA-256,
+puis rangé une seule fois sous `blobs/<2 premiers caractères>/<empreinte><extension>`.
+Un épisode téléversé deux fois, une bande-annonce ou un générique partagés
+par plusieurs films n'occupent qu'un seul fichier : les lignes qui le
+référencent portent le même nom.
+
+Le nom est toujours l'empreinte du contenu : la réécriture faststart d'une
+vidéo (movies.video_ingest) est rangée comme un nouveau blob et ses
+références y sont reportées ; les déclinaisons d'images
+(`<empreinte>.w320.webp`) restent rattachées au blob source. Les références
+sont comptées dans MediaBlob ; `manage.py gc_media` les recompte et supprime
+les blobs qui ne sont plus référencés.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+BLOB_PREFIX = 'blobs'
+BLOB_NAME = re.compile(rf'^{BLOB_PREFIX}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})(?P<ext>\.[0-9a-z]+)?$')
+TEMP_DIR = f'{BLOB_PREFIX}/tmp'
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_name(digest, ext=''):
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest}{ext.lower()}'
+
+
+def is_blob_name(name):
+    return bool(name and BLOB_NAME.match(name))
+
+
+def file_digest(path):
+    """SHA-256 d'un fichier local, lu par blocs."""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage dont le nom de fichier est l'empreinte du contenu."""
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom final dépend du contenu : pas de recherche d'un nom libre
+        return name
+
+    def _save(self, name, content):
+        temp_dir = self.path(TEMP_DIR)
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+            stored, _ = self._commit(temp_path, blob_name(digest.hexdigest(), os.path.splitext(name)[1]))
+            return stored
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _commit(self, temp_path, name):
+        """Range le fichier temporaire sous `name` sauf si ce contenu est déjà stocké."""
+        path = self.path(name)
+        if os.path.exists(path):
+            # Rafraîchir la date : le ramasse-miettes épargne les blobs récemment réutilisés
+            os.utime(path)
+            return name, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(temp_path, self.file_permissions_mode)
+        # Remplacement atomique : deux enregistrements simultanés du même contenu écrivent les mêmes octets
+        os.replace(temp_path, path)
+        return name, True
+
+    def save_path(self, source, link=False):
+        """
+        Range un fichier local (import du catalogue, réécriture faststart).
+        Copie par défaut : avec `link=True`, un lien physique évite la copie
+        mais partage l'inode, et une modification ultérieure de la source
+        changerait le contenu rangé sous l'empreinte. Réservé aux fichiers
+        qui ne seront plus modifiés. Retourne (nom, 'linked' | 'copied' | 'deduplicated').
+        """
+        name = blob_name(file_digest(source), os.path.splitext(source)[1])
+        path = self.path(name)
+        if os.path.exists(path):
+            os.utime(path)
+            return name, 'deduplicated'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if link:
+            try:
+                os.link(source, path)
+            except FileExistsError:
+                return name, 'deduplicated'
+            except OSError:
+                # Autre système de fichiers : copie
+                pass
+            else:
+                # Le lien garde la date de la source : le ramasse-miettes ne doit pas le croire ancien
+                os.utime(path)
+                return name, 'linked'
+        temp_dir = self.path(TEMP_DIR)
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        os.close(fd)
+        try:
+            # Sans copy2 : la copie prend la date du jour, pas celle de la source
+            shutil.copyfile(source, temp_path)
+            shutil.copymode(source, temp_path)
+            _, created = self._commit(temp_path, name)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name, 'copied' if created else 'deduplicated'
+
+
+_blob_storage = ContentAddressedStorage()
+
+
+def blob_storage():
+    """Stockage des champs vidéo et image du catalogue (appelable référencé par les modèles et les migrations)."""
+    return _blob_storage
@@ -0,0 +1,138 @@
+# movies/catalog_cache.py
+"""
+Cache du catalogue invalidé par numéro de version.
+
+Toutes les clés incluent la version courante du catalogue
+(`catalog:v<N>:...`). Les signaux de Movie et Episode incrémentent cette
+version : les anciennes entrées ne sont plus jamais lues et finissent par
+être évincées, sans qu'il faille deviner une durée de validité.
+
+Deux niveaux sont mis en cache :
+- les données (listes de films d'une rangée ou d'une page) ;
+- les fragments HTML rendus, dont la clé inclut les films de la rangée
+  que l'utilisateur a en favoris, pour que l'état des cœurs reste exact.
+
+Les entrées sont calculées sur la base principale, jamais sur un réplica
+(movies.db_router.primary_reads) : le cache est partagé par tous les
+navigateurs, y compris ceux qui ne sont pas épinglés après une écriture.
+
+La version n'est vue que par les processus qui partagent le cache : avec un
+cache propre au processus (LocMemCache), une modification faite dans un
+processus laisserait les autres servir leurs pages jusqu'à expiration. Le
+cache du catalogue est alors contourné, sauf si
+FLIXORA_CATALOG_CACHE_ALLOW_LOCAL l'autorise (serveur de développement, un
+seul processus) ; la vérification movies.W002 le signale au démarrage.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .db_router import primary_reads
+from .profile_cache import cache_is_process_local
+
+VERSION_KEY = 'catalog:version'
+STATS_KEY = 'catalog:stats:{kind}:{outcome}'
+STATS_KINDS = ('data', 'fragment')
+
+_MISSING = object()
+
+
+def _timeout():
+    # Sert uniquement à libérer les clés orphelines, pas à l'invalidation
+    return getattr(settings, 'FLIXORA_CATALOG_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def catalog_cache_enabled():
+    """Faux avec un cache propre au processus, sauf autorisation explicite."""
+    return getattr(settings, 'FLIXORA_CATALOG_CACHE_ALLOW_LOCAL', False) or not cache_is_process_local()
+
+
+def catalog_version():
+    """Version courante du catalogue."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalide toutes les entrées du catalogue en changeant de version."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, timeout=None)
+
+
+def _key(*parts):
+    return 'catalog:v{}:{}'.format(catalog_version(), ':'.join(str(part) for part in parts))
+
+
+def _count(kind, outcome):
+    key = STATS_KEY.format(kind=kind, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def cached_data(builder, *parts):
+    """Retourne la valeur en cache pour `parts`, ou la calcule avec `builder()`."""
+    if not catalog_cache_enabled():
+        return builder()
+    key = _key('data', *parts)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _count('data', 'misses')
+        # cache.set() dans le bloc : la sérialisation peut évaluer un queryset paresseux
+        with primary_reads():
+            value = builder()
+            cache.set(key, value, timeout=_timeout())
+    else:
+        _count('data', 'hits')
+    return value
+
+
+def cached_fragment(render, *parts):
+    """Retourne le HTML en cache pour `parts`, ou le produit avec `render()`."""
+    if not catalog_cache_enabled():
+        return render()
+    key = _key('fragment', *parts)
+    html = cache.get(key)
+    if html is None:
+        _count('fragment', 'misses')
+        with primary_reads():
+            html = render()
+        cache.set(key, html, timeout=_timeout())
+    else:
+        _count('fragment', 'hits')
+    return html
+
+
+def favorites_key(movies, favorite_ids):
+    """Partie de clé décrivant les films de la liste présents dans les favoris."""
+    return '-'.join(str(movie.pk) for movie in movies if movie.pk in favorite_ids) or 'none'
+
+
+def mark_favorites(movies, favorite_ids):
+    """Positionne `is_fav` sur des films issus du cache (non annotés)."""
+    for movie in movies:
+        movie.is_fav = movie.pk in favorite_ids
+    return movies
+
+
+def stats():
+    """Compteurs de succès / échecs du cache par type d'entrée."""
+    keys = [STATS_KEY.format(kind=kind, outcome=outcome) for kind in STATS_KINDS for outcome in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    result = {'version': catalog_version()}
+    for kind in STATS_KINDS:
+        hits = values.get(STATS_KEY.format(kind=kind, outcome='hits'), 0)
+        misses = values.get(STATS_KEY.format(kind=kind, outcome='misses'), 0)
+        total = hits + misses
+        result[kind] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 3) if total else None,
+        }
+    return result
@@ -0,0 +1,33 @@
+# movies/checks.py
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .profile_cache import cache_is_process_local
+
+
+@register(Tags.caches)
+def check_profile_cache_backend(app_configs, **kwargs):
+    """Le cache utilisateur/profil est ignoré avec un cache propre au processus."""
+    if getattr(settings, 'FLIXORA_PROFILE_CACHE_ALLOW_LOCAL', False) or not cache_is_process_local():
+        return []
+    return [Warning(
+        "Le cache par défaut est propre au processus (LocMemCache) : l'utilisateur et le profil "
+        "ne sont pas mis en cache entre les requêtes.",
+        hint="Configurer un cache partagé (Redis, Memcached) dans CACHES['default'], ou "
+             "FLIXORA_PROFILE_CACHE_ALLOW_LOCAL = True pour un serveur à un seul processus.",
+        id='movies.W001',
+    )]
+
+
+@register(Tags.caches)
+def check_catalog_cache_backend(app_configs, **kwargs):
+    """Le cache du catalogue est contourné avec un cache propre au processus."""
+    if getattr(settings, 'FLIXORA_CATALOG_CACHE_ALLOW_LOCAL', False) or not cache_is_process_local():
+        return []
+    return [Warning(
+        "Le cache par défaut est propre au processus (LocMemCache) : les pages et fragments "
+        "du catalogue ne sont pas mis en cache.",
+        hint="Configurer un cache partagé (Redis, Memcached) dans CACHES['default'], ou "
+             "FLIXORA_CATALOG_CACHE_ALLOW_LOCAL = True pour un serveur à un seul processus.",
+        id='movies.W002',
+    )]
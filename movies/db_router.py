@@ -0,0 +1,139 @@
+# movies/db_router.py
+"""
+Routage lecture / écriture entre la base principale et ses réplicas.
+
+- Les écritures vont toujours sur la base principale ('default').
+- Les lectures des vues marquées `@replica_reads` (pages du catalogue) vont
+  sur un réplica de FLIXORA_DB_REPLICAS, le même pendant toute la requête.
+- Dès qu'une requête écrit, ses lectures suivantes repassent sur la base
+  principale, et le middleware pose un cookie qui épingle le navigateur sur
+  la base principale pendant FLIXORA_PRIMARY_PIN_SECONDS : l'utilisateur relit
+  ses propres écritures même si les réplicas ont du retard.
+- Seules les tables de l'application `movies` sont lues sur les réplicas ;
+  sessions et comptes restent sur la base principale.
+- Les valeurs mises en cache pour tous les navigateurs (movies.catalog_cache)
+  sont lues sur la base principale (`primary_reads`) : un réplica en retard
+  juste après une modification du catalogue ne doit pas remplir le cache
+  avec l'ancienne version pour toute sa durée.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+PIN_COOKIE = 'flixora_primary'
+REPLICA_APPS = frozenset({'movies'})
+
+_routing = contextvars.ContextVar('flixora_db_routing', default=None)
+
+
+class RequestRouting:
+    """État de routage d'une requête HTTP."""
+
+    def __init__(self):
+        self.use_replica = False
+        self.replica = None
+        self.wrote = False
+
+
+def replicas():
+    return list(getattr(settings, 'FLIXORA_DB_REPLICAS', ()))
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or not routing.use_replica or routing.wrote:
+            return PRIMARY
+        if model._meta.app_label not in REPLICA_APPS or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        aliases = replicas()
+        if not aliases:
+            return PRIMARY
+        if routing.replica is None:
+            routing.replica = random.choice(aliases)
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Base principale et réplicas contiennent les mêmes données
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Les réplicas sont des copies : seul le schéma de la base principale est migré
+        return db == PRIMARY
+
+
+def replica_reads(view):
+    """Autorise une vue en lecture seule à lire sur un réplica (GET / HEAD non épinglés)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        routing = _routing.get()
+        if routing is not None and request.method in ('GET', 'HEAD') and PIN_COOKIE not in request.COOKIES:
+            routing.use_replica = True
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """Force les lectures du bloc sur la base principale, même dans une vue `@replica_reads`."""
+    routing = _routing.get()
+    if routing is None:
+        yield
+        return
+    use_replica, routing.use_replica = routing.use_replica, False
+    try:
+        yield
+    finally:
+        routing.use_replica = use_replica
+
+
+class ReplicaRoutingMiddleware:
+    """Ouvre l'état de routage de la requête et épingle le navigateur après une écriture."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting()
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._pin(routing, response)
+
+    async def __acall__(self, request):
+        routing = RequestRouting()
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._pin(routing, response)
+
+    def _pin(self, routing, response):
+        if routing.wrote and replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'FLIXORA_PRIMARY_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
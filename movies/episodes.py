@@ -0,0 +1,78 @@
+# movies/episodes.py
+"""
+Index des épisodes d'une série.
+
+Tous les épisodes d'une série sont chargés en une seule requête (puis mis
+en cache avec le catalogue, donc invalidés à chaque modification d'un
+épisode). L'index fournit le regroupement par saison, la recherche de
+l'épisode courant et la navigation suivant / précédent / saison suivante
+sans nouvel accès à la base.
+"""
+from itertools import groupby
+
+from .catalog_cache import cached_data
+from .models import Episode
+
+
+class EpisodeIndex:
+    """Épisodes d'une série triés par (saison, numéro)."""
+
+    def __init__(self, episodes):
+        self.episodes = list(episodes)
+        self._positions = {episode.pk: i for i, episode in enumerate(self.episodes)}
+        self.seasons = [
+            (season, list(season_episodes))
+            for season, season_episodes in groupby(self.episodes, key=lambda e: e.season_number)
+        ]
+
+    @classmethod
+    def for_series(cls, movie_id):
+        """Index de la série `movie_id` (une requête, puis cache)."""
+        def build():
+            return list(Episode.objects.filter(movie_id=movie_id).order_by('season_number', 'episode_number'))
+        return cls(cached_data(build, 'episodes', movie_id))
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def __iter__(self):
+        return iter(self.episodes)
+
+    def get(self, episode_id):
+        """Épisode d'identifiant `episode_id`, ou None s'il n'appartient pas à la série."""
+        try:
+            position = self._positions.get(int(episode_id))
+        except (TypeError, ValueError):
+            return None
+        return None if position is None else self.episodes[position]
+
+    def current(self, episode_id=None):
+        """Épisode demandé, ou le premier épisode à défaut."""
+        episode = self.get(episode_id) if episode_id else None
+        if episode is None and self.episodes:
+            episode = self.episodes[0]
+        return episode
+
+    def _offset(self, episode, step):
+        position = self._positions.get(episode.pk)
+        if position is None:
+            return None
+        position += step
+        if 0 <= position < len(self.episodes):
+            return self.episodes[position]
+        return None
+
+    def next(self, episode):
+        """Épisode suivant (passe à la saison suivante en fin de saison)."""
+        return self._offset(episode, 1)
+
+    def previous(self, episode):
+        """Épisode précédent."""
+        return self._offset(episode, -1)
+
+    def next_season(self, episode):
+        """Premier épisode de la saison suivante."""
+        for season, season_episodes in self.seasons:
+            if season > episode.season_number:
+                return season_episodes[0]
+        return None
@@ -0,0 +1,292 @@
+# movies/management/commands/bench_concurrency.py
+import asyncio
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from movies.models import Movie
+
+from .bench_views import percentile
+
+# Vues AJAX mesurées : (méthode, données). Les positions de lecture passent par le tampon d'écriture.
+SCENARIOS = {
+    'check_watch_history': ('get', {}),
+    'add_to_watch_history': ('post', {'duration': '120'}),
+    'toggle_favorite': ('post', {}),
+    'add_rating': ('post', {'score': '4'}),
+}
+DEFAULT_SCENARIOS = 'check_watch_history,add_to_watch_history'
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+class Command(BaseCommand):
+    help = ("Compare la tenue en charge des vues AJAX servies en WSGI (pool de threads) et en ASGI "
+            "(boucle d'événements), avec clients lents et latence SQL simulés, à mémoire égale")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=_int_list, default=[10, 50, 200],
+                            help='Nombres de clients simultanés, séparés par des virgules')
+        parser.add_argument('--threads', type=_int_list, default=[4, 8, 16, 32],
+                            help='Tailles du pool de threads WSGI à essayer, séparées par des virgules')
+        parser.add_argument('--requests', type=int, default=400, help='Requêtes par mesure')
+        parser.add_argument('--client-delay', type=float, default=0.05,
+                            help='Durée d\'envoi de la requête par un client lent (secondes)')
+        parser.add_argument('--db-latency', type=float, default=0.002,
+                            help='Latence ajoutée à chaque requête SQL (secondes, base distante simulée)')
+        parser.add_argument('--only', default=DEFAULT_SCENARIOS,
+                            help='Vues mesurées, séparées par des virgules ({})'.format(', '.join(SCENARIOS)))
+        parser.add_argument('--output', help='Fichier JSON où écrire les résultats')
+
+    def handle(self, *args, **options):
+        names = options['only'].split(',')
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError('Scénarios inconnus : {}'.format(', '.join(unknown)))
+        self.requests = self._requests(names)
+        self.client_delay = options['client_delay']
+        self.db_latency = options['db_latency']
+
+        runs = []
+        connection_created.connect(self._add_db_latency)
+        try:
+            for concurrency in options['concurrency']:
+                asgi = self._measure('asgi', concurrency, None, options['requests'])
+                runs.append(asgi)
+                for threads in options['threads']:
+                    runs.append(self._measure('wsgi', concurrency, threads, options['requests']))
+        finally:
+            connection_created.disconnect(self._add_db_latency)
+
+        report = {
+            'options': {key: options[key] for key in ('requests', 'client_delay', 'db_latency')},
+            'scenarios': names,
+            'runs': runs,
+            'equal_memory': self._equal_memory(runs),
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    # ------------------------------------------------------------------ préparation
+
+    def _requests(self, names):
+        user = (
+            User.objects.annotate(n=Count('profile__watch_history'))
+            .filter(n__gt=0).order_by('-n').first()
+        )
+        movie = Movie.objects.annotate(n=Count('ratings')).order_by('-n').first()
+        if user is None or movie is None:
+            raise CommandError('Base vide : lancer d\'abord `manage.py generate_dataset`')
+        client = Client()
+        client.force_login(user)
+        cookie = '{}={}'.format(settings.SESSION_COOKIE_NAME, client.cookies[settings.SESSION_COOKIE_NAME].value)
+        return [
+            (SCENARIOS[name][0].upper(), reverse(name, args=[movie.pk]),
+             urlencode(SCENARIOS[name][1]).encode(), cookie)
+            for name in names
+        ]
+
+    def _add_db_latency(self, sender, connection, **kwargs):
+        # Chaque connexion (une par thread) attend avant chaque requête SQL
+        def wait(execute, sql, params, many, context):
+            time.sleep(self.db_latency)
+            return execute(sql, params, many, context)
+        if self.db_latency:
+            connection.execute_wrappers.append(wait)
+
+    # ------------------------------------------------------------------ mesures
+
+    def _measure(self, server, concurrency, threads, total):
+        timings, errors, elapsed, peak_threads = self._run(server, concurrency, threads, total)
+        # Mémoire : une mesure plus courte sous tracemalloc (qui ralentit l'exécution)
+        tracemalloc.start()
+        self._run(server, concurrency, threads, min(total, concurrency * 2))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings.sort()
+        result = {
+            'server': server,
+            'concurrency': concurrency,
+            'threads': threads,
+            'requests': len(timings),
+            'errors': errors,
+            'throughput_rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'peak_threads': peak_threads,
+            'peak_kb': round(peak / 1024, 1),
+        }
+        label = server if threads is None else f'{server}x{threads}'
+        self.stderr.write(
+            f"{label:<8} c={concurrency:<4} {result['throughput_rps']:>8} req/s "
+            f"p95={result['p95_ms']}ms threads={peak_threads} mem={result['peak_kb']}KB errors={errors}"
+        )
+        return result
+
+    def _run(self, server, concurrency, threads, total):
+        """Clients en boucle fermée : chacun envoie sa requête suivante dès la réponse reçue."""
+        timings = []
+        errors = 0
+        remaining = iter(range(total))
+        sampling = threading.Event()
+        peak_threads = [threading.active_count()]
+
+        def sample():
+            while not sampling.wait(0.005):
+                peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+        async def main():
+            nonlocal errors
+            if server == 'asgi':
+                handler = ASGIHandler()
+                call = lambda request: self._asgi_request(handler, *request)
+            else:
+                handler = WSGIHandler()
+                pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi-worker')
+                loop = asyncio.get_running_loop()
+                call = lambda request: loop.run_in_executor(pool, self._wsgi_request, handler, *request)
+
+            async def client():
+                nonlocal errors
+                for i in remaining:
+                    started = time.perf_counter()
+                    status = await call(self.requests[i % len(self.requests)])
+                    timings.append((time.perf_counter() - started) * 1000)
+                    errors += status >= 400
+
+            try:
+                await asyncio.gather(*(client() for _ in range(concurrency)))
+            finally:
+                if server == 'wsgi':
+                    pool.shutdown()
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            asyncio.run(main())
+        finally:
+            sampling.set()
+            sampler.join()
+        return timings, errors, time.perf_counter() - started, peak_threads[0]
+
+    def _wsgi_request(self, handler, method, path, body, cookie):
+        # Le thread du worker reste occupé pendant que le client envoie sa requête
+        time.sleep(self.client_delay)
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': 'localhost',
+            'HTTP_COOKIE': cookie,
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+        response = handler(environ, lambda value, headers, exc_info=None: status.append(value))
+        try:
+            for _ in response:
+                pass
+        finally:
+            # Déclenche request_finished (fermeture de la connexion SQL)
+            response.close()
+        return int(status[0].split()[0])
+
+    async def _asgi_request(self, handler, method, path, body, cookie):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'localhost'),
+                (b'cookie', cookie.encode()),
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        done = asyncio.Event()
+        received = False
+        status = None
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                # Le client lent n'occupe que la boucle d'événements, pas un thread
+                await asyncio.sleep(self.client_delay)
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        try:
+            await handler(scope, receive, send)
+        finally:
+            done.set()
+        return status
+
+    def _equal_memory(self, runs):
+        """Pour chaque concurrence, le pool WSGI dont la mémoire est la plus proche de celle d'ASGI."""
+        comparison = []
+        for asgi in (run for run in runs if run['server'] == 'asgi'):
+            candidates = [
+                run for run in runs if run['server'] == 'wsgi' and run['concurrency'] == asgi['concurrency']
+            ]
+            if not candidates:
+                continue
+            wsgi = min(candidates, key=lambda run: abs(run['peak_kb'] - asgi['peak_kb']))
+            comparison.append({
+                'concurrency': asgi['concurrency'],
+                'wsgi_threads': wsgi['threads'],
+                'asgi_peak_kb': asgi['peak_kb'],
+                'wsgi_peak_kb': wsgi['peak_kb'],
+                'throughput_ratio': round(asgi['throughput_rps'] / wsgi['throughput_rps'], 2)
+                if wsgi['throughput_rps'] else None,
+                'p95_ratio': round(asgi['p95_ms'] / wsgi['p95_ms'], 2) if wsgi['p95_ms'] else None,
+            })
+        return comparison
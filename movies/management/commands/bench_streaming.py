@@ -0,0 +1,116 @@
+# movies/management/commands/bench_streaming.py
+import http.client
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from movies.streaming import serve_media_file
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _StreamingHandler(WSGIHandler):
+    """Handler WSGI qui sert un seul fichier via serve_media_file."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def get_response(self, request):
+        return serve_media_file(request, self.path, 'video/mp4')
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit et la mémoire par flux de la diffusion vidéo par plages (Range)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=64, help='Taille du fichier vidéo synthétique')
+        parser.add_argument('--chunk-mb', type=int, default=2, help='Taille de chaque requête Range')
+        parser.add_argument('--concurrency', default='1,4,16', help='Nombres de flux simultanés (ex. 1,4,16)')
+        parser.add_argument('--file', help='Fichier existant à utiliser au lieu du fichier synthétique')
+
+    def handle(self, *args, **options):
+        path = options['file'] or self._make_file(options['size_mb'])
+        try:
+            server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietRequestHandler)
+            server.set_app(_StreamingHandler(path))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            port = server.server_address[1]
+
+            results = []
+            for concurrency in [int(c) for c in options['concurrency'].split(',')]:
+                results.append(self._run(port, os.path.getsize(path), options['chunk_mb'] * 1024 * 1024, concurrency))
+            server.shutdown()
+            server.server_close()
+        finally:
+            if not options['file']:
+                os.remove(path)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _make_file(self, size_mb):
+        block = os.urandom(1024 * 1024)
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as f:
+            for _ in range(size_mb):
+                f.write(block)
+        return f.name
+
+    def _client(self, port, size, chunk, errors):
+        # Lecture séquentielle du fichier par plages, comme un lecteur vidéo
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        received = 0
+        for start in range(0, size, chunk):
+            end = min(start + chunk, size) - 1
+            conn.request('GET', '/', headers={'Range': f'bytes={start}-{end}'})
+            response = conn.getresponse()
+            if response.status != 206:
+                errors.append(response.status)
+            while True:
+                data = response.read(64 * 1024)
+                if not data:
+                    break
+                received += len(data)
+        conn.close()
+        return received
+
+    def _run(self, port, size, chunk, concurrency):
+        errors = []
+        received = []
+        tracemalloc.start()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=lambda: received.append(self._client(port, size, chunk, errors)))
+            for _ in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        total_mb = sum(received) / (1024 * 1024)
+        return {
+            'concurrency': concurrency,
+            'file_mb': round(size / (1024 * 1024), 1),
+            'range_requests': concurrency * -(-size // chunk),
+            'errors': len(errors),
+            'seconds': round(elapsed, 3),
+            'throughput_mb_s': round(total_mb / elapsed, 1),
+            'per_stream_mb_s': round(total_mb / elapsed / concurrency, 1),
+            'python_peak_kb_per_stream': round(peak / 1024 / concurrency, 1),
+            'max_rss_growth_kb': rss_after - rss_before,
+        }
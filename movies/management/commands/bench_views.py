@@ -0,0 +1,230 @@
+# movies/management/commands/bench_views.py
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import URLPattern, reverse
+from movies import urls as movie_urls
+from movies.models import Comment, Episode, Favorite, Movie, Rating, UserProfile, WatchHistory
+from movies.pagination import keyset_paginate
+from movies.query_budget import QueryStats, get_budget
+
+# Requêtes exécutées pour chaque nom d'URL : (méthode, arguments, données, connecté).
+# Les arguments sont des clés de `_samples()`. Les POST sont annulés par rollback.
+SCENARIOS = {
+    'movie_list': [('get', (), {}, False), ('get', (), {}, True)],
+    'movie_detail': [('get', ('movie',), {}, True), ('get', ('series',), {}, True)],
+    'stream_movie': [('get', ('video_movie',), {'HTTP_RANGE': 'bytes=0-1048575'}, False)],
+    'stream_episode': [('get', ('video_episode',), {'HTTP_RANGE': 'bytes=0-1048575'}, False)],
+    'episode_navigation': [('get', ('series', 'episode'), {}, False)],
+    'films': [('get', (), {}, True)],
+    'animes': [('get', (), {}, True)],
+    'series': [('get', (), {}, True)],
+    'movies_by_type': [('get', ('video_type',), {}, True)],
+    'movie_cards': [('get', (), {'type': 'film', 'cursor': 'second_page'}, True)],
+    'search_api': [('get', (), {'q': 'nuit ombre'}, False)],
+    'catalog_cache_stats': [('get', (), {}, True)],
+    'login': [('get', (), {}, False)],
+    'register': [('get', (), {}, False)],
+    'logout': [('get', (), {}, True)],
+    'profile': [('get', (), {}, True)],
+    'avatar_status': [('get', (), {}, True)],
+    'update_profile': [('post', (), {'bio': 'Benchmark'}, True)],
+    'toggle_favorite': [('post', ('movie',), {}, True)],
+    'get_favorites': [('get', (), {}, True)],
+    'clear_favorites': [('post', (), {}, True)],
+    'add_comment': [('post', ('movie',), {'content': 'Benchmark'}, True)],
+    'movie_comments': [('get', ('movie',), {}, False)],
+    'add_rating': [('post', ('movie',), {'score': '4'}, True)],
+    'add_to_watch_history': [('post', ('movie',), {'duration': '120'}, True)],
+    'watch_history': [('get', (), {}, True)],
+    'clear_watch_history': [('post', (), {}, True)],
+    'remove_from_history': [('post', ('history',), {}, True)],
+    'check_watch_history': [('get', ('movie',), {}, True)],
+    'movie_status': [('get', (), {'ids': 'status_ids'}, True)],
+}
+# Vues non mesurées (écriture de fichiers sur le stockage)
+SKIPPED = {'update_avatar': 'écrit un fichier image dans MEDIA_ROOT'}
+
+
+def percentile(sorted_values, p):
+    """Percentile par rang le plus proche."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Mesure chaque vue de movies.urls (latence, requêtes SQL, mémoire) et produit une référence JSON comparable"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help='Mesures par scénario')
+        parser.add_argument('--warmup', type=int, default=3, help='Requêtes de chauffe par scénario')
+        parser.add_argument('--cold-cache', action='store_true', help='Vider le cache avant chaque requête')
+        parser.add_argument('--only', help='Noms d\'URL à mesurer, séparés par des virgules')
+        parser.add_argument('--output', help='Fichier JSON où écrire les résultats')
+        parser.add_argument('--compare', help='Référence JSON à comparer (écarts de p50 et de requêtes)')
+
+    def handle(self, *args, **options):
+        samples = self._samples()
+        only = set(options['only'].split(',')) if options['only'] else None
+        names = [
+            pattern.name for pattern in movie_urls.urlpatterns
+            if isinstance(pattern, URLPattern) and pattern.name and (only is None or pattern.name in only)
+        ]
+
+        # Hôte accepté par ALLOWED_HOSTS en mode DEBUG
+        self.client = Client(SERVER_NAME='localhost')
+        self.user = samples['user']
+
+        results = {}
+        for name in names:
+            if name in SKIPPED:
+                results[name] = {'skipped': SKIPPED[name]}
+                continue
+            if name not in SCENARIOS:
+                results[name] = {'skipped': 'aucun scénario défini'}
+                continue
+            missing = [arg for _, args, _, _ in SCENARIOS[name] for arg in args if samples[arg] is None]
+            if missing:
+                results[name] = {'skipped': 'aucune donnée pour : {}'.format(', '.join(missing))}
+                continue
+            results[name] = self._bench(name, samples, options)
+            self.stderr.write(f"{name:<24} p50={results[name]['p50_ms']}ms queries={results[name]['queries']}")
+
+        report = {
+            'dataset': self._dataset(),
+            'options': {key: options[key] for key in ('iterations', 'warmup', 'cold_cache')},
+            'views': results,
+        }
+        if options['compare']:
+            report['comparison'] = self._compare(options['compare'], results)
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def _samples(self):
+        user = (
+            User.objects.annotate(n=Count('profile__watch_history'))
+            .filter(n__gt=0).order_by('-n').first()
+        )
+        if user is None:
+            raise CommandError('Base vide : lancer d\'abord `manage.py generate_dataset`')
+        series = Movie.objects.annotate(n=Count('episodes')).filter(n__gt=0).order_by('-n').first()
+        movie = Movie.objects.annotate(n=Count('ratings')).order_by('-n').first()
+        # Curseur d'une deuxième page pour movie_cards
+        _, second_page = keyset_paginate(Movie.objects.filter(video_type='film'), None, 24)
+        return {
+            'user': user,
+            'movie': movie.pk,
+            'series': series.pk if series else movie.pk,
+            'episode': Episode.objects.filter(movie=series).order_by('-season_number', '-episode_number')
+                                      .values_list('pk', flat=True).first() if series else 0,
+            'history': WatchHistory.objects.filter(user_profile__user=user).values_list('pk', flat=True).first(),
+            # Le jeu généré n'a pas de fichiers vidéo : la diffusion utilise ceux de la base s'il y en a
+            'video_movie': Movie.objects.exclude(video='').values_list('pk', flat=True).first(),
+            'video_episode': Episode.objects.exclude(video='').values_list('pk', flat=True).first(),
+            'video_type': 'film',
+            'second_page': second_page or '',
+            # Une grille de 40 cartes
+            'status_ids': ','.join(str(pk) for pk in Movie.objects.values_list('pk', flat=True)[:40]),
+        }
+
+    def _dataset(self):
+        return {
+            model._meta.model_name: model.objects.count()
+            for model in (Movie, Episode, UserProfile, Rating, Favorite, WatchHistory, Comment)
+        }
+
+    def _request(self, name, method, args, data, samples):
+        data = {key: samples[value] if value in samples else value for key, value in data.items()}
+        headers = {key: data.pop(key) for key in list(data) if key.startswith('HTTP_')}
+        url = reverse(name, args=[samples[arg] for arg in args])
+        if method == 'post':
+            # Les écritures sont annulées pour que chaque itération parte du même état
+            with transaction.atomic():
+                response = self.client.post(url, data, **headers)
+                self._consume(response)
+                transaction.set_rollback(True)
+        else:
+            response = self.client.get(url, data, **headers)
+            self._consume(response)
+        return response
+
+    def _consume(self, response):
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        response.close()
+
+    def _bench(self, name, samples, options):
+        timings = []
+        queries = []
+        statuses = set()
+        stats = None
+        for method, args, data, authenticated in SCENARIOS[name]:
+            for i in range(options['warmup'] + options['iterations']):
+                # Certaines vues (déconnexion) ferment la session : la rouvrir à chaque fois
+                if authenticated:
+                    self.client.force_login(self.user)
+                else:
+                    self.client.logout()
+                if options['cold_cache']:
+                    cache.clear()
+                stats = QueryStats()
+                started = time.perf_counter()
+                with stats.record():
+                    response = self._request(name, method, args, data, samples)
+                elapsed = time.perf_counter() - started
+                if i >= options['warmup']:
+                    timings.append(elapsed * 1000)
+                    queries.append(stats.count)
+                    statuses.add(response.status_code)
+
+            # Mémoire : une requête supplémentaire sous tracemalloc (qui ralentit l'exécution)
+            tracemalloc.start()
+            self._request(name, method, args, data, samples)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'status': sorted(statuses),
+            'requests': len(timings),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'queries': max(queries),
+            'query_budget': get_budget(name),
+            'duplicates': stats.duplicates,
+            'sql_ms': round(stats.time_ms, 2),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def _compare(self, path, results):
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)['views']
+        comparison = {}
+        for name, current in results.items():
+            before = baseline.get(name)
+            if not before or 'p50_ms' not in before or 'p50_ms' not in current:
+                continue
+            comparison[name] = {
+                'p50_ratio': round(current['p50_ms'] / before['p50_ms'], 2) if before['p50_ms'] else None,
+                'p95_ratio': round(current['p95_ms'] / before['p95_ms'], 2) if before['p95_ms'] else None,
+                'queries_delta': current['queries'] - before['queries'],
+                'peak_kb_delta': round(current['peak_kb'] - before['peak_kb'], 1),
+            }
+        return comparison
@@ -0,0 +1,31 @@
+# movies/management/commands/build_recommendations.py
+import time
+
+from django.core.management.base import BaseCommand
+from movies.catalog_cache import bump_catalog_version
+from movies.recommendations import TOP_K, build_similarities
+
+
+class Command(BaseCommand):
+    help = ("Calcule les films similaires (filtrage collaboratif item-item) à partir des favoris, "
+            "évaluations et de l'historique ; par défaut, seuls les films modifiés depuis le dernier calcul")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Tout recalculer (prend aussi en compte les suppressions)')
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='Voisins conservés par film')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Nombre de films écrits par transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        computed, merged = build_similarities(
+            full=options['full'], top_k=options['top_k'], batch_size=options['batch_size'],
+        )
+        if computed or merged:
+            # Les rangées « similaires » sont servies depuis le cache du catalogue
+            bump_catalog_version()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{computed} film(s) recalculé(s), {merged} liste(s) de voisins mise(s) à jour en {elapsed:.1f}s.'
+        ))
@@ -0,0 +1,97 @@
+# movies/management/commands/dedup_media.py
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from movies.blob_storage import BLOB_PREFIX, blob_name, blob_storage, file_digest
+from movies.catalog_cache import bump_catalog_version
+from movies.models import MediaBlob, blob_reference_fields
+from movies.thumbnails import DERIVATIVE_FORMATS, DERIVATIVE_WIDTHS, derivative_name
+
+
+def _mb(size):
+    return f'{size / (1024 * 1024):,.1f} Mo'
+
+
+class Command(BaseCommand):
+    help = ("Range les vidéos, affiches et vignettes existantes dans le stockage par contenu "
+            "(un fichier par contenu distinct), puis affiche l'espace disque économisé")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Calculer les empreintes et l\'économie attendue sans rien modifier')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = blob_storage()
+
+        # Noms hors stockage par contenu et champs qui les référencent
+        legacy, references = {}, 0
+        for model, field in blob_reference_fields():
+            rows = (
+                model._default_manager.exclude(**{f'{field}__startswith': f'{BLOB_PREFIX}/'})
+                .exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field).annotate(n=Count('pk')).order_by()
+            )
+            for name, count in rows:
+                legacy.setdefault(name, []).append((model, field))
+                references += count
+
+        inodes, digests = {}, {}
+        missing = 0
+        for name in sorted(legacy):
+            path = storage.path(name)
+            if not os.path.isfile(path):
+                missing += 1
+                continue
+            stat = os.stat(path)
+            # Les fichiers liés physiquement (import du catalogue) n'occupent le disque qu'une fois
+            inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+            if dry_run:
+                blob = blob_name(file_digest(path), os.path.splitext(name)[1])
+            else:
+                blob = self._convert(storage, name, legacy[name])
+            digests[blob] = stat.st_size
+
+        if not dry_run:
+            MediaBlob.objects.recount()
+            # Les fragments en cache contiennent les anciens noms de fichiers
+            bump_catalog_version()
+
+        before, after = sum(inodes.values()), sum(digests.values())
+        verb = 'à ranger' if dry_run else 'rangé(s)'
+        self.stdout.write(
+            f'{len(legacy) - missing} fichier(s) {verb} ({references} référence(s), {missing} introuvable(s)) : '
+            f'{len(digests)} contenu(s) distinct(s), {_mb(before)} -> {_mb(after)}, '
+            f'{_mb(before - after)} économisé(s)'
+        )
+        usage = MediaBlob.objects.disk_usage()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stockage par contenu : {usage['blobs']} blob(s) pour {usage['references']} référence(s), "
+            f"{_mb(usage['physical'])} stocké(s) pour {_mb(usage['logical'])} référencé(s) "
+            f"({_mb(usage['logical'] - usage['physical'])} économisé(s))"
+        ))
+
+    def _convert(self, storage, name, fields):
+        """Range le fichier par contenu, met à jour les lignes qui le référencent et retourne son nouveau nom."""
+        path = storage.path(name)
+        # Lien physique : l'ancien nom est supprimé plus bas, rien ne modifiera plus l'inode par ce chemin
+        stored, _ = storage.save_path(path, link=True)
+        with transaction.atomic():
+            for model, field in fields:
+                # update() : pas de signal, donc pas de nouveau traitement du fichier
+                model._default_manager.filter(**{field: name}).update(**{field: stored})
+        # Les déclinaisons déjà générées suivent le fichier
+        for width in DERIVATIVE_WIDTHS:
+            for fmt in DERIVATIVE_FORMATS:
+                source = storage.path(derivative_name(name, width, fmt))
+                if not os.path.exists(source):
+                    continue
+                target = storage.path(derivative_name(stored, width, fmt))
+                if os.path.exists(target):
+                    os.remove(source)
+                else:
+                    os.replace(source, target)
+        os.remove(path)
+        return stored
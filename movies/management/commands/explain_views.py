@@ -0,0 +1,66 @@
+# movies/management/commands/explain_views.py
+import json
+from collections import Counter
+
+from django.core.management.base import CommandError
+from django.test import Client
+from django.urls import URLPattern
+from movies import urls as movie_urls
+from movies.query_plans import capture, plan_issues
+
+from .bench_views import SCENARIOS, SKIPPED, Command as BenchViewsCommand
+
+
+class Command(BenchViewsCommand):
+    help = ("Capture les requêtes SQL de chaque vue de movies.urls sur le jeu de données, "
+            "demande leur plan à la base et signale les parcours complets et les tris temporaires")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', help='Noms d\'URL à analyser, séparés par des virgules')
+        parser.add_argument('--output', help='Fichier JSON où écrire le rapport')
+        parser.add_argument('--fail', action='store_true',
+                            help='Échouer (code de sortie non nul) si un plan est signalé')
+
+    def handle(self, *args, **options):
+        samples = self._samples()
+        only = set(options['only'].split(',')) if options['only'] else None
+        names = [
+            pattern.name for pattern in movie_urls.urlpatterns
+            if isinstance(pattern, URLPattern) and pattern.name in SCENARIOS and pattern.name not in SKIPPED
+            and (only is None or pattern.name in only)
+        ]
+        # Hôte accepté par ALLOWED_HOSTS en mode DEBUG
+        self.client = Client(SERVER_NAME='localhost')
+        self.user = samples['user']
+
+        report = {}
+        for name in names:
+            if any(samples[arg] is None for _, args, _, _ in SCENARIOS[name] for arg in args):
+                continue
+            with capture() as captured:
+                for method, args, data, authenticated in SCENARIOS[name]:
+                    if authenticated:
+                        self.client.force_login(self.user)
+                    else:
+                        self.client.logout()
+                    self._request(name, method, args, data, samples)
+            issues = plan_issues(captured)
+            report[name] = {
+                'queries': len({sql for _, sql, _ in captured.queries}),
+                'issues': [issue._asdict() for issue in issues],
+            }
+            summary = Counter(issue.kind for issue in issues)
+            self.stderr.write(f"{name:<24} requêtes={report[name]['queries']} "
+                              f"scans={summary['scan']} tris={summary['sort']}")
+            for issue in issues:
+                self.stderr.write(f"    {issue.kind}: {issue.detail}\n        {issue.sql[:200]}")
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        flagged = [name for name, result in report.items() if result['issues']]
+        if options['fail'] and flagged:
+            raise CommandError('Plans signalés : {}'.format(', '.join(flagged)))
@@ -0,0 +1,92 @@
+# movies/management/commands/gc_media.py
+import os
+import re
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from movies.avatars import AVATAR_NAME, AVATAR_PREFIX, is_content_addressed
+from movies.blob_storage import BLOB_NAME, BLOB_PREFIX, TEMP_DIR, blob_storage
+from movies.models import MediaBlob, UserProfile
+
+DIGEST = re.compile(r'[0-9a-f]{64}')
+
+
+class Command(BaseCommand):
+    help = ("Recompte les références des médias stockés par contenu et supprime les fichiers qui ne sont "
+            "plus référencés (blobs et leurs déclinaisons, avatars par empreinte)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=24 * 60 * 60,
+                            help='Âge minimal (secondes) d\'un fichier non référencé avant suppression : '
+                                 'protège les téléversements dont la ligne n\'est pas encore enregistrée')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Lister ce qui serait supprimé sans rien supprimer (les compteurs sont tout de même corrigés)')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.cutoff = time.time() - options['grace']
+        self.deleted = self.freed = 0
+
+        # Les compteurs tenus par save() ne voient pas les update() et les écritures en lot
+        repaired = MediaBlob.objects.recount()
+        referenced = {
+            BLOB_NAME.match(name)['digest']
+            for name in MediaBlob.objects.filter(refcount__gt=0).values_list('name', flat=True)
+        }
+        storage = blob_storage()
+        self._sweep(storage.path(BLOB_PREFIX), referenced, skip=storage.path(TEMP_DIR))
+        self._sweep_temp(storage.path(TEMP_DIR))
+        if not self.dry_run:
+            orphans = MediaBlob.objects.filter(refcount=0).values_list('name', flat=True)
+            MediaBlob.objects.filter(name__in=[name for name in orphans if not storage.exists(name)]).delete()
+
+        # Avatars : une même image peut servir à plusieurs profils, ou être en cours de traitement
+        avatar_digests = set(UserProfile.objects.exclude(avatar_digest='').values_list('avatar_digest', flat=True))
+        avatar_digests.update(
+            AVATAR_NAME.match(name)['digest']
+            for name in UserProfile.objects.filter(avatar__startswith=f'{AVATAR_PREFIX}/')
+            .values_list('avatar', flat=True).distinct().order_by()
+            if is_content_addressed(name)
+        )
+        self._sweep(default_storage.path(AVATAR_PREFIX), avatar_digests)
+
+        verb = 'à supprimer' if self.dry_run else 'supprimé(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f'{repaired} compteur(s) corrigé(s), {self.deleted} fichier(s) {verb} '
+            f'({self.freed / (1024 * 1024):,.1f} Mo)'
+        ))
+
+    def _sweep(self, root, referenced, skip=None):
+        """
+        Supprime les fichiers de `root` nommés par une empreinte (blob ou
+        déclinaison : `<empreinte>.<suffixe>`) qui n'est pas référencée.
+        Les autres fichiers (anciens avatars propres à un utilisateur) sont ignorés.
+        """
+        for directory, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if os.path.join(directory, name) != skip]
+            for filename in filenames:
+                digest = filename.split('.', 1)[0]
+                if DIGEST.fullmatch(digest) and digest not in referenced:
+                    self._remove(os.path.join(directory, filename))
+
+    def _sweep_temp(self, root):
+        """Fichiers temporaires abandonnés (enregistrement interrompu)."""
+        if not os.path.isdir(root):
+            return
+        for filename in os.listdir(root):
+            self._remove(os.path.join(root, filename))
+
+    def _remove(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        if stat.st_mtime > self.cutoff:
+            return
+        if self.dry_run:
+            self.stdout.write(f'  {path}')
+        else:
+            os.remove(path)
+        self.deleted += 1
+        self.freed += stat.st_size
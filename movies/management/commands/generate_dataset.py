@@ -0,0 +1,285 @@
+# movies/management/commands/generate_dataset.py
+import bisect
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from movies.catalog_cache import bump_catalog_version
+from movies.models import Comment, Episode, Favorite, Movie, Rating, UserProfile, WatchHistory
+
+# Volumes par défaut (multipliés par --scale)
+DEFAULT_SIZES = {
+    'movies': 100_000,
+    'users': 200_000,
+    'ratings': 2_000_000,
+    'favorites': 1_000_000,
+    'history': 2_000_000,
+    'comments': 500_000,
+}
+
+USERNAME_PREFIX = 'bench_'
+# Part des films par type et nombre d'épisodes des séries / animes
+VIDEO_TYPE_WEIGHTS = {'film': 0.6, 'serie': 0.25, 'anime': 0.15}
+EPISODES_PER_SEASON = (8, 24)
+SEASONS = (1, 6)
+WORDS = (
+    'nuit ombre retour dernier secret empire voyage cité perdu silence feu étoile '
+    'mémoire chasseur royaume océan tempête légende frontière miroir héritage'
+).split()
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    """Désactive auto_now / auto_now_add pour insérer des dates réparties dans le temps."""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = "Génère un jeu de données synthétique reproductible (insertions groupées) pour les mesures de performance"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help='Graine du générateur aléatoire')
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Facteur appliqué aux volumes par défaut (ex. 0.01 pour un essai rapide)')
+        for name, size in DEFAULT_SIZES.items():
+            parser.add_argument(f'--{name}', type=int, help=f'Nombre de lignes {name} (défaut : {size:,} x scale)')
+        parser.add_argument('--long-series', type=int, default=5,
+                            help='Nombre de séries très longues (plusieurs milliers d\'épisodes)')
+        parser.add_argument('--long-series-episodes', type=int, default=2000,
+                            help='Nombre d\'épisodes de chaque série très longue')
+        parser.add_argument('--days', type=int, default=730, help='Période couverte par les dates générées')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Taille des insertions groupées')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = options['days']
+        sizes = {
+            name: options[name] if options[name] is not None else int(size * options['scale'])
+            for name, size in DEFAULT_SIZES.items()
+        }
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError('Un jeu de données généré existe déjà dans cette base')
+
+        started = time.perf_counter()
+        movie_ids, series_ids = self._movies(sizes['movies'])
+        episodes = self._episodes(series_ids, options['long_series'], options['long_series_episodes'])
+        profile_ids = self._users(sizes['users'])
+        popularity = self._popularity(movie_ids)
+
+        counts = {'movies': len(movie_ids), 'episodes': episodes, 'users': len(profile_ids)}
+        counts['ratings'] = self._pairs(
+            Rating, profile_ids, popularity, sizes['ratings'], self._rating, ('created_at', 'updated_at')
+        )
+        counts['favorites'] = self._pairs(
+            Favorite, profile_ids, popularity, sizes['favorites'], self._favorite, ('added_at',)
+        )
+        counts['history'] = self._pairs(
+            WatchHistory, profile_ids, popularity, sizes['history'], self._history, ('watched_at',)
+        )
+        counts['comments'] = self._comments(profile_ids, popularity, sizes['comments'])
+
+        # Les insertions groupées ne déclenchent pas les signaux : reconstruire les données dérivées
+        self.stdout.write('Reconstruction des agrégats, de l\'index de recherche, des recommandations et des tendances...')
+        call_command('rebuild_rating_stats', stdout=self.stdout)
+        call_command('rebuild_profile_stats', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        call_command('build_recommendations', '--full', stdout=self.stdout)
+        call_command('update_trending', '--rebuild', stdout=self.stdout)
+        bump_catalog_version()
+
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{count:,} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Jeu de données généré en {elapsed:.1f}s : {summary}'))
+
+    # ------------------------------------------------------------------ utilitaires
+
+    def _date(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.days * 86400))
+
+    def _title(self, words=3):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words)).capitalize()
+
+    def _bulk_create(self, model, objects, timestamps=()):
+        with explicit_timestamps(model, *timestamps), transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return len(objects)
+
+    def _new_ids(self, model, last_id):
+        return list(model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True))
+
+    def _last_id(self, model):
+        return model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    # ------------------------------------------------------------------ catalogue
+
+    def _movies(self, total):
+        self.stdout.write(f'Films : {total:,}')
+        categories = [value for value, _ in Movie.CATEGORY_CHOICES]
+        video_types = list(VIDEO_TYPE_WEIGHTS)
+        weights = list(VIDEO_TYPE_WEIGHTS.values())
+        last_id = self._last_id(Movie)
+
+        for start in range(0, total, self.batch_size):
+            batch = []
+            for _ in range(min(self.batch_size, total - start)):
+                created = self._date()
+                batch.append(Movie(
+                    title=self._title(),
+                    description=' '.join(self.rng.choice(WORDS) for _ in range(30)),
+                    thumbnail='', video='',
+                    release_year=self.rng.randint(1960, self.now.year),
+                    duration=self.rng.randint(20, 180),
+                    director=self._title(2),
+                    video_type=self.rng.choices(video_types, weights)[0],
+                    category=self.rng.choice(categories),
+                    created_at=created, updated_at=created,
+                ))
+            self._bulk_create(Movie, batch, ('created_at', 'updated_at'))
+
+        rows = Movie.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'video_type')
+        movie_ids = [pk for pk, _ in rows]
+        series_ids = [pk for pk, video_type in rows if video_type != 'film']
+        return movie_ids, series_ids
+
+    def _episodes(self, series_ids, long_series, long_series_episodes):
+        self.stdout.write(f'Épisodes pour {len(series_ids):,} séries / animes')
+        batch = []
+        total = 0
+        for i, movie_id in enumerate(series_ids):
+            if i < long_series:
+                seasons = [(season, 100) for season in range(1, -(-long_series_episodes // 100) + 1)]
+            else:
+                seasons = [(season, self.rng.randint(*EPISODES_PER_SEASON))
+                           for season in range(1, self.rng.randint(*SEASONS) + 1)]
+            remaining = long_series_episodes if i < long_series else None
+            for season, count in seasons:
+                if remaining is not None:
+                    count = min(count, remaining)
+                    remaining -= count
+                for number in range(1, count + 1):
+                    created = self._date()
+                    batch.append(Episode(
+                        movie_id=movie_id, season_number=season, episode_number=number,
+                        title=self._title(), video='', duration=self.rng.randint(20, 60),
+                        created_at=created, updated_at=created,
+                    ))
+            if len(batch) >= self.batch_size:
+                total += self._bulk_create(Episode, batch, ('created_at', 'updated_at'))
+                batch = []
+        total += self._bulk_create(Episode, batch, ('created_at', 'updated_at'))
+        return total
+
+    # ------------------------------------------------------------------ utilisateurs
+
+    def _users(self, total):
+        self.stdout.write(f'Utilisateurs : {total:,}')
+        # Un seul hachage pour tous les comptes : le hachage domine sinon la génération
+        password = make_password('bench-password')
+        last_user_id = self._last_id(User)
+        last_profile_id = self._last_id(UserProfile)
+
+        for start in range(0, total, self.batch_size):
+            users = [
+                User(username=f'{USERNAME_PREFIX}{start + i}', email=f'{USERNAME_PREFIX}{start + i}@example.com',
+                     password=password, date_joined=self._date())
+                for i in range(min(self.batch_size, total - start))
+            ]
+            self._bulk_create(User, users)
+
+        # bulk_create ne déclenche pas post_save : les profils sont créés ici
+        user_ids = self._new_ids(User, last_user_id)
+        for start in range(0, len(user_ids), self.batch_size):
+            self._bulk_create(UserProfile, [
+                UserProfile(user_id=user_id, bio='') for user_id in user_ids[start:start + self.batch_size]
+            ])
+        return self._new_ids(UserProfile, last_profile_id)
+
+    # ------------------------------------------------------------------ interactions
+
+    def _popularity(self, movie_ids):
+        # Popularité de type Zipf : quelques films concentrent la majorité des interactions
+        cumulative = []
+        total = 0.0
+        for rank in range(1, len(movie_ids) + 1):
+            total += 1 / rank ** 0.8
+            cumulative.append(total)
+        shuffled = movie_ids[:]
+        self.rng.shuffle(shuffled)
+        return shuffled, cumulative
+
+    def _sample_movies(self, popularity, count):
+        movie_ids, cumulative = popularity
+        count = min(count, len(movie_ids))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.add(movie_ids[bisect.bisect(cumulative, self.rng.random() * cumulative[-1])])
+        return chosen
+
+    def _pairs(self, model, profile_ids, popularity, total, factory, timestamps):
+        """Insère `total` lignes (profil, film) uniques, réparties entre les utilisateurs."""
+        self.stdout.write(f'{model._meta.verbose_name_plural} : {total:,}')
+        if not profile_ids or not popularity[0]:
+            return 0
+        mean = total / len(profile_ids)
+        created = 0
+        batch = []
+        for profile_id in profile_ids:
+            if created + len(batch) >= total:
+                break
+            count = min(int(self.rng.expovariate(1 / mean)) if mean else 0, total - created - len(batch))
+            for movie_id in self._sample_movies(popularity, count):
+                batch.append(factory(profile_id, movie_id))
+            if len(batch) >= self.batch_size:
+                created += self._bulk_create(model, batch, timestamps)
+                batch = []
+        return created + self._bulk_create(model, batch, timestamps)
+
+    def _rating(self, profile_id, movie_id):
+        date = self._date()
+        return Rating(user_profile_id=profile_id, movie_id=movie_id,
+                      score=self.rng.choices((1, 2, 3, 4, 5), (5, 8, 20, 35, 32))[0],
+                      created_at=date, updated_at=date)
+
+    def _favorite(self, profile_id, movie_id):
+        return Favorite(user_profile_id=profile_id, movie_id=movie_id, added_at=self._date())
+
+    def _history(self, profile_id, movie_id):
+        completed = self.rng.random() < 0.4
+        return WatchHistory(user_profile_id=profile_id, movie_id=movie_id, watched_at=self._date(),
+                            duration_watched=self.rng.randint(60, 7200), completed=completed)
+
+    def _comments(self, profile_ids, popularity, total):
+        self.stdout.write(f'Commentaires : {total:,}')
+        if not profile_ids or not popularity[0]:
+            return 0
+        created = 0
+        for start in range(0, total, self.batch_size):
+            batch = []
+            for _ in range(min(self.batch_size, total - start)):
+                date = self._date()
+                movie_id, = self._sample_movies(popularity, 1)
+                batch.append(Comment(
+                    user_profile_id=self.rng.choice(profile_ids), movie_id=movie_id,
+                    content=' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(5, 40))),
+                    is_approved=self.rng.random() < 0.95,
+                    created_at=date, updated_at=date,
+                ))
+            created += self._bulk_create(Comment, batch, ('created_at', 'updated_at'))
+        return created
@@ -0,0 +1,67 @@
+# movies/management/commands/generate_thumbnails.py
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from movies.models import Movie, Episode, UserProfile
+from movies.thumbnails import DERIVATIVE_WIDTHS, derivative_name, generate_derivatives
+
+
+def _generate(name, storage):
+    # Exécuté dans un processus du pool : le décodage/encodage Pillow est lié au CPU
+    try:
+        return name, generate_derivatives(name, storage), None
+    except Exception as e:
+        return name, 0, str(e)
+
+
+class Command(BaseCommand):
+    help = "Génère les déclinaisons WebP/JPEG des affiches, vignettes et avatars existants"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Nombre de processus de traitement')
+        parser.add_argument('--force', action='store_true',
+                            help='Régénérer même si les déclinaisons existent déjà')
+
+    def handle(self, *args, **options):
+        # Nom -> stockage du champ : les affiches et vignettes sont dans le stockage par contenu
+        names = {}
+        for model, field in ((Movie, 'thumbnail'), (Episode, 'thumbnail'), (UserProfile, 'avatar')):
+            storage = model._meta.get_field(field).storage
+            for name in (
+                model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True).distinct()
+            ):
+                names.setdefault(name, storage)
+        if not options['force']:
+            names = {
+                name: storage for name, storage in names.items()
+                if not storage.exists(derivative_name(name, DERIVATIVE_WIDTHS[0], 'webp'))
+            }
+
+        self.stdout.write(f'{len(names)} image(s) à traiter avec {options["workers"]} processus...')
+        # Ne pas transmettre les connexions ouvertes aux processus enfants
+        connections.close_all()
+
+        started = time.perf_counter()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(_generate, name, names[name]) for name in sorted(names)]
+            for future in as_completed(futures):
+                name, written, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'  {name} : {error}')
+                else:
+                    done += 1
+                if (done + failed) % 100 == 0:
+                    self.stdout.write(f'  {done + failed}/{len(names)}')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{done} image(s) déclinée(s), {failed} échec(s) en {elapsed:.1f} s.'
+        ))
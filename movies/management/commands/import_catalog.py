@@ -0,0 +1,339 @@
+# movies/management/commands/import_catalog.py
+import csv
+import json
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from movies import search
+from movies.blob_storage import is_blob_name
+from movies.catalog_cache import bump_catalog_version
+from movies.models import Episode, MediaBlob, Movie
+from movies.tasks import run_in_background
+from movies.thumbnails import generate_derivatives
+from movies.video_ingest import ingest_video
+
+MOVIE_FIELDS = ('description', 'director', 'duration', 'category', 'thumbnail', 'video')
+EPISODE_FIELDS = ('title', 'description', 'duration', 'release_year', 'thumbnail', 'video')
+INT_FIELDS = ('release_year', 'duration', 'season', 'episode', 'series_year')
+VIDEO_TYPES = {value for value, _ in Movie.VIDEO_TYPE_CHOICES}
+CATEGORIES = {value for value, _ in Movie.CATEGORY_CHOICES}
+
+
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Importe un catalogue (films, séries, épisodes) depuis un manifeste CSV ou JSONL lu en flux, "
+            "par lots transactionnels, avec reprise après échec")
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', help='Fichier .csv ou .jsonl (une ligne par film / série / épisode)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Format (déduit de l\'extension par défaut)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Lignes par transaction')
+        parser.add_argument('--media-dir', help='Dossier de base des chemins de fichiers (défaut : dossier du manifeste)')
+        parser.add_argument('--restart', action='store_true', help='Ignorer le point de reprise et tout réimporter')
+        parser.add_argument('--max-errors', type=int, default=100, help='Nombre de lignes invalides tolérées')
+        parser.add_argument('--link-media', action='store_true',
+                            help='Lier physiquement les fichiers au lieu de les copier (même système de fichiers). '
+                                 'Les fichiers source ne doivent plus être modifiés ensuite : ils partagent '
+                                 'leur contenu avec le blob rangé sous leur empreinte')
+        parser.add_argument('--skip-media-processing', action='store_true',
+                            help='Ne pas lancer faststart / miniatures pour les fichiers importés')
+
+    def handle(self, *args, **options):
+        path = options['manifest']
+        if not os.path.isfile(path):
+            raise CommandError(f'Manifeste introuvable : {path}')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.media_dir = os.path.abspath(options['media_dir'] or os.path.dirname(os.path.abspath(path)))
+        self.process_media = not options['skip_media_processing']
+        self.link_media = options['link_media']
+        self.max_errors = options['max_errors']
+        self.checkpoint_path = path + '.checkpoint'
+        self.stats = {'movies_created': 0, 'movies_updated': 0, 'episodes': 0,
+                      'files_linked': 0, 'files_copied': 0, 'files_deduplicated': 0, 'files_in_place': 0,
+                      'errors': 0}
+
+        skip = 0 if options['restart'] else self._load_checkpoint(path)
+        if skip:
+            self.stdout.write(f'Reprise après la ligne {skip:,} du manifeste')
+
+        started = time.perf_counter()
+        done = skip
+        batch = []
+        for position, line_no, row in self._rows(path, fmt):
+            if position < skip:
+                continue
+            try:
+                data = self._parse(row)
+            except RowError as e:
+                self._error(line_no, e)
+            else:
+                # Numéro de ligne pour les erreurs détectées à l'écriture du lot (série introuvable)
+                data['_line'] = line_no
+                batch.append(data)
+            done = position + 1
+            if len(batch) >= options['batch_size']:
+                self._flush(batch)
+                # Point de reprise : toutes les lignes jusqu'ici sont validées en base
+                self._save_checkpoint(path, done)
+                self._progress(done - skip, started)
+                batch = []
+        self._flush(batch)
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        elapsed = time.perf_counter() - started
+        rate = (done - skip) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{done - skip:,} ligne(s) en {elapsed:.1f}s ({rate:,.0f} lignes/s) : '
+            + ', '.join(f'{key}={value:,}' for key, value in self.stats.items())
+        ))
+
+    # ------------------------------------------------------------------ lecture
+
+    def _rows(self, path, fmt):
+        """Parcourt le manifeste ligne par ligne : (position, numéro de ligne, dict)."""
+        with open(path, newline='', encoding='utf-8') as f:
+            if fmt == 'csv':
+                reader = csv.DictReader(f)
+                for position, row in enumerate(reader):
+                    yield position, reader.line_num, row
+            else:
+                position = 0
+                for line_no, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        row = {'_invalid': 'JSON invalide'}
+                    else:
+                        if not isinstance(row, dict):
+                            # Liste, chaîne ou nombre : JSON valide mais pas une ligne de catalogue
+                            row = {'_invalid': 'objet JSON attendu'}
+                    yield position, line_no, row
+                    position += 1
+
+    def _parse(self, row):
+        if '_invalid' in row:
+            raise RowError(row['_invalid'])
+        data = {key: (value.strip() if isinstance(value, str) else value) for key, value in row.items() if key}
+        for field in INT_FIELDS:
+            if data.get(field) in ('', None):
+                data[field] = None
+            else:
+                try:
+                    data[field] = int(data[field])
+                except (TypeError, ValueError):
+                    raise RowError(f'{field} doit être un entier')
+        if not data.get('title') and data.get('type') != 'episode':
+            raise RowError('title est obligatoire')
+
+        kind = data.get('type') or 'film'
+        if kind == 'episode':
+            if not data.get('series') or data.get('episode') is None:
+                raise RowError('un épisode doit indiquer series et episode')
+            data['season'] = data['season'] or 1
+            data['title'] = data.get('title') or f"Épisode {data['episode']}"
+        elif kind not in VIDEO_TYPES:
+            raise RowError(f'type inconnu : {kind}')
+        if data.get('category') and data['category'] not in CATEGORIES:
+            raise RowError(f"catégorie inconnue : {data['category']}")
+        for field in ('thumbnail', 'video'):
+            if data.get(field) and not os.path.isfile(os.path.join(self.media_dir, data[field])):
+                raise RowError(f'fichier introuvable : {data[field]}')
+        data['type'] = kind
+        return data
+
+    # ------------------------------------------------------------------ écriture
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        movies = [data for data in batch if data['type'] != 'episode']
+        episodes = [data for data in batch if data['type'] == 'episode']
+        with transaction.atomic():
+            touched = self._upsert_movies(movies)
+            touched |= self._upsert_episodes(episodes)
+            for movie in Movie.objects.filter(pk__in=touched):
+                search.index_movie(movie)
+        bump_catalog_version()
+
+    def _movie_key(self, title, video_type, year):
+        return (title, video_type, year)
+
+    def _upsert_movies(self, rows):
+        if not rows:
+            return set()
+        # La dernière ligne l'emporte pour une même clé (titre, type, année)
+        by_key = {self._movie_key(d['title'], d['type'], d.get('release_year')): d for d in rows}
+        existing = {
+            self._movie_key(movie.title, movie.video_type, movie.release_year): movie
+            for movie in Movie.objects.filter(title__in={key[0] for key in by_key})
+        }
+        to_create, to_update, media = [], [], []
+        for key, data in by_key.items():
+            movie = existing.get(key)
+            if movie is None:
+                movie = Movie(title=key[0], video_type=key[1], release_year=key[2])
+            changed = self._assign(movie, data, MOVIE_FIELDS, media)
+            if movie.pk is None:
+                to_create.append(movie)
+            elif changed:
+                to_update.append(movie)
+
+        # Avant les écritures : une ligne insérée n'est plus « nouvelle » ensuite
+        references = self._reference_changes(to_create + to_update)
+        Movie.objects.bulk_create(to_create)
+        if to_update:
+            Movie.objects.bulk_update(to_update, list(MOVIE_FIELDS))
+        MediaBlob.objects.adjust(references)
+        self.stats['movies_created'] += len(to_create)
+        self.stats['movies_updated'] += len(to_update)
+        self._schedule_media(media)
+        return {movie.pk for movie in to_create + to_update}
+
+    def _upsert_episodes(self, rows):
+        if not rows:
+            return set()
+        series = self._resolve_series(rows)
+        # Fichiers déjà attachés : ne pas relancer leur traitement lors d'une reprise
+        current_files = {
+            (movie_id, season, number): (video, thumbnail)
+            for movie_id, season, number, video, thumbnail in Episode.objects.filter(
+                movie_id__in={movie.pk for movie in series.values()}
+            ).values_list('movie_id', 'season_number', 'episode_number', 'video', 'thumbnail')
+        }
+        episodes, media = {}, []
+        for data in rows:
+            movie = series.get((data['series'], data.get('series_year')))
+            if movie is None:
+                self._error(data.get('_line'), RowError(f"série introuvable : {data['series']}"))
+                continue
+            key = (movie.pk, data['season'], data['episode'])
+            video, thumbnail = current_files.get(key, ('', ''))
+            episode = Episode(movie_id=movie.pk, season_number=data['season'], episode_number=data['episode'],
+                              video=video, thumbnail=thumbnail or None)
+            # Fichiers déjà référencés en base par cet épisode
+            episode._counted_files = {'video': video, 'thumbnail': thumbnail or ''}
+            self._assign(episode, data, EPISODE_FIELDS, media)
+            episodes[key] = episode
+
+        # Contrainte unique (série, saison, épisode) : INSERT ... ON CONFLICT DO UPDATE.
+        # Une ligne d'épisode décrit l'épisode complet : les champs absents (hors fichiers) sont remis à vide.
+        references = self._reference_changes(episodes.values())
+        Episode.objects.bulk_create(
+            list(episodes.values()),
+            update_conflicts=True,
+            unique_fields=['movie', 'season_number', 'episode_number'],
+            update_fields=list(EPISODE_FIELDS),
+        )
+        MediaBlob.objects.adjust(references)
+        self.stats['episodes'] += len(episodes)
+        if media:
+            # Les clés primaires ne sont pas renvoyées en cas de conflit : les relire
+            ids = dict(
+                ((movie_id, season, number), pk) for pk, movie_id, season, number in Episode.objects.filter(
+                    movie_id__in={key[0] for key in episodes}
+                ).values_list('pk', 'movie_id', 'season_number', 'episode_number')
+            )
+            for episode, field in media:
+                episode.pk = ids.get((episode.movie_id, episode.season_number, episode.episode_number))
+            self._schedule_media([(episode, field) for episode, field in media if episode.pk])
+        return {key[0] for key in episodes}
+
+    def _resolve_series(self, rows):
+        titles = {data['series'] for data in rows}
+        candidates = {}
+        for movie in Movie.objects.filter(title__in=titles).exclude(video_type='film').order_by('pk'):
+            candidates.setdefault((movie.title, movie.release_year), movie)
+            candidates.setdefault((movie.title, None), movie)
+        return candidates
+
+    def _assign(self, instance, data, fields, media):
+        """Copie les champs présents dans la ligne ; retourne True si l'instance a changé."""
+        changed = False
+        for field in fields:
+            if field not in data or data[field] in (None, ''):
+                continue
+            value = data[field]
+            if field in ('thumbnail', 'video'):
+                value = self._attach(value, instance._meta.get_field(field).storage)
+                if getattr(instance, field).name == value:
+                    continue
+                media.append((instance, field))
+            elif getattr(instance, field) == value:
+                continue
+            setattr(instance, field, value)
+            changed = True
+        return changed
+
+    def _attach(self, path, storage):
+        """
+        Nom de stockage pour un fichier du manifeste, rangé par contenu : blob
+        déjà stocké, sinon copie (lien physique avec --link-media).
+        """
+        source = os.path.realpath(os.path.join(self.media_dir, path))
+        media_root = os.path.realpath(storage.location)
+        if source.startswith(media_root + os.sep):
+            name = os.path.relpath(source, media_root).replace(os.sep, '/')
+            if is_blob_name(name):
+                self.stats['files_in_place'] += 1
+                return name
+        # Une reprise retrouve le même blob : rien n'est recopié
+        name, outcome = storage.save_path(source, link=self.link_media)
+        self.stats[f'files_{outcome}'] += 1
+        return name
+
+    def _reference_changes(self, instances):
+        """Variations des références aux blobs pour des lignes écrites en lot (sans save())."""
+        changes = Counter()
+        for instance in instances:
+            changes.update(instance.file_reference_changes())
+        return changes
+
+    def _schedule_media(self, media):
+        # Les insertions groupées ne déclenchent pas les signaux de traitement des médias
+        if not self.process_media:
+            return
+        for instance, field in media:
+            if field == 'video':
+                run_in_background(ingest_video, instance._meta.label, instance.pk)
+            else:
+                fieldfile = getattr(instance, field)
+                run_in_background(generate_derivatives, fieldfile.name, fieldfile.storage)
+
+    # ------------------------------------------------------------------ suivi
+
+    def _error(self, line_no, error):
+        self.stats['errors'] += 1
+        where = f'ligne {line_no}' if line_no else 'lot'
+        self.stderr.write(f'{where} : {error}')
+        if self.max_errors is not None and self.stats['errors'] > self.max_errors:
+            raise CommandError(f'Plus de {self.max_errors} lignes invalides, import interrompu')
+
+    def _progress(self, rows, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{rows:,} ligne(s) importée(s) ({rows / elapsed:,.0f} lignes/s)')
+
+    def _load_checkpoint(self, path):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if checkpoint.get('size') != os.path.getsize(path):
+            raise CommandError('Le manifeste a changé depuis le dernier import : utiliser --restart')
+        return checkpoint['rows']
+
+    def _save_checkpoint(self, path, rows):
+        # Écriture atomique : un arrêt brutal laisse l'ancien point de reprise intact
+        tmp = self.checkpoint_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'rows': rows, 'size': os.path.getsize(path)}, f)
+        os.replace(tmp, self.checkpoint_path)
@@ -0,0 +1,20 @@
+# movies/management/commands/process_videos.py
+from django.core.management.base import BaseCommand
+from movies.models import Movie, Episode
+from movies.video_ingest import ingest_video
+
+
+class Command(BaseCommand):
+    help = "Optimise (faststart) les vidéos existantes et renseigne les durées manquantes"
+
+    def handle(self, *args, **options):
+        for model in (Movie, Episode):
+            ids = model.objects.exclude(video='').values_list('pk', flat=True)
+            total = rewritten = 0
+            for pk in ids.iterator():
+                total += 1
+                if ingest_video(model._meta.label, pk):
+                    rewritten += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural} : {total} vidéo(s) analysée(s), {rewritten} réécrite(s).'
+            ))
@@ -0,0 +1,60 @@
+# movies/management/commands/rebuild_profile_stats.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from movies.models import Comment, Favorite, Rating, UserProfile, WatchHistory
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les compteurs des profils (favoris, historique, commentaires, évaluations) "
+            "et corrige ceux qui ont divergé (écritures directes en base, admin, imports)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Nombre de profils mis à jour par transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Compter les profils à corriger sans rien écrire')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = list(UserProfile.STATS_FIELDS)
+
+        # Une agrégation SQL groupée par profil et par table
+        expected = {}
+        sources = [
+            (Favorite, {'favorite_count': Count('id')}),
+            (WatchHistory, {
+                'history_count': Count('id'),
+                'history_completed_count': Count('id', filter=Q(completed=True)),
+            }),
+            (Comment, {'comment_count': Count('id')}),
+            (Rating, {'rating_count': Count('id')}),
+        ]
+        for model, aggregates in sources:
+            for row in model.objects.values('user_profile_id').annotate(**aggregates).iterator():
+                stats = expected.setdefault(row['user_profile_id'], {})
+                for field in aggregates:
+                    stats[field] = row[field]
+
+        repaired = 0
+        batch = []
+        for profile in UserProfile.objects.only('pk', *fields).iterator(chunk_size=batch_size):
+            stats = expected.get(profile.pk, {})
+            if any(getattr(profile, field) != stats.get(field, 0) for field in fields):
+                for field in fields:
+                    setattr(profile, field, stats.get(field, 0))
+                batch.append(profile)
+            if len(batch) >= batch_size:
+                repaired += self._flush(batch, fields, options['dry_run'])
+        repaired += self._flush(batch, fields, options['dry_run'])
+
+        verb = 'à corriger' if options['dry_run'] else 'corrigé(s)'
+        self.stdout.write(self.style.SUCCESS(f'{repaired} profil(s) {verb}.'))
+
+    def _flush(self, batch, fields, dry_run):
+        count = len(batch)
+        if batch and not dry_run:
+            with transaction.atomic():
+                UserProfile.objects.bulk_update(batch, fields)
+        batch.clear()
+        return count
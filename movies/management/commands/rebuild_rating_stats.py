@@ -0,0 +1,60 @@
+# movies/management/commands/rebuild_rating_stats.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from movies.models import Comment, Movie, Rating
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les agrégats d'évaluations (somme, nombre, histogramme) et le nombre "
+            "de commentaires approuvés de chaque film")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Nombre de films mis à jour par transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['ratings_sum', 'ratings_count'] + [f'ratings_star{star}' for star in range(1, 6)] + ['comments_count']
+
+        # Agrégation SQL groupée par film : une seule lecture de la table Rating
+        stats = {
+            row['movie_id']: row
+            for row in Rating.objects.values('movie_id').annotate(
+                total=Sum('score'),
+                count=Count('id'),
+                **{f'star{star}': Count('id', filter=Q(score=star)) for star in range(1, 6)},
+            ).iterator()
+        }
+        comments = dict(
+            Comment.objects.filter(is_approved=True).values('movie_id').annotate(count=Count('id'))
+            .values_list('movie_id', 'count').iterator()
+        )
+
+        repaired = 0
+        batch = []
+        for movie in Movie.objects.only('pk', *fields).iterator(chunk_size=batch_size):
+            row = stats.get(movie.pk, {})
+            expected = {
+                'ratings_sum': row.get('total', 0),
+                'ratings_count': row.get('count', 0),
+                **{f'ratings_star{star}': row.get(f'star{star}', 0) for star in range(1, 6)},
+                'comments_count': comments.get(movie.pk, 0),
+            }
+            if any(getattr(movie, field) != value for field, value in expected.items()):
+                for field, value in expected.items():
+                    setattr(movie, field, value)
+                batch.append(movie)
+            if len(batch) >= batch_size:
+                repaired += self._flush(batch, fields)
+        repaired += self._flush(batch, fields)
+
+        self.stdout.write(self.style.SUCCESS(f'{repaired} film(s) corrigé(s).'))
+
+    def _flush(self, batch, fields):
+        count = len(batch)
+        if batch:
+            with transaction.atomic():
+                Movie.objects.bulk_update(batch, fields)
+            batch.clear()
+        return count
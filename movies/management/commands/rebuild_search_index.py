@@ -0,0 +1,18 @@
+# movies/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from movies import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte du catalogue"
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            self.stdout.write(self.style.WARNING(
+                "Index FTS5 indisponible sur cette base : la recherche utilise le repli icontains."
+            ))
+            return
+        with transaction.atomic():
+            count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'{count} film(s) indexé(s).'))
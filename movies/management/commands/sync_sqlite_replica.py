@@ -0,0 +1,44 @@
+# movies/management/commands/sync_sqlite_replica.py
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ("Copie la base SQLite principale vers les réplicas SQLite déclarés (FLIXORA_DB_REPLICAS), "
+            "pour essayer le routage lecture / écriture en local")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float,
+                            help='Recopier en boucle toutes les N secondes (retard de réplication simulé)')
+
+    def handle(self, *args, **options):
+        primary = connections['default'].settings_dict
+        replicas = [connections[alias].settings_dict for alias in settings.FLIXORA_DB_REPLICAS]
+        if 'sqlite3' not in primary['ENGINE'] or not replicas:
+            raise CommandError('Base principale SQLite et réplica SQLite requis (FLIXORA_SQLITE_REPLICA)')
+        if any('sqlite3' not in replica['ENGINE'] for replica in replicas):
+            raise CommandError('Seuls les réplicas SQLite sont copiés par cette commande')
+
+        while True:
+            started = time.perf_counter()
+            source = sqlite3.connect(primary['NAME'])
+            try:
+                for replica in replicas:
+                    # API de sauvegarde : copie cohérente même pendant des écritures
+                    target = sqlite3.connect(replica['NAME'])
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(replicas)} réplica(s) synchronisé(s) en {(time.perf_counter() - started) * 1000:.0f} ms.'
+            ))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
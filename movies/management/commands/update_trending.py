@@ -0,0 +1,22 @@
+# movies/management/commands/update_trending.py
+from django.core.management.base import BaseCommand
+from movies import trending
+
+
+class Command(BaseCommand):
+    help = ("Recale les scores de tendance sur la date courante et supprime les scores négligeables "
+            "(à planifier, par ex. toutes les heures)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recalculer tous les scores depuis les événements (après un import en masse)')
+        parser.add_argument('--half-lives', type=int, default=10,
+                            help='Avec --rebuild : ancienneté maximale des événements, en demi-vies')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = trending.rebuild(half_lives=options['half_lives'])
+            self.stdout.write(self.style.SUCCESS(f'{count} film(s) en tendance recalculé(s).'))
+            return
+        updated, pruned = trending.rebase()
+        self.stdout.write(self.style.SUCCESS(f'{updated} score(s) recalé(s), {pruned} supprimé(s).'))
@@ -0,0 +1,66 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:52
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    Rating = apps.get_model('movies', 'Rating')
+    stats = Rating.objects.values('movie_id').annotate(
+        total=Sum('score'),
+        count=Count('id'),
+        **{f'star{star}': Count('id', filter=Q(score=star)) for star in range(1, 6)},
+    )
+    for row in stats.iterator():
+        Movie.objects.filter(pk=row['movie_id']).update(
+            ratings_sum=row['total'],
+            ratings_count=row['count'],
+            **{f'ratings_star{star}': row[f'star{star}'] for star in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0014_remove_episode_release_date_episode_release_year_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='ratings_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='ratings_star1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='ratings_star2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='ratings_star3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='ratings_star4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='ratings_star5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='ratings_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Index FTS5 réservé à SQLite ; les autres bases utilisent le repli icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS movies_search_index USING fts5("
+        "title, description, director, episodes, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO movies_search_index (rowid, title, description, director, episodes) "
+        "SELECT m.id, m.title, m.description, COALESCE(m.director, ''), "
+        "COALESCE((SELECT group_concat(e.title, ' ') FROM movies_episode e "
+        "WHERE e.movie_id = m.id), '') "
+        "FROM movies_movie m"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS movies_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0015_movie_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
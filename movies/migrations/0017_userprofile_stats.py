@@ -0,0 +1,58 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:04
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_profile_stats(apps, schema_editor):
+    UserProfile = apps.get_model('movies', 'UserProfile')
+    sources = [
+        (apps.get_model('movies', 'Favorite'), {'favorite_count': Count('id')}),
+        (apps.get_model('movies', 'WatchHistory'), {
+            'history_count': Count('id'),
+            'history_completed_count': Count('id', filter=Q(completed=True)),
+        }),
+        (apps.get_model('movies', 'Comment'), {'comment_count': Count('id')}),
+        (apps.get_model('movies', 'Rating'), {'rating_count': Count('id')}),
+    ]
+    for model, aggregates in sources:
+        for row in model.objects.values('user_profile_id').annotate(**aggregates).iterator():
+            UserProfile.objects.filter(pk=row['user_profile_id']).update(
+                **{field: row[field] for field in aggregates}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0016_movie_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='history_completed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='history_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_profile_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0017_userprofile_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='movies.movie')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='movies.movie')),
+            ],
+            options={
+                'verbose_name': 'Similarité',
+                'verbose_name_plural': 'Similarités',
+                'indexes': [models.Index(fields=['movie', '-score'], name='movies_similarity_rank')],
+                'unique_together': {('movie', 'similar')},
+            },
+        ),
+    ]
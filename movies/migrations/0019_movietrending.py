@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0018_moviesimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieTrending',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='movies.movie')),
+                ('video_type', models.CharField(choices=[('film', 'Film'), ('anime', 'Anime'), ('serie', 'Série')], default='film', max_length=10)),
+                ('score', models.FloatField(default=0)),
+                ('epoch', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Tendance',
+                'verbose_name_plural': 'Tendances',
+                'indexes': [models.Index(fields=['video_type', '-score'], name='movies_trending_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_comments_count(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    Comment = apps.get_model('movies', 'Comment')
+    counts = Comment.objects.filter(is_approved=True).values('movie_id').annotate(count=Count('id'))
+    for row in counts.iterator():
+        Movie.objects.filter(pk=row['movie_id']).update(comments_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0019_movietrending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['movie', '-created_at', '-id'], name='movies_comment_page'),
+        ),
+        migrations.RunPython(populate_comments_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0020_movie_comments_count'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='movies_comment_page',
+        ),
+        migrations.RemoveIndex(
+            model_name='moviesimilarity',
+            name='movies_similarity_rank',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['movie', '-created_at', '-id'], name='movies_comment_page'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user_profile', '-added_at'], name='movies_favorite_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['video_type', '-created_at', '-id'], name='movies_movie_type_page'),
+        ),
+        migrations.AddIndex(
+            model_name='moviesimilarity',
+            index=models.Index(fields=['movie', '-score', 'similar'], name='movies_similarity_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='watchhistory',
+            index=models.Index(fields=['user_profile', '-watched_at'], name='movies_history_recent'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0021_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_status',
+            field=models.CharField(choices=[('ready', 'Prêt'), ('pending', 'En cours de traitement'), ('failed', 'Échec du traitement')], default='ready', max_length=10),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:30
+
+import movies.blob_storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0022_avatar_processing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField(default=0)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Fichier média',
+                'verbose_name_plural': 'Fichiers médias',
+            },
+        ),
+        migrations.AlterField(
+            model_name='episode',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=movies.blob_storage.blob_storage, upload_to='episode_thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='episode',
+            name='video',
+            field=models.FileField(storage=movies.blob_storage.blob_storage, upload_to='episodes/'),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='thumbnail',
+            field=models.ImageField(storage=movies.blob_storage.blob_storage, upload_to='thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='video',
+            field=models.FileField(storage=movies.blob_storage.blob_storage, upload_to='videos/'),
+        ),
+    ]
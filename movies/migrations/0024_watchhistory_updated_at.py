@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 21:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_watched_at(apps, schema_editor):
+    # Lignes existantes : dernière écriture connue = date d'ajout (pas de recalcul général des recommandations)
+    WatchHistory = apps.get_model('movies', 'WatchHistory')
+    WatchHistory.objects.update(updated_at=models.F('watched_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0023_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='watchhistory',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_watched_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='watchhistory',
+            index=models.Index(fields=['updated_at'], name='movies_history_updated'),
+        ),
+    ]
@@ -1,13 +1,224 @@
 # movies/models.py
+import os
+from collections import Counter
+
+from django.apps import apps
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
-class Movie(models.Model):
+from .blob_storage import BLOB_PREFIX, ContentAddressedStorage, blob_storage, is_blob_name
+
+
+class MovieQuerySet(models.QuerySet):
+    def apply_rating_change(self, old_score=None, new_score=None):
+        """
+        Met à jour atomiquement (UPDATE ... SET x = x + n) les agrégats
+        d'évaluations après la création, la modification ou la suppression
+        d'une note.
+        """
+        if old_score == new_score:
+            return 0
+        changes = {}
+        if old_score is None:
+            changes['ratings_count'] = models.F('ratings_count') + 1
+        elif new_score is None:
+            changes['ratings_count'] = models.F('ratings_count') - 1
+        changes['ratings_sum'] = models.F('ratings_sum') + (new_score or 0) - (old_score or 0)
+        if old_score is not None:
+            field = f'ratings_star{old_score}'
+            changes[field] = models.F(field) - 1
+        if new_score is not None:
+            field = f'ratings_star{new_score}'
+            changes[field] = models.F(field) + 1
+        return self.update(**changes)
+
+    def adjust_comment_count(self, delta):
+        """Applique une variation au nombre de commentaires approuvés (UPDATE atomique)."""
+        if not delta:
+            return 0
+        return self.update(comments_count=Greatest(models.F('comments_count') + delta, 0))
+
+
+class UserProfileQuerySet(models.QuerySet):
+    def adjust_stats(self, **deltas):
+        """
+        Applique des variations aux compteurs du profil en une seule requête
+        (UPDATE ... SET x = MAX(x + n, 0)).
+        """
+        changes = {
+            field: Greatest(models.F(field) + delta, 0)
+            for field, delta in deltas.items() if delta
+        }
+        return self.update(**changes) if changes else 0
+
+    def backfill(self, batch_size=1000, progress=None):
+        """
+        Crée les profils manquants en lots : les utilisateurs sans profil sont
+        trouvés par anti-jointure (LEFT JOIN ... IS NULL) puis insérés par
+        `bulk_create`. `progress(créés, total)` est appelé après chaque lot.
+        Retourne le nombre de profils créés.
+        """
+        missing = User.objects.using(self.db).filter(profile__isnull=True).order_by('pk')
+        total = missing.count()
+        created = 0
+        last_pk = 0
+        while total:
+            # Pagination par clé : chaque lot reprend après le dernier utilisateur traité
+            user_ids = list(missing.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+            if not user_ids:
+                break
+            # Un profil créé entre-temps (inscription concurrente) est ignoré
+            self.bulk_create([self.model(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+            created += len(user_ids)
+            last_pk = user_ids[-1]
+            if progress:
+                progress(created, total)
+            if len(user_ids) < batch_size:
+                break
+        return created
+
+
+class MediaBlobQuerySet(models.QuerySet):
+    def adjust(self, changes):
+        """
+        Applique des variations de références {nom: delta} aux blobs (les
+        autres noms sont ignorés) : une requête par valeur de delta, plus
+        l'insertion des blobs nouvellement référencés.
+        """
+        changes = {name: delta for name, delta in changes.items() if delta and is_blob_name(name)}
+        if not changes:
+            return
+        storage = blob_storage()
+        self.bulk_create([
+            self.model(name=name, size=storage.size(name) if storage.exists(name) else 0)
+            for name, delta in changes.items() if delta > 0
+        ], ignore_conflicts=True)
+        by_delta = {}
+        for name, delta in changes.items():
+            by_delta.setdefault(delta, []).append(name)
+        for delta, names in by_delta.items():
+            self.filter(name__in=names).update(refcount=Greatest(models.F('refcount') + delta, 0))
+
+    def recount(self):
+        """
+        Recalcule les références à partir des tables (une agrégation par champ
+        de fichier) et la taille des blobs. Retourne le nombre de blobs corrigés.
+        """
+        counts = Counter()
+        for model, field in blob_reference_fields():
+            rows = (
+                model._default_manager.using(self.db)
+                .filter(**{f'{field}__startswith': f'{BLOB_PREFIX}/'})
+                .values_list(field).annotate(n=models.Count('pk')).order_by()
+            )
+            counts.update(dict(rows))
+        storage = blob_storage()
+        existing = {blob.name: blob for blob in self.all()}
+        for name in counts.keys() - existing.keys():
+            existing[name] = self.model(name=name, refcount=0, size=-1)
+        changed = []
+        for name, blob in existing.items():
+            size = os.path.getsize(storage.path(name)) if storage.exists(name) else 0
+            if blob.refcount != counts[name] or blob.size != size:
+                blob.refcount, blob.size = counts[name], size
+                changed.append(blob)
+        self.bulk_create([blob for blob in changed if blob._state.adding], ignore_conflicts=True)
+        self.bulk_update([blob for blob in changed if not blob._state.adding], ['refcount', 'size'], batch_size=500)
+        return len(changed)
+
+    def disk_usage(self):
+        """{'references', 'blobs', 'logical', 'physical'} : octets référencés et octets réellement stockés."""
+        referenced = self.filter(refcount__gt=0)
+        usage = referenced.aggregate(
+            references=models.Sum('refcount'), blobs=models.Count('pk'),
+            logical=models.Sum(models.F('size') * models.F('refcount')), physical=models.Sum('size'),
+        )
+        return {key: value or 0 for key, value in usage.items()}
+
+
+def blob_reference_fields():
+    """(modèle, champ) des fichiers rangés dans le stockage par contenu."""
+    return [
+        (model, field.name)
+        for model in apps.get_app_config('movies').get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+class TrackedFilesMixin:
+    """
+    Mémorise les noms des fichiers chargés depuis la base pour détecter,
+    sans requête supplémentaire, un nouveau téléversement à l'enregistrement.
+    """
+    tracked_file_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_files = {
+            field: instance.__dict__[field] for field in cls.tracked_file_fields
+            if field in instance.__dict__
+        }
+        instance._counted_files = {field: name or '' for field, name in instance._loaded_files.items()}
+        return instance
+
+    def file_reference_changes(self, fields=None):
+        """
+        Variation des références de chaque fichier depuis le chargement ou le
+        dernier save() ({nom: delta}), pour les champs `fields` (tous par défaut).
+        """
+        counted = getattr(self, '_counted_files', {})
+        changes = Counter()
+        for field in self.tracked_file_fields:
+            # Champ différé ou non enregistré : inchangé
+            if field not in self.__dict__ or (fields is not None and field not in fields):
+                continue
+            if field not in counted and not self._state.adding:
+                continue
+            current = getattr(self, field).name or ''
+            previous = counted.get(field, '')
+            if current != previous:
+                changes[current] += 1
+                changes[previous] -= 1
+        return changes
+
+    def remember_counted_files(self):
+        self._counted_files = {
+            field: getattr(self, field).name or '' for field in self.tracked_file_fields if field in self.__dict__
+        }
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not hasattr(self, '_counted_files'):
+            # Nouvelle ligne : aucun fichier encore compté
+            self._counted_files = dict.fromkeys(self.tracked_file_fields, '')
+        super().save(*args, **kwargs)
+        # Après l'enregistrement : un fichier téléversé ne reçoit son nom (l'empreinte) qu'au pre_save du champ
+        changes = self.file_reference_changes(kwargs.get('update_fields'))
+        if changes:
+            MediaBlob.objects.using(self._state.db).adjust(changes)
+        self.remember_counted_files()
+
+    def pop_changed_files(self):
+        """Retourne les champs fichiers modifiés depuis le chargement et les marque comme vus."""
+        loaded = getattr(self, '_loaded_files', {})
+        changed = []
+        for field in self.tracked_file_fields:
+            current = getattr(self, field).name or ''
+            if current != (loaded.get(field) or ''):
+                changed.append(field)
+            loaded[field] = current
+        self._loaded_files = loaded
+        return changed
+
+
+class Movie(TrackedFilesMixin, models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
-    thumbnail = models.ImageField(upload_to='thumbnails/')
-    video = models.FileField(upload_to='videos/')
+    thumbnail = models.ImageField(upload_to='thumbnails/', storage=blob_storage)
+    video = models.FileField(upload_to='videos/', storage=blob_storage)
     release_year = models.IntegerField(null=True, blank=True)
     duration = models.IntegerField(null=True, blank=True)  # en minutes
     director = models.CharField(max_length=100, null=True, blank=True)
@@ -42,6 +253,25 @@ class Movie(models.Model):
         choices=CATEGORY_CHOICES,
         default='action'
     )
+
+    # Agrégats des évaluations, maintenus par les signaux de Rating
+    ratings_sum = models.PositiveIntegerField(default=0, editable=False)
+    ratings_count = models.PositiveIntegerField(default=0, editable=False)
+    ratings_star1 = models.PositiveIntegerField(default=0, editable=False)
+    ratings_star2 = models.PositiveIntegerField(default=0, editable=False)
+    ratings_star3 = models.PositiveIntegerField(default=0, editable=False)
+    ratings_star4 = models.PositiveIntegerField(default=0, editable=False)
+    ratings_star5 = models.PositiveIntegerField(default=0, editable=False)
+    # Nombre de commentaires approuvés, maintenu par les signaux de Comment
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = MovieQuerySet.as_manager()
+
+    tracked_file_fields = ('video', 'thumbnail')
+
+    class Meta:
+        # Rangées et pages par type, dans l'ordre du catalogue (pagination par clé)
+        indexes = [models.Index(fields=['video_type', '-created_at', '-id'], name='movies_movie_type_page')]
     
     def __str__(self):
         return self.title
@@ -51,42 +281,81 @@ class Movie(models.Model):
         """Vérifie si le film est favori pour un utilisateur donné."""
         if not user.is_authenticated:
             return False
-        try:
-            profile = user.profile
-            return Favorite.objects.filter(user_profile=profile, movie=self).exists()
-        except UserProfile.DoesNotExist:
-            return False
+        return Favorite.objects.filter(user_profile__user_id=user.pk, movie=self).exists()
 
     @property
     def average_rating(self):
         """Retourne la note moyenne du film"""
-        ratings = self.ratings.all()
-        if ratings.exists():
-            return sum(r.score for r in ratings) / ratings.count()
+        if self.ratings_count:
+            return self.ratings_sum / self.ratings_count
         return 0
     
     @property
     def rating_count(self):
         """Retourne le nombre d'évaluations"""
-        return self.ratings.count()
+        return self.ratings_count
+
+    @property
+    def rating_histogram(self):
+        """Retourne la répartition des notes {1: n, ..., 5: n}"""
+        return {star: getattr(self, f'ratings_star{star}') for star in range(1, 6)}
     
     @property
     def comment_count(self):
-        """Retourne le nombre de commentaires"""
-        return self.comments.filter(is_approved=True).count()
+        """Retourne le nombre de commentaires approuvés"""
+        return self.comments_count
     
     def get_recent_comments(self, limit=5):
         """Retourne les commentaires récents"""
-        return self.comments.filter(is_approved=True).order_by('-created_at')[:limit]
+        return self.comments.filter(is_approved=True).select_related(
+            'user_profile__user'
+        ).order_by('-created_at')[:limit]
 
 
-class UserProfile(models.Model):
+class UserProfile(TrackedFilesMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
     bio = models.TextField(max_length=500, blank=True)
+
+    AVATAR_STATUS_CHOICES = [
+        ('ready', 'Prêt'),
+        ('pending', 'En cours de traitement'),
+        ('failed', 'Échec du traitement'),
+    ]
+
+    # Traitement en arrière-plan du dernier avatar envoyé (voir movies/avatars.py)
+    avatar_status = models.CharField(max_length=10, choices=AVATAR_STATUS_CHOICES, default='ready')
+    avatar_digest = models.CharField(max_length=64, blank=True, editable=False)
+
+    # Compteurs dénormalisés, tenus à jour par les vues qui écrivent
+    # (voir `manage.py rebuild_profile_stats` pour les recalculer)
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
+    history_count = models.PositiveIntegerField(default=0, editable=False)
+    history_completed_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+
+    STATS_FIELDS = ('favorite_count', 'history_count', 'history_completed_count', 'comment_count', 'rating_count')
+
+    objects = UserProfileQuerySet.as_manager()
+
+    tracked_file_fields = ('avatar',)
     
     def __str__(self):
         return self.user.username
+
+    def save(self, *args, **kwargs):
+        # Un save() complet ne doit pas écraser les compteurs avec des valeurs périmées
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STATS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def history_in_progress_count(self):
+        return self.history_count - self.history_completed_count
     
     @property
     def favorite_movies(self):
@@ -119,6 +388,8 @@ class Favorite(models.Model):
         verbose_name = "Favori"
         verbose_name_plural = "Favoris"
         ordering = ['-added_at']  # Les plus récents d'abord
+        # Favoris d'un profil, les plus récents d'abord
+        indexes = [models.Index(fields=['user_profile', '-added_at'], name='movies_favorite_recent')]
     
     def __str__(self):
         return f"{self.user_profile.user.username} - {self.movie.title}"
@@ -146,6 +417,13 @@ class Rating(models.Model):
         unique_together = ('user_profile', 'movie')
         verbose_name = "Évaluation"
         verbose_name_plural = "Évaluations"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémoriser la note chargée pour calculer le delta des agrégats
+        instance._loaded_score = instance.__dict__.get('score')
+        return instance
     
     def __str__(self):
         return f"{self.user_profile.user.username} - {self.movie.title}: {self.score}/5"
@@ -164,6 +442,18 @@ class Comment(models.Model):
         ordering = ['-created_at']
         verbose_name = "Commentaire"
         verbose_name_plural = "Commentaires"
+        # Pages de commentaires approuvés d'un film (pagination par clé sur created_at, id) ;
+        # index partiel : les commentaires masqués n'y figurent pas
+        indexes = [models.Index(
+            fields=['movie', '-created_at', '-id'], name='movies_comment_page', condition=models.Q(is_approved=True),
+        )]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémoriser l'approbation chargée pour tenir à jour le compteur du film
+        instance._loaded_approved = instance.__dict__.get('is_approved')
+        return instance
     
     def __str__(self):
         return f"{self.user_profile.user.username} sur {self.movie.title}"
@@ -174,6 +464,8 @@ class WatchHistory(models.Model):
     user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='watch_history')
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='watched_by')
     watched_at = models.DateTimeField(auto_now_add=True)
+    # Dernière écriture (progression, « terminé ») : repère du calcul incrémental des recommandations
+    updated_at = models.DateTimeField(auto_now=True)
     duration_watched = models.IntegerField(default=0)  # en secondes
     completed = models.BooleanField(default=False)
     
@@ -182,16 +474,32 @@ class WatchHistory(models.Model):
         verbose_name = "Historique de visionnage"
         verbose_name_plural = "Historiques de visionnage"
         unique_together = ('user_profile', 'movie')  # Un seul enregistrement par film
+        # Historique d'un profil, les plus récents d'abord
+        indexes = [
+            models.Index(fields=['user_profile', '-watched_at'], name='movies_history_recent'),
+            models.Index(fields=['updated_at'], name='movies_history_updated'),
+        ]
     
     def __str__(self):
         status = "Terminé" if self.completed else "En cours"
         return f"{self.user_profile.user.username} - {self.movie.title} ({status})"
 
+    @staticmethod
+    def stats_changes(was_completed, completed):
+        """
+        Variations des compteurs du profil pour une écriture d'historique
+        (`was_completed` vaut None si la ligne vient d'être créée).
+        """
+        changes = {'history_completed_count': int(completed) - int(bool(was_completed))}
+        if was_completed is None:
+            changes['history_count'] = 1
+        return changes
+
 
 
 # models.py - AJOUTE CETTE CLASSE À LA FIN DU FICHIER
 
-class Episode(models.Model):
+class Episode(TrackedFilesMixin, models.Model):
     """Modèle pour les épisodes"""
     movie = models.ForeignKey(
         Movie, 
@@ -201,14 +509,16 @@ class Episode(models.Model):
     season_number = models.IntegerField(default=1)
     episode_number = models.IntegerField()
     title = models.CharField(max_length=200)
-    video = models.FileField(upload_to='episodes/')
-    thumbnail = models.ImageField(upload_to='episode_thumbnails/', null=True, blank=True)
+    video = models.FileField(upload_to='episodes/', storage=blob_storage)
+    thumbnail = models.ImageField(upload_to='episode_thumbnails/', null=True, blank=True, storage=blob_storage)
     description = models.TextField(blank=True)
     duration = models.IntegerField(null=True, blank=True)
     release_year = models.DateField(null=True, blank=True)
     release_year = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    tracked_file_fields = ('video', 'thumbnail')
     
     class Meta:
         ordering = ['season_number', 'episode_number']
@@ -222,4 +532,57 @@ class Episode(models.Model):
     @property
     def full_episode_title(self):
         """Retourne le titre complet avec saison et épisode"""
-        return f"Saison {self.season_number} - Épisode {self.episode_number}: {self.title}"
\ No newline at end of file
+        return f"Saison {self.season_number} - Épisode {self.episode_number}: {self.title}"
+
+class MovieSimilarity(models.Model):
+    """Voisins précalculés d'un film (filtrage collaboratif item-item, cf. build_recommendations)"""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similarities')
+    similar = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similar_to')
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('movie', 'similar')
+        # Voisins d'un film par score décroissant, égalités départagées par voisin
+        indexes = [models.Index(fields=['movie', '-score', 'similar'], name='movies_similarity_rank')]
+        verbose_name = "Similarité"
+        verbose_name_plural = "Similarités"
+
+    def __str__(self):
+        return f"{self.movie_id} ~ {self.similar_id} ({self.score:.3f})"
+
+
+class MovieTrending(models.Model):
+    """Score de tendance d'un film (popularité à décroissance exponentielle, cf. movies/trending.py)"""
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    # Copie de Movie.video_type : les rangées par type se lisent dans l'index (video_type, -score)
+    video_type = models.CharField(max_length=10, choices=Movie.VIDEO_TYPE_CHOICES, default='film')
+    # Score ramené à la date `epoch` (secondes Unix) ; toutes les lignes partagent la même référence
+    score = models.FloatField(default=0)
+    epoch = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=['video_type', '-score'], name='movies_trending_rank')]
+        verbose_name = "Tendance"
+        verbose_name_plural = "Tendances"
+
+    def __str__(self):
+        return f"{self.movie_id} ({self.video_type}) : {self.score:.2f}"
+
+
+class MediaBlob(models.Model):
+    """Fichier du stockage par contenu (movies/blob_storage.py) et nombre de lignes qui le référencent"""
+    name = models.CharField(max_length=100, primary_key=True)
+    size = models.BigIntegerField(default=0)
+    # Tenu à jour par save() et les signaux ; recalculé par `manage.py gc_media`
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = MediaBlobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Fichier média"
+        verbose_name_plural = "Fichiers médias"
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} réf.)"
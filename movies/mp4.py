@@ -0,0 +1,205 @@
+# movies/mp4.py
+"""
+Lecture et réécriture « faststart » des fichiers MP4 / QuickTime.
+
+Les boîtes (atoms) de premier niveau sont parcourues en lisant seulement
+leurs en-têtes ; seule la boîte `moov` (index des échantillons, quelques
+Ko à quelques Mo) est chargée en mémoire. Les données média (`mdat`) sont
+recopiées par blocs sans jamais être chargées entièrement.
+"""
+import os
+import struct
+
+# Boîtes conteneurs à traverser pour atteindre les tables stco/co64
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'dinf', b'udta', b'mvex'}
+
+COPY_BLOCK_SIZE = 1024 * 1024
+UINT32_MAX = 0xFFFFFFFF
+
+
+class MP4Error(ValueError):
+    """Fichier MP4 illisible ou structure inattendue."""
+
+
+def iter_boxes(f, start, end):
+    """
+    Parcourt les boîtes entre `start` et `end`.
+    Produit (type, position, taille totale, taille de l'en-tête).
+    """
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            # La boîte s'étend jusqu'à la fin du fichier
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise MP4Error(f'Boîte {box_type!r} invalide à la position {offset}')
+        yield box_type, offset, size, header_size
+        offset += size
+
+
+def top_level_boxes(path):
+    """Liste des boîtes de premier niveau d'un fichier."""
+    with open(path, 'rb') as f:
+        return list(iter_boxes(f, 0, os.path.getsize(path)))
+
+
+def needs_faststart(path):
+    """Vrai si la boîte `moov` se trouve après des données média."""
+    seen_mdat = False
+    for box_type, _, _, _ in top_level_boxes(path):
+        if box_type == b'moof':
+            # MP4 fragmenté : déjà lisible en flux
+            return False
+        if box_type == b'mdat':
+            seen_mdat = True
+        elif box_type == b'moov':
+            return seen_mdat
+    return False
+
+
+def _read_moov(path):
+    """Contenu de la boîte `moov`, sans son en-tête (8 octets, ou 16 pour une taille 64 bits)."""
+    with open(path, 'rb') as f:
+        for box_type, offset, size, header_size in iter_boxes(f, 0, os.path.getsize(path)):
+            if box_type == b'moov':
+                f.seek(offset + header_size)
+                return f.read(size - header_size)
+    raise MP4Error('Boîte moov introuvable')
+
+
+def duration_seconds(path):
+    """Durée de la présentation (boîte mvhd), en secondes, ou None."""
+    for box_type, payload in _children(_read_moov(path)):
+        if box_type == b'mvhd':
+            version = payload[0]
+            if version == 1:
+                timescale, duration = struct.unpack('>IQ', payload[20:32])
+            else:
+                timescale, duration = struct.unpack('>II', payload[12:20])
+            if timescale:
+                return duration / timescale
+    return None
+
+
+def _children(data):
+    """Découpe le contenu d'une boîte conteneur en (type, contenu)."""
+    offset = 0
+    while offset + 8 <= len(data):
+        size, box_type = struct.unpack('>I4s', data[offset:offset + 8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[offset + 8:offset + 16])[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header_size or offset + size > len(data):
+            raise MP4Error(f'Boîte {box_type!r} invalide dans moov')
+        yield box_type, data[offset + header_size:offset + size]
+        offset += size
+
+
+def _box(box_type, payload):
+    if len(payload) + 8 > UINT32_MAX:
+        return struct.pack('>I4sQ', 1, box_type, len(payload) + 16) + payload
+    return struct.pack('>I4s', len(payload) + 8, box_type) + payload
+
+
+def _rewrite(box_type, payload, relocate, use_co64):
+    """Reconstruit une boîte en corrigeant les offsets de morceaux (stco/co64)."""
+    if box_type in CONTAINER_BOXES:
+        return _box(box_type, b''.join(
+            _rewrite(child_type, child, relocate, use_co64) for child_type, child in _children(payload)
+        ))
+    if box_type in (b'stco', b'co64'):
+        version_flags, count = struct.unpack('>II', payload[:8])
+        fmt = 'I' if box_type == b'stco' else 'Q'
+        offsets = struct.unpack(f'>{count}{fmt}', payload[8:8 + count * struct.calcsize(fmt)])
+        offsets = [relocate(offset) for offset in offsets]
+        if use_co64:
+            return _box(b'co64', struct.pack(f'>II{count}Q', version_flags, count, *offsets))
+        return _box(b'stco', struct.pack(f'>II{count}I', version_flags, count, *offsets))
+    return _box(box_type, payload)
+
+
+def _max_chunk_offset(box_type, payload):
+    if box_type in CONTAINER_BOXES:
+        return max((_max_chunk_offset(t, p) for t, p in _children(payload)), default=0)
+    if box_type in (b'stco', b'co64'):
+        count = struct.unpack('>I', payload[4:8])[0]
+        fmt = 'I' if box_type == b'stco' else 'Q'
+        return max(struct.unpack(f'>{count}{fmt}', payload[8:8 + count * struct.calcsize(fmt)]), default=0)
+    return 0
+
+
+def _copy_range(src, dst, offset, length):
+    src.seek(offset)
+    while length > 0:
+        block = src.read(min(COPY_BLOCK_SIZE, length))
+        if not block:
+            raise MP4Error('Fin de fichier inattendue')
+        dst.write(block)
+        length -= len(block)
+
+
+def faststart(src_path, dst_path):
+    """
+    Écrit dans `dst_path` une copie de `src_path` avec `moov` placé avant
+    les données média, offsets de morceaux corrigés. Retourne False (sans
+    rien écrire) si le fichier est déjà optimisé.
+    """
+    if not needs_faststart(src_path):
+        return False
+
+    boxes = top_level_boxes(src_path)
+    moov_payload = _read_moov(src_path)
+
+    # Nouvel ordre : ftyp (s'il existe), moov, puis le reste dans l'ordre d'origine
+    head = [box for box in boxes if box[0] == b'ftyp']
+    tail = [box for box in boxes if box[0] not in (b'ftyp', b'moov')]
+
+    def layout(moov_size):
+        # Déplacement de chaque boîte conservée : ancienne position -> nouvelle
+        moves = []
+        position = sum(box[2] for box in head)
+        for box in head:
+            moves.append((box[1], box[2], box[1]))
+        position += moov_size
+        for box in tail:
+            moves.append((box[1], box[2], position))
+            position += box[2]
+        return moves
+
+    def relocator(moves):
+        def relocate(offset):
+            for old_start, size, new_start in moves:
+                if old_start <= offset < old_start + size:
+                    return offset + new_start - old_start
+            raise MP4Error(f'Offset de morceau {offset} hors des données média')
+        return relocate
+
+    # La taille de moov ne dépend que du format des tables (stco 32 bits / co64)
+    use_co64 = False
+    relocate = relocator(layout(len(_rewrite(b'moov', moov_payload, lambda offset: 0, use_co64))))
+    max_offset = _max_chunk_offset(b'moov', moov_payload)
+    if max_offset and relocate(max_offset) > UINT32_MAX:
+        # Les offsets dépassent 32 bits une fois décalés : passer en co64
+        use_co64 = True
+        relocate = relocator(layout(len(_rewrite(b'moov', moov_payload, lambda offset: 0, use_co64))))
+    new_moov = _rewrite(b'moov', moov_payload, relocate, use_co64)
+
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        for box_type, offset, size, _ in head:
+            _copy_range(src, dst, offset, size)
+        dst.write(new_moov)
+        for box_type, offset, size, _ in tail:
+            _copy_range(src, dst, offset, size)
+    return True
@@ -0,0 +1,68 @@
+# movies/pagination.py
+import base64
+from datetime import datetime, timezone
+
+from django.db.models import Q
+
+# Ordre stable du catalogue : le plus récent d'abord, l'id départage les égalités
+CATALOG_ORDERING = ('-created_at', '-id')
+
+
+def _encode(created_at, pk):
+    # Forme canonique : date en UTC, id décimal, sans remplissage base64
+    raw = f"{created_at.astimezone(timezone.utc).isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def encode_cursor(obj):
+    """Encode la position (created_at, id) d'un film ou d'un commentaire en curseur opaque."""
+    return _encode(obj.created_at, obj.pk)
+
+
+def decode_cursor(cursor):
+    """Décode un curseur en (created_at, id). Lève ValueError s'il est invalide."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        created_at, pk = datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Curseur invalide') from e
+    # Les curseurs émis portent toujours un fuseau et un id positif
+    if created_at.tzinfo is None or pk < 1:
+        raise ValueError('Curseur invalide')
+    return created_at, pk
+
+
+def normalize_cursor(cursor):
+    """
+    Curseur client validé et réécrit sous sa forme canonique (None pour la
+    première page). Deux écritures d'une même position donnent la même
+    chaîne : c'est elle, et non la saisie du client, qui entre dans les clés
+    de cache. Lève ValueError s'il est invalide.
+    """
+    if not cursor:
+        return None
+    return _encode(*decode_cursor(cursor))
+
+
+def keyset_paginate(queryset, cursor=None, page_size=24):
+    """
+    Pagination par clé (keyset) sur (created_at, id) décroissants.
+
+    Contrairement à OFFSET, le coût d'une page ne dépend pas de sa position :
+    la base reprend directement après le dernier élément vu.
+    Retourne (liste des éléments de la page, curseur suivant ou None).
+    """
+    queryset = queryset.order_by(*CATALOG_ORDERING)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+    # Un élément de plus pour savoir s'il existe une page suivante
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1])
+    return items, next_cursor
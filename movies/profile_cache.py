@@ -0,0 +1,187 @@
+# movies/profile_cache.py
+"""
+Utilisateur et profil de la requête, mémorisés sur la requête et entre requêtes.
+
+`ProfileMiddleware` (placé après AuthenticationMiddleware) remplace
+`request.user` / `request.auser()` par une lecture du cache : l'utilisateur y
+est stocké avec son profil déjà chargé, sous la clé de la session
+(`profile:<session>`), pendant FLIXORA_PROFILE_CACHE_TIMEOUT secondes. Une
+page authentifiée n'exécute alors plus les requêtes sur auth_user et
+movies_userprofile. `request.profile` donne le profil de l'utilisateur
+connecté, chargé (ou créé) au plus une fois par requête.
+
+Chaque entrée porte la version de l'utilisateur (`profile:v:<id>`), que les
+signaux de User et UserProfile incrémentent : un changement de profil,
+d'avatar ou de mot de passe invalide toutes les sessions de l'utilisateur.
+Les compteurs du profil, mis à jour par UPDATE sans signal, peuvent y être
+en retard : les pages qui les affichent les relisent (`refresh_stats`).
+
+L'invalidation n'est vue que par les processus qui partagent le cache : avec
+un cache propre au processus (LocMemCache), les autres processus serviraient
+un utilisateur périmé. Le cache n'est alors pas utilisé, sauf si
+FLIXORA_PROFILE_CACHE_ALLOW_LOCAL l'autorise (serveur de développement, un
+seul processus) ; la vérification movies.W001 le signale au démarrage.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import UserProfile
+
+ENTRY_KEY = 'profile:{session_key}'
+VERSION_KEY = 'profile:v:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'FLIXORA_PROFILE_CACHE_TIMEOUT', 60)
+
+
+def cache_is_process_local():
+    return isinstance(caches['default'], LocMemCache)
+
+
+def profile_cache_enabled():
+    """Faux avec un cache propre au processus, sauf autorisation explicite."""
+    return getattr(settings, 'FLIXORA_PROFILE_CACHE_ALLOW_LOCAL', False) or not cache_is_process_local()
+
+
+def get_or_create_profile(user):
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        # Créer le profil si non existant
+        return UserProfile.objects.create(user=user)
+
+
+async def aget_or_create_profile(user):
+    """Version asynchrone de get_or_create_profile (vues AJAX asynchrones)"""
+    if User.profile.is_cached(user):
+        return user.profile
+    profile, _ = await UserProfile.objects.aget_or_create(user=user)
+    return profile
+
+
+def refresh_stats(profile):
+    """Relit les compteurs dénormalisés d'un profil venu du cache (inutile s'il vient d'être lu)."""
+    if getattr(profile, '_from_cache', False):
+        profile.refresh_from_db(fields=UserProfile.STATS_FIELDS)
+    return profile
+
+
+def invalidate_user(user_id):
+    """Invalide les entrées de toutes les sessions de l'utilisateur."""
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def _keys(request, user_id):
+    """(clé de l'entrée, clé de version), ou None si la session n'est pas authentifiée ou le cache inutilisable."""
+    if user_id is None or request.session.session_key is None or not profile_cache_enabled():
+        return None
+    return ENTRY_KEY.format(session_key=request.session.session_key), VERSION_KEY.format(user_id=user_id)
+
+
+def _valid_user(request, found, keys):
+    entry = found.get(keys[0])
+    if entry is None or entry[0] != found.get(keys[1], 0):
+        return None
+    user = entry[1]
+    session = request.session
+    # Mêmes vérifications que auth.get_user() : un changement de mot de passe ferme la session
+    if str(user.pk) != str(session.get(auth.SESSION_KEY)) or not constant_time_compare(
+        session.get(auth.HASH_SESSION_KEY, ''), user.get_session_auth_hash()
+    ):
+        return None
+    if User.profile.is_cached(user):
+        user.profile._from_cache = True
+    return user
+
+
+def cached_user(request):
+    keys = _keys(request, request.session.get(auth.SESSION_KEY))
+    if keys is None:
+        return auth.get_user(request)
+    found = cache.get_many(keys)
+    user = _valid_user(request, found, keys)
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(keys[0], (found.get(keys[1], 0), user), _timeout())
+    request._flixora_entry = (keys[0], found.get(keys[1], 0), user.pk)
+    return user
+
+
+async def acached_user(request):
+    keys = _keys(request, await request.session.aget(auth.SESSION_KEY))
+    if keys is None:
+        return await auth.aget_user(request)
+    found = await cache.aget_many(keys)
+    user = _valid_user(request, found, keys)
+    if user is None:
+        user = await auth.aget_user(request)
+        if user.is_authenticated:
+            await cache.aset(keys[0], (found.get(keys[1], 0), user), _timeout())
+    request._flixora_entry = (keys[0], found.get(keys[1], 0), user.pk)
+    return user
+
+
+def request_profile(request):
+    """
+    Profil de l'utilisateur connecté. Au premier chargement, il est ajouté à
+    l'entrée en cache de la session : les requêtes suivantes n'ont plus à le lire.
+    """
+    # Un SimpleLazyObject se sérialise comme l'objet qu'il enveloppe
+    user = request.user
+    loaded = User.profile.is_cached(user)
+    profile = get_or_create_profile(user)
+    entry = getattr(request, '_flixora_entry', None)
+    # Pas après un login() dans la même requête : l'entrée appartient à l'utilisateur chargé
+    if not loaded and entry is not None and entry[2] == user.pk:
+        cache.set(entry[0], (entry[1], user), _timeout())
+    return profile
+
+
+class ProfileMiddleware:
+    """Utilisateur (via le cache) et profil paresseux mémorisés sur la requête."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._attach(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._attach(request)
+        return await self.get_response(request)
+
+    def _attach(self, request):
+        def get_user():
+            if not hasattr(request, '_flixora_user'):
+                request._flixora_user = cached_user(request)
+            return request._flixora_user
+
+        async def auser():
+            if not hasattr(request, '_flixora_user'):
+                request._flixora_user = await acached_user(request)
+            return request._flixora_user
+
+        request.user = SimpleLazyObject(get_user)
+        request.auser = auser
+        # Utilisateurs connectés uniquement
+        request.profile = SimpleLazyObject(lambda: request_profile(request))
@@ -0,0 +1,177 @@
+# movies/progress.py
+"""
+Tampon d'écriture différée pour la progression de lecture.
+
+Le lecteur envoie sa position toutes les quelques secondes. Au lieu d'un
+`update_or_create` par battement, les positions sont regroupées en mémoire
+par (profil, film) — la dernière reçue l'emporte — puis écrites en un seul
+INSERT ... ON CONFLICT DO UPDATE à intervalle régulier ou dès que le tampon
+atteint sa taille maximale. Le volume d'écriture suit donc le nombre de
+titres en cours de lecture, pas le nombre de battements.
+
+Le tampon est propre au processus. Les pages du profil écrivent d'abord les
+positions en attente de l'utilisateur (`flush(profile_id)`), mais seulement
+celles reçues par ce processus : servie par un autre processus, une page peut
+montrer une progression en retard d'au plus `flush_interval` secondes (ou
+FLIXORA_PROGRESS_BUFFER = False pour écrire chaque position immédiatement).
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from . import trending
+from .models import UserProfile, WatchHistory
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBuffer:
+    def __init__(self, flush_interval=5.0, max_pending=500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Sérialise les vidages : les lots sont appliqués dans l'ordre de réception
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, profile_id, movie_id, duration_watched, completed):
+        """Enregistre la dernière position connue pour (profil, film)."""
+        with self._lock:
+            self._pending[(profile_id, movie_id)] = (duration_watched, completed)
+            full = len(self._pending) >= self.max_pending
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def pending(self, profile_id, movie_id):
+        """Position en attente d'écriture, ou None."""
+        with self._lock:
+            return self._pending.get((profile_id, movie_id))
+
+    def pending_many(self, profile_id, movie_ids):
+        """Positions en attente d'un profil pour plusieurs films : {film: (durée, terminé)}."""
+        with self._lock:
+            return {
+                movie_id: self._pending[(profile_id, movie_id)]
+                for movie_id in movie_ids if (profile_id, movie_id) in self._pending
+            }
+
+    def discard(self, profile_id, movie_id=None):
+        """
+        Oublie les positions en attente d'un profil (ou d'un seul film).
+        Attend la fin d'un vidage en cours : un lot déjà retiré du tampon ne
+        peut plus réécrire la ligne après le retour de discard().
+        """
+        with self._flush_lock, self._lock:
+            for key in list(self._pending):
+                if key[0] == profile_id and (movie_id is None or key[1] == movie_id):
+                    del self._pending[key]
+
+    def flush(self, profile_id=None):
+        """
+        Écrit les positions en attente, toutes ou seulement celles de
+        `profile_id` (pages d'un utilisateur : sans payer les écritures des
+        autres). Retourne le nombre de lignes écrites.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if profile_id is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    keys = [key for key in self._pending if key[0] == profile_id]
+                    batch = {key: self._pending.pop(key) for key in keys}
+            if not batch:
+                return 0
+            rows = [
+                WatchHistory(
+                    user_profile_id=profile_id,
+                    movie_id=movie_id,
+                    duration_watched=duration_watched,
+                    completed=completed,
+                )
+                for (profile_id, movie_id), (duration_watched, completed) in batch.items()
+            ]
+            try:
+                with transaction.atomic():
+                    existing = self._existing(batch)
+                    changes = self._stats_changes(batch, existing)
+                    WatchHistory.objects.bulk_create(
+                        rows,
+                        update_conflicts=True,
+                        unique_fields=['user_profile', 'movie'],
+                        update_fields=['duration_watched', 'completed', 'updated_at'],
+                    )
+                    for profile_id, deltas in changes.items():
+                        UserProfile.objects.filter(pk=profile_id).adjust_stats(**deltas)
+                    # Premières lectures : comptées dans les tendances
+                    trending.record(
+                        (movie_id, trending.VIEW_WEIGHT)
+                        for profile_id, movie_id in batch if (profile_id, movie_id) not in existing
+                    )
+            except Exception:
+                # Remettre le lot en attente sans écraser des positions plus récentes
+                with self._lock:
+                    for key, value in batch.items():
+                        self._pending.setdefault(key, value)
+                raise
+            return len(rows)
+
+    def _existing(self, batch):
+        """État `completed` des lignes déjà en base pour les clés du lot."""
+        return {
+            (profile_id, movie_id): completed
+            for profile_id, movie_id, completed in WatchHistory.objects.filter(
+                user_profile_id__in={profile_id for profile_id, _ in batch},
+                movie_id__in={movie_id for _, movie_id in batch},
+            ).values_list('user_profile_id', 'movie_id', 'completed')
+        }
+
+    def _stats_changes(self, batch, existing):
+        """Variations des compteurs de chaque profil induites par le lot."""
+        changes = defaultdict(Counter)
+        for key, (_, completed) in batch.items():
+            changes[key[0]].update(WatchHistory.stats_changes(existing.get(key), completed))
+        return changes
+
+    def close(self):
+        """Arrête le thread de vidage et écrit ce qui reste (arrêt du processus)."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._run, name='flixora-progress-flush', daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Échec de l'écriture de la progression de lecture")
+            finally:
+                connections.close_all()
+
+
+progress_buffer = ProgressBuffer(
+    flush_interval=getattr(settings, 'FLIXORA_PROGRESS_FLUSH_INTERVAL', 5.0),
+    max_pending=getattr(settings, 'FLIXORA_PROGRESS_MAX_PENDING', 500),
+)
+
+atexit.register(progress_buffer.close)
@@ -0,0 +1,192 @@
+# movies/query_budget.py
+"""
+Budget de requêtes SQL par vue.
+
+Le middleware enregistre, pour chaque requête HTTP, le nombre de requêtes
+SQL, les doublons (même SQL, mêmes paramètres) et le temps SQL total. Les
+budgets sont déclarés par nom d'URL dans QUERY_BUDGETS (complétés par le
+réglage FLIXORA_QUERY_BUDGETS).
+
+- En-tête de debug : `X-Query-Budget: queries=5; duplicates=0; time=1.42ms; budget=6`
+  (si FLIXORA_QUERY_BUDGET_HEADER est actif).
+- Dépassement : avertissement dans les logs, ou exception QueryBudgetExceeded
+  si FLIXORA_QUERY_BUDGET_STRICT est actif (utilisé par les tests).
+
+Le middleware n'est chargé que si FLIXORA_QUERY_BUDGET est actif (DEBUG et
+tests) : en production, les requêtes SQL ne sont pas enveloppées.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+HEADER_NAME = 'X-Query-Budget'
+
+# Nombre maximal de requêtes SQL par nom d'URL (session et utilisateur compris).
+# Une vue absente n'a pas de budget ; les tests exigent que chaque vue en ait un.
+QUERY_BUDGETS = {
+    'movie_list': 11,
+    'movie_detail': 15,
+    'stream_movie': 1,
+    'stream_episode': 1,
+    'episode_navigation': 1,
+    'films': 4,
+    'animes': 4,
+    'series': 4,
+    'movies_by_type': 4,
+    'movie_cards': 4,
+    'search_api': 2,
+    'catalog_cache_stats': 2,
+    'login': 10,
+    'register': 4,
+    'logout': 4,
+    'profile': 4,
+    'update_avatar': 5,
+    'avatar_status': 3,
+    'update_profile': 3,
+    'toggle_favorite': 10,
+    'get_favorites': 4,
+    'clear_favorites': 7,
+    'add_comment': 10,
+    'movie_comments': 3,
+    'add_rating': 13,
+    'add_to_watch_history': 8,
+    'watch_history': 4,
+    'clear_watch_history': 8,
+    'remove_from_history': 8,
+    'check_watch_history': 5,
+    'movie_status': 6,
+}
+
+
+class QueryBudgetExceeded(Exception):
+    """Une vue a dépassé son budget de requêtes SQL."""
+
+
+def get_budget(url_name):
+    """Budget déclaré pour `url_name`, ou None."""
+    budgets = {**QUERY_BUDGETS, **getattr(settings, 'FLIXORA_QUERY_BUDGETS', {})}
+    return budgets.get(url_name)
+
+
+class QueryStats:
+    """Requêtes SQL exécutées pendant un bloc `record()`."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, repr(params), time.perf_counter() - start))
+
+    @contextmanager
+    def record(self):
+        """Enregistre les requêtes de toutes les connexions du thread courant."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duplicates(self):
+        """Nombre de requêtes répétées à l'identique."""
+        return self.count - len({(sql, params) for sql, params, _ in self.queries})
+
+    def duplicated_sql(self):
+        """Requêtes répétées et leur nombre d'exécutions."""
+        counter = Counter((sql, params) for sql, params, _ in self.queries)
+        return [(sql, params, n) for (sql, params), n in counter.items() if n > 1]
+
+    @property
+    def time_ms(self):
+        return sum(duration for _, _, duration in self.queries) * 1000
+
+    def header_value(self, budget=None):
+        value = 'queries={}; duplicates={}; time={:.2f}ms'.format(self.count, self.duplicates, self.time_ms)
+        if budget is not None:
+            value += '; budget={}'.format(budget)
+        return value
+
+
+class QueryBudgetMiddleware:
+    """Mesure les requêtes SQL de chaque vue et vérifie son budget."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'FLIXORA_QUERY_BUDGET', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        with stats.record():
+            response = self.get_response(request)
+        return self._check(request, response, stats)
+
+    async def __acall__(self, request):
+        # Sous ASGI, l'ORM s'exécute dans le thread synchrone propre à la requête :
+        # les enveloppes sont posées sur les connexions de ce thread
+        stats = QueryStats()
+        recording = stats.record()
+        await sync_to_async(recording.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.__exit__)(None, None, None)
+        return self._check(request, response, stats)
+
+    def _check(self, request, response, stats):
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        budget = get_budget(url_name)
+        response.query_stats = stats
+        response.query_budget = budget
+
+        if getattr(settings, 'FLIXORA_QUERY_BUDGET_HEADER', settings.DEBUG):
+            response[HEADER_NAME] = stats.header_value(budget)
+
+        if budget is not None and stats.count > budget:
+            message = '{} : {} requêtes SQL pour un budget de {} ({} en double)'.format(
+                url_name, stats.count, budget, stats.duplicates
+            )
+            if getattr(settings, 'FLIXORA_QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
+
+
+class QueryBudgetTestMixin:
+    """Assertions de budget pour les TestCase (réponses du client de test)."""
+
+    def assertWithinQueryBudget(self, response, url_name=None):
+        stats = response.query_stats
+        budget = get_budget(url_name) if url_name else response.query_budget
+        self.assertIsNotNone(budget, 'Aucun budget déclaré pour cette vue')
+        self.assertLessEqual(
+            stats.count, budget,
+            'Budget dépassé : {}\n{}'.format(
+                stats.header_value(budget),
+                '\n'.join(sql for sql, _, _ in stats.queries),
+            ),
+        )
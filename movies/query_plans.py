@@ -0,0 +1,130 @@
+# movies/query_plans.py
+"""
+Plans d'exécution des requêtes SQL émises par les vues.
+
+`capture()` enregistre les requêtes exécutées dans un bloc ; `explain()`
+demande leur plan à la base (EXPLAIN QUERY PLAN sous SQLite,
+EXPLAIN (FORMAT JSON) sous PostgreSQL) et signale :
+
+- `scan` : parcours complet d'une table (aucun index utilisable) ;
+- `sort` : tri dans une structure temporaire (B-tree temporaire sous SQLite,
+  nœud Sort sous PostgreSQL) au lieu de lire les lignes dans l'ordre d'un index.
+
+Les cas attendus (classement par un agrégat ou par pertinence plein texte,
+lecture d'une seule ligne) sont déclarés dans ALLOWED_ISSUES avec leur justification.
+Utilisé par `manage.py explain_views` et par les tests de non-régression.
+"""
+import re
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+PlanIssue = namedtuple('PlanIssue', 'kind table detail sql')
+
+# (type, fragment du SQL) -> justification
+ALLOWED_ISSUES = {
+    ('sort', 'SUM("movies_moviesimilarity"."score")'):
+        'recommandations : classement par la somme des similarités, calculée sur quelques centaines de voisins',
+    ('sort', 'bm25(movies_search_index'): 'recherche : classement par pertinence, borné aux films trouvés',
+    ('scan', 'FROM "movies_movietrending" U0 LIMIT 1'): 'tendances : référence commune, une seule ligne lue',
+}
+
+# Requêtes dont le plan est pertinent (les INSERT et les SAVEPOINT n'ont pas de plan intéressant)
+EXPLAINABLE = re.compile(r'^\s*(SELECT|UPDATE|DELETE)\b', re.IGNORECASE)
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY)')
+
+
+class CapturedQueries:
+    """Requêtes (alias, SQL, paramètres) exécutées pendant un bloc `capture()`."""
+
+    def __init__(self):
+        self.queries = []
+
+    def wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            if not many and EXPLAINABLE.match(sql):
+                self.queries.append((alias, sql, params))
+            return execute(sql, params, many, context)
+        return record
+
+
+@contextmanager
+def capture():
+    """Enregistre les requêtes de toutes les connexions du thread courant."""
+    captured = CapturedQueries()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(captured.wrapper(connection.alias)))
+        yield captured
+
+
+def _sqlite_issues(cursor, sql, params):
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+    issues = []
+    for row in cursor.fetchall():
+        detail = row[-1]
+        scan = SQLITE_SCAN.match(detail)
+        if scan:
+            issues.append(PlanIssue('scan', scan.group(1), detail, sql))
+        elif SQLITE_SORT.search(detail):
+            issues.append(PlanIssue('sort', None, detail, sql))
+    return issues
+
+
+def _postgresql_issues(cursor, sql, params):
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+    plan = cursor.fetchone()[0]
+    issues = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get('Plans', ()))
+        if node['Node Type'] == 'Seq Scan':
+            detail = 'Seq Scan on {}'.format(node['Relation Name'])
+            issues.append(PlanIssue('scan', node['Relation Name'], detail, sql))
+        elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+            detail = '{} by {}'.format(node['Node Type'], ', '.join(node.get('Sort Key', ())))
+            issues.append(PlanIssue('sort', None, detail, sql))
+    return issues
+
+
+def explain(alias, sql, params):
+    """Problèmes du plan d'une requête (liste de PlanIssue), hors ALLOWED_ISSUES."""
+    connection = connections[alias]
+    if connection.vendor == 'sqlite':
+        inspect = _sqlite_issues
+    elif connection.vendor == 'postgresql':
+        inspect = _postgresql_issues
+    else:
+        return []
+    with connection.cursor() as cursor:
+        issues = inspect(cursor, sql, params)
+    return [issue for issue in issues if not is_allowed(issue)]
+
+
+def is_allowed(issue):
+    return any(kind == issue.kind and fragment in issue.sql for kind, fragment in ALLOWED_ISSUES)
+
+
+def plan_issues(captured):
+    """Problèmes des plans de requêtes capturées, chaque SQL n'étant analysé qu'une fois."""
+    seen = set()
+    issues = []
+    for alias, sql, params in captured.queries:
+        if (alias, sql) in seen:
+            continue
+        seen.add((alias, sql))
+        issues.extend(explain(alias, sql, params))
+    return issues
+
+
+class QueryPlanTestMixin:
+    """Assertion de non-régression des plans pour les TestCase."""
+
+    def assertNoPlanIssues(self, captured):
+        issues = plan_issues(captured)
+        self.assertFalse(issues, 'Plans signalés :\n' + '\n'.join(
+            '{} ({}) : {}'.format(issue.kind, issue.detail, issue.sql) for issue in issues
+        ))
@@ -0,0 +1,253 @@
+# movies/recommendations.py
+"""
+Recommandations par filtrage collaboratif item-item.
+
+Hors ligne (`manage.py build_recommendations`) :
+- les favoris, évaluations et l'historique forment une matrice creuse
+  utilisateur × film, un poids implicite par couple (le plus fort l'emporte) ;
+- la similarité de deux films est le cosinus de leurs colonnes, atténué
+  quand peu d'utilisateurs les partagent ;
+- seuls les K meilleurs voisins de chaque film sont gardés dans MovieSimilarity.
+
+À la lecture, les vues ne font que lire cette table : aucun calcul matriciel
+par requête.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import Favorite, Movie, MovieSimilarity, Rating, WatchHistory
+
+# Voisins conservés par film
+TOP_K = 20
+# Atténuation des similarités à faible support : score × n / (n + SHRINKAGE)
+SHRINKAGE = 5
+# Interactions retenues par utilisateur (les plus fortes) : borne le coût des gros comptes
+MAX_ITEMS_PER_USER = 300
+# Films récents de l'historique utilisés comme point de départ des recommandations
+SEED_HISTORY = 20
+# Identifiants par clause IN lors d'un chargement partiel
+FILTER_CHUNK = 500
+
+FAVORITE_WEIGHT = 1.0
+COMPLETED_WEIGHT = 1.0
+STARTED_WEIGHT = 0.5
+# Note -> poids ; les notes absentes (1 et 2) ne comptent pas comme un signal positif
+RATING_WEIGHTS = {5: 1.0, 4: 1.0, 3: 0.5}
+
+
+def _interactions(field=None, ids=None):
+    """(profil, film, poids) des trois tables, restreints à `field` ∈ `ids` (par paquets) si donnés."""
+    if ids is None:
+        filters = [{}]
+    else:
+        ids = sorted(ids)
+        filters = [{f'{field}__in': ids[start:start + FILTER_CHUNK]} for start in range(0, len(ids), FILTER_CHUNK)]
+    for chunk in filters:
+        for profile_id, movie_id in Favorite.objects.filter(**chunk).values_list('user_profile_id', 'movie_id').iterator():
+            yield profile_id, movie_id, FAVORITE_WEIGHT
+        ratings = Rating.objects.filter(score__in=RATING_WEIGHTS, **chunk) \
+            .values_list('user_profile_id', 'movie_id', 'score')
+        for profile_id, movie_id, score in ratings.iterator():
+            yield profile_id, movie_id, RATING_WEIGHTS[score]
+        history = WatchHistory.objects.filter(**chunk).values_list('user_profile_id', 'movie_id', 'completed')
+        for profile_id, movie_id, completed in history.iterator():
+            yield profile_id, movie_id, COMPLETED_WEIGHT if completed else STARTED_WEIGHT
+
+
+def load_interactions(profile_ids=None, movie_ids=None):
+    """
+    Matrice creuse {profil: {film: poids}} construite en parcourant les trois
+    tables, entières ou restreintes à des profils (lignes complètes) ou à des
+    films (colonnes : les lignes n'y sont que partielles et ne sont pas tronquées).
+    """
+    matrix = defaultdict(dict)
+    if movie_ids is not None:
+        rows = _interactions('movie_id', movie_ids)
+    elif profile_ids is not None:
+        rows = _interactions('user_profile_id', profile_ids)
+    else:
+        rows = _interactions()
+    for profile_id, movie_id, weight in rows:
+        row = matrix[profile_id]
+        if weight > row.get(movie_id, 0):
+            row[movie_id] = weight
+
+    if movie_ids is None:
+        for profile_id, row in matrix.items():
+            if len(row) > MAX_ITEMS_PER_USER:
+                matrix[profile_id] = dict(heapq.nlargest(MAX_ITEMS_PER_USER, row.items(), key=lambda item: item[1]))
+    return matrix
+
+
+def affected_interactions(movie_ids):
+    """
+    Sous-matrice suffisante pour recalculer les voisins de `movie_ids` :
+    les lignes complètes des profils qui ont interagi avec ces films
+    (produits scalaires), et les colonnes des films que ces profils ont
+    croisés (normes des voisins). Le reste de la matrice n'est pas lu.
+
+    Seule approximation : la troncature MAX_ITEMS_PER_USER n'est pas appliquée
+    aux gros comptes hors de la sélection dans la norme des voisins ; le
+    prochain calcul complet la rétablit.
+    """
+    profile_ids = set(load_interactions(movie_ids=movie_ids))
+    rows = load_interactions(profile_ids=profile_ids)
+    matrix = load_interactions(movie_ids={movie_id for row in rows.values() for movie_id in row})
+    matrix.update(rows)
+    return matrix
+
+
+class ItemSimilarity:
+    """Similarités cosinus calculées à partir d'une matrice utilisateur × film."""
+
+    def __init__(self, matrix, top_k=TOP_K, shrinkage=SHRINKAGE):
+        self.matrix = matrix
+        self.top_k = top_k
+        self.shrinkage = shrinkage
+        # Colonnes (film -> profils) et normes des colonnes
+        self.columns = defaultdict(dict)
+        for profile_id, row in matrix.items():
+            for movie_id, weight in row.items():
+                self.columns[movie_id][profile_id] = weight
+        self.norms = {
+            movie_id: math.sqrt(sum(weight * weight for weight in column.values()))
+            for movie_id, column in self.columns.items()
+        }
+
+    def scores(self, movie_id):
+        """Similarité de `movie_id` avec chaque film qui partage au moins un utilisateur."""
+        dots = defaultdict(float)
+        support = defaultdict(int)
+        for profile_id, weight in self.columns.get(movie_id, {}).items():
+            for other_id, other_weight in self.matrix[profile_id].items():
+                if other_id != movie_id:
+                    dots[other_id] += weight * other_weight
+                    support[other_id] += 1
+        norm = self.norms.get(movie_id)
+        return {
+            other_id: dot / (norm * self.norms[other_id]) * support[other_id] / (support[other_id] + self.shrinkage)
+            for other_id, dot in dots.items()
+        }
+
+    def neighbours(self, movie_id):
+        """Les K meilleurs voisins de `movie_id` : [(film, score)] par score décroissant."""
+        return heapq.nlargest(self.top_k, self.scores(movie_id).items(), key=lambda item: item[1])
+
+
+def last_build():
+    """Date du dernier calcul enregistré, ou None si la table est vide."""
+    return MovieSimilarity.objects.aggregate(last=Max('computed_at'))['last']
+
+
+def changed_movies(since):
+    """
+    Films dont les interactions ont changé depuis `since` : favoris ajoutés,
+    notes et historiques créés ou modifiés (`updated_at`).
+    """
+    changed = set(Favorite.objects.filter(added_at__gt=since).values_list('movie_id', flat=True))
+    changed.update(Rating.objects.filter(updated_at__gt=since).values_list('movie_id', flat=True))
+    changed.update(WatchHistory.objects.filter(updated_at__gt=since).values_list('movie_id', flat=True))
+    return changed
+
+
+def _write(neighbours, now, batch_size):
+    """Remplace les voisins des films de `neighbours` ({film: [(voisin, score)]})."""
+    movie_ids = list(neighbours)
+    for start in range(0, len(movie_ids), batch_size):
+        chunk = movie_ids[start:start + batch_size]
+        with transaction.atomic():
+            MovieSimilarity.objects.filter(movie_id__in=chunk).delete()
+            MovieSimilarity.objects.bulk_create([
+                MovieSimilarity(movie_id=movie_id, similar_id=similar_id, score=score, computed_at=now)
+                for movie_id in chunk
+                for similar_id, score in neighbours[movie_id]
+            ], batch_size=batch_size)
+
+
+def build_similarities(full=False, top_k=TOP_K, batch_size=1000):
+    """
+    Calcule et enregistre les voisins des films.
+
+    En mode incrémental, seuls les films dont les interactions ont changé
+    depuis le dernier calcul sont recalculés, à partir des seules
+    interactions qui les concernent (affected_interactions) ; leurs nouveaux
+    scores sont ensuite reportés dans les listes de leurs voisins. Les suppressions
+    (favori retiré, historique effacé) ne sont prises en compte que par
+    un calcul complet (`full=True`).
+
+    Retourne (films recalculés, films dont la liste a été fusionnée).
+    """
+    now = timezone.now()
+    since = None if full else last_build()
+    targets = None if since is None else changed_movies(since)
+    if targets is not None and not targets:
+        return 0, 0
+
+    matrix = load_interactions() if targets is None else affected_interactions(targets)
+    similarity = ItemSimilarity(matrix, top_k=top_k)
+    if targets is None:
+        # Calcul complet : les films sans interaction perdent leurs voisins
+        MovieSimilarity.objects.exclude(movie_id__in=list(similarity.columns)).delete()
+        targets = set(similarity.columns)
+
+    neighbours = {movie_id: similarity.neighbours(movie_id) for movie_id in targets}
+    _write(neighbours, now, batch_size)
+    if since is None:
+        return len(neighbours), 0
+
+    # Symétrie : le score (a, b) d'un film recalculé vaut aussi pour (b, a)
+    updates = defaultdict(dict)
+    for movie_id in targets:
+        for other_id, score in similarity.scores(movie_id).items():
+            if other_id not in targets:
+                updates[other_id][movie_id] = score
+    existing = defaultdict(dict)
+    rows = MovieSimilarity.objects.filter(movie_id__in=list(updates)).values_list('movie_id', 'similar_id', 'score')
+    for movie_id, similar_id, score in rows.iterator():
+        existing[movie_id][similar_id] = score
+
+    merged = {}
+    for movie_id, scores in updates.items():
+        current = {
+            similar_id: score for similar_id, score in existing[movie_id].items() if similar_id not in targets
+        }
+        current.update(scores)
+        ranked = heapq.nlargest(top_k, current.items(), key=lambda item: item[1])
+        if ranked != sorted(existing[movie_id].items(), key=lambda item: item[1], reverse=True):
+            merged[movie_id] = ranked
+    _write(merged, now, batch_size)
+    return len(neighbours), len(merged)
+
+
+# ---------------------------------------------------------------------- lecture
+
+def similar_movies(movie_id, limit):
+    """Films les plus proches de `movie_id` (lecture de la table précalculée)."""
+    return list(
+        Movie.objects.filter(similar_to__movie_id=movie_id)
+        .order_by('-similar_to__score', 'similar_to__similar')[:limit]
+    )
+
+
+def recommended_for(user, favorite_ids, limit):
+    """
+    Films recommandés à `user` : somme des similarités avec ses favoris et
+    ses derniers visionnages, hors films déjà vus ou en favoris.
+    """
+    recent = WatchHistory.objects.filter(user_profile__user_id=user.pk).order_by('-watched_at')
+    seeds = set(favorite_ids)
+    seeds.update(recent.values_list('movie_id', flat=True)[:SEED_HISTORY])
+    if not seeds:
+        return []
+    return list(
+        Movie.objects.filter(similar_to__movie_id__in=seeds)
+        .exclude(pk__in=seeds)
+        .exclude(watched_by__user_profile__user_id=user.pk)
+        .annotate(recommendation_score=Sum('similar_to__score'))
+        .order_by('-recommendation_score', 'pk')[:limit]
+    )
@@ -0,0 +1,121 @@
+# movies/search.py
+"""
+Moteur de recherche plein texte du catalogue.
+
+Sous SQLite, l'index est une table virtuelle FTS5 (une ligne par film, rowid =
+id du film) couvrant le titre, la description, le réalisateur et les titres
+d'épisodes. Elle est tenue à jour par les signaux de Movie et Episode.
+Sur les autres bases, la recherche retombe sur des filtres `icontains`.
+"""
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import Movie, Episode
+
+SEARCH_TABLE = 'movies_search_index'
+
+# Poids bm25 par colonne : title, description, director, episodes
+SEARCH_WEIGHTS = (10.0, 1.0, 3.0, 2.0)
+
+MAX_QUERY_TERMS = 10
+
+
+def fts_available():
+    """L'index FTS5 n'existe que sous SQLite."""
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(query):
+    """
+    Transforme la saisie utilisateur en requête FTS5 sûre : chaque mot devient
+    un terme préfixé ("mot"*), tous les termes doivent être présents.
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_QUERY_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _document_for(movie):
+    episode_titles = Episode.objects.filter(movie_id=movie.pk).values_list('title', flat=True)
+    return [movie.title, movie.description, movie.director or '', ' '.join(episode_titles)]
+
+
+def index_movie(movie):
+    """(Ré)indexe un film et les titres de ses épisodes."""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [movie.pk])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, director, episodes) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [movie.pk, *_document_for(movie)],
+        )
+
+
+def remove_movie(movie_id):
+    """Retire un film de l'index."""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [movie_id])
+
+
+def rebuild_index():
+    """Reconstruit entièrement l'index. Retourne le nombre de films indexés."""
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        # Titres d'épisodes agrégés côté SQL plutôt qu'une requête par film
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, director, episodes) "
+            "SELECT m.id, m.title, m.description, COALESCE(m.director, ''), "
+            "COALESCE((SELECT group_concat(e.title, ' ') FROM movies_episode e "
+            "WHERE e.movie_id = m.id), '') "
+            "FROM movies_movie m"
+        )
+        return cursor.rowcount
+
+
+def search_movies(query, video_type=None, limit=20, offset=0):
+    """
+    Recherche des films par pertinence.
+    Retourne (liste des films de la page, il reste des résultats ?).
+    """
+    if fts_available():
+        match = build_match_query(query)
+        if not match:
+            return [], False
+        sql = (
+            f"SELECT s.rowid FROM {SEARCH_TABLE} s "
+            "JOIN movies_movie m ON m.id = s.rowid "
+            f"WHERE {SEARCH_TABLE} MATCH %s"
+        )
+        params = [match]
+        if video_type:
+            sql += " AND m.video_type = %s"
+            params.append(video_type)
+        sql += f" ORDER BY bm25({SEARCH_TABLE}, %s, %s, %s, %s), m.id DESC LIMIT %s OFFSET %s"
+        params += [*SEARCH_WEIGHTS, limit + 1, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ids = [row[0] for row in cursor.fetchall()]
+        has_more = len(ids) > limit
+        ids = ids[:limit]
+        movies = Movie.objects.in_bulk(ids)
+        return [movies[pk] for pk in ids if pk in movies], has_more
+
+    # Repli hors SQLite : recherche par sous-chaîne
+    terms = re.findall(r'\w+', query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return [], False
+    queryset = Movie.objects.all()
+    for term in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term)
+            | Q(director__icontains=term) | Q(episodes__title__icontains=term)
+        )
+    if video_type:
+        queryset = queryset.filter(video_type=video_type)
+    movies = list(queryset.distinct().order_by('-created_at', '-id')[offset:offset + limit + 1])
+    return movies[:limit], len(movies) > limit
@@ -1,8 +1,20 @@
 # movies/signals.py
-from django.db.models.signals import post_save, post_migrate
+import sys
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, Movie, Rating, Comment, Episode, Favorite, WatchHistory, MovieTrending, MediaBlob
+from . import search, trending
+from .tasks import run_in_background
+from .video_ingest import ingest_video
+from .thumbnails import generate_derivatives
+from .avatars import is_content_addressed
+from .catalog_cache import bump_catalog_version
+from .profile_cache import invalidate_user
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -13,21 +25,219 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.get_or_create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Invalide l'utilisateur mis en cache pour ses sessions (nom, e-mail, mot de passe...)"""
+    invalidate_user(instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """Invalide le profil mis en cache avec l'utilisateur (bio, avatar)"""
+    invalidate_user(instance.user_id)
+
+@receiver(post_migrate)
+def create_profiles_for_existing_users(sender, using=None, verbosity=1, stdout=None, **kwargs):
+    """
+    Crée en lot les profils manquants après les migrations (une anti-jointure,
+    aucune requête par utilisateur quand tous ont déjà un profil)
+    """
+    if sender.name == 'movies':
+        created = UserProfile.objects.db_manager(using).backfill()
+        if created and verbosity:
+            (stdout or sys.stdout).write(f'{created} profil(s) utilisateur créé(s).\n')
+
+@receiver(pre_save, sender=Rating)
+def remember_previous_score(sender, instance, **kwargs):
     """
-    Sauvegarde automatiquement le profil utilisateur
+    Retient la note actuellement en base avant une modification
     """
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+    if hasattr(instance, '_loaded_score'):
+        instance._previous_score = instance._loaded_score
+    elif instance.pk:
+        instance._previous_score = Rating.objects.filter(pk=instance.pk).values_list('score', flat=True).first()
     else:
-        # Créer le profil si non existant
-        UserProfile.objects.get_or_create(user=instance)
+        instance._previous_score = None
 
-@receiver(post_migrate)
-def create_profiles_for_existing_users(sender, **kwargs):
+@receiver(post_save, sender=Rating)
+def update_rating_aggregates_on_save(sender, instance, created, **kwargs):
     """
-    Crée des profils pour tous les utilisateurs existants après les migrations
+    Répercute la création ou la modification d'une note sur les agrégats du film
+    et le compteur du profil
     """
-    if sender.name == 'movies':
-        for user in User.objects.all():
-            UserProfile.objects.get_or_create(user=user)
\ No newline at end of file
+    old_score = None if created else getattr(instance, '_previous_score', None)
+    Movie.objects.filter(pk=instance.movie_id).apply_rating_change(old_score, instance.score)
+    if created:
+        UserProfile.objects.filter(pk=instance.user_profile_id).adjust_stats(rating_count=1)
+        trending.record_later([(instance.movie_id, trending.rating_weight(instance.score))])
+    instance._loaded_score = instance.score
+
+@receiver(post_delete, sender=Rating)
+def update_rating_aggregates_on_delete(sender, instance, **kwargs):
+    """
+    Retire une note supprimée des agrégats du film
+    """
+    old_score = getattr(instance, '_loaded_score', instance.score)
+    Movie.objects.filter(pk=instance.movie_id).apply_rating_change(old_score, None)
+    UserProfile.objects.filter(pk=instance.user_profile_id).adjust_stats(rating_count=-1)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_previous_approval(sender, instance, **kwargs):
+    """
+    Retient l'approbation actuellement en base avant une modification (modération)
+    """
+    if hasattr(instance, '_loaded_approved'):
+        instance._previous_approved = instance._loaded_approved
+    elif instance.pk:
+        instance._previous_approved = Comment.objects.filter(pk=instance.pk).values_list('is_approved', flat=True).first()
+    else:
+        instance._previous_approved = None
+
+@receiver(post_save, sender=Comment)
+def update_comment_count_on_save(sender, instance, created, **kwargs):
+    """
+    Répercute la création ou la modération d'un commentaire sur le compteur du film
+    """
+    was_approved = False if created else bool(getattr(instance, '_previous_approved', instance.is_approved))
+    Movie.objects.filter(pk=instance.movie_id).adjust_comment_count(int(instance.is_approved) - int(was_approved))
+    instance._loaded_approved = instance.is_approved
+
+@receiver(post_delete, sender=Comment)
+def update_comment_count_on_delete(sender, instance, **kwargs):
+    """
+    Retire un commentaire approuvé supprimé du compteur du film
+    """
+    if getattr(instance, '_loaded_approved', instance.is_approved):
+        Movie.objects.filter(pk=instance.movie_id).adjust_comment_count(-1)
+
+@receiver(pre_delete, sender=Movie)
+def release_profile_stats(sender, instance, **kwargs):
+    """
+    Retire des compteurs des profils les favoris, l'historique et les
+    commentaires supprimés en cascade avec le film (les notes ont leur propre
+    signal). Une requête groupée par table, puis un UPDATE par combinaison
+    de variations
+    """
+    deltas = {}
+    sources = [
+        (Favorite, {'favorite_count': Count('id')}),
+        (WatchHistory, {
+            'history_count': Count('id'),
+            'history_completed_count': Count('id', filter=Q(completed=True)),
+        }),
+        (Comment, {'comment_count': Count('id')}),
+    ]
+    for model, aggregates in sources:
+        rows = model.objects.filter(movie_id=instance.pk).values('user_profile_id').annotate(**aggregates).order_by()
+        for row in rows:
+            profile_deltas = deltas.setdefault(row['user_profile_id'], {})
+            for field in aggregates:
+                if row[field]:
+                    profile_deltas[field] = -row[field]
+    by_change = {}
+    for profile_id, changes in deltas.items():
+        by_change.setdefault(tuple(sorted(changes.items())), []).append(profile_id)
+    for changes, profile_ids in by_change.items():
+        UserProfile.objects.filter(pk__in=profile_ids).adjust_stats(**dict(changes))
+
+@receiver(post_save, sender=Favorite)
+def record_favorite_trend(sender, instance, created, **kwargs):
+    """
+    Un nouveau favori fait monter le film dans les tendances
+    """
+    if created:
+        trending.record_later([(instance.movie_id, trending.FAVORITE_WEIGHT)])
+
+@receiver(post_save, sender=WatchHistory)
+def record_view_trend(sender, instance, created, **kwargs):
+    """
+    Une première visite fait monter le film dans les tendances
+    (les lignes écrites en lot par progress_buffer sont comptées au vidage)
+    """
+    if created:
+        trending.record_later([(instance.movie_id, trending.VIEW_WEIGHT)])
+
+@receiver(post_save, sender=Movie)
+def sync_trending_video_type(sender, instance, created, **kwargs):
+    """
+    Répercute un changement de type sur la table des tendances (index par type)
+    """
+    if not created:
+        MovieTrending.objects.filter(pk=instance.pk).exclude(video_type=instance.video_type) \
+            .update(video_type=instance.video_type)
+
+@receiver(post_save, sender=Movie)
+def index_movie_on_save(sender, instance, **kwargs):
+    """
+    Met à jour l'index de recherche plein texte du film
+    """
+    search.index_movie(instance)
+
+@receiver(post_delete, sender=Movie)
+def remove_movie_from_index(sender, instance, **kwargs):
+    """
+    Retire le film supprimé de l'index de recherche
+    """
+    search.remove_movie(instance.pk)
+
+@receiver(post_save, sender=Episode)
+@receiver(post_delete, sender=Episode)
+def reindex_series_on_episode_change(sender, instance, **kwargs):
+    """
+    Réindexe la série lorsque ses épisodes changent (titres d'épisodes indexés)
+    """
+    movie = Movie.objects.filter(pk=instance.movie_id).first()
+    if movie is not None:
+        search.index_movie(movie)
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Episode)
+@receiver(post_save, sender=UserProfile)
+def schedule_media_processing(sender, instance, **kwargs):
+    """
+    Lance en arrière-plan le traitement des fichiers nouvellement téléversés :
+    faststart et durée pour les vidéos, déclinaisons responsives pour les images
+    """
+    for field in instance.pop_changed_files():
+        fieldfile = getattr(instance, field)
+        if not fieldfile:
+            continue
+        if field == 'video':
+            run_in_background(ingest_video, sender._meta.label, instance.pk)
+        elif sender is UserProfile:
+            # Les avatars par empreinte sont déjà déclinés par movies.avatars
+            if not is_content_addressed(fieldfile.name):
+                run_in_background(generate_derivatives, fieldfile.name, fieldfile.storage)
+        else:
+            run_in_background(_generate_catalog_derivatives, fieldfile.name, fieldfile.storage)
+
+@receiver(post_delete, sender=Movie)
+@receiver(post_delete, sender=Episode)
+def release_media_blobs(sender, instance, **kwargs):
+    """
+    Libère les fichiers référencés par une ligne supprimée (le ramasse-miettes
+    `gc_media` supprime ceux qui ne sont plus référencés)
+    """
+    # Noms enregistrés en base, pas les éventuelles modifications en mémoire
+    changes = Counter()
+    for name in getattr(instance, '_counted_files', {}).values():
+        changes[name] -= 1
+    MediaBlob.objects.adjust(changes)
+
+def _generate_catalog_derivatives(name, storage):
+    generate_derivatives(name, storage)
+    # Les fragments en cache doivent reprendre le nouveau srcset
+    bump_catalog_version()
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Episode)
+@receiver(post_delete, sender=Episode)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Invalide le cache du catalogue (rangées et pages par type)
+    """
+    bump_catalog_version()
+    # Une page reconstruite avant le commit lirait encore l'ancienne ligne
+    transaction.on_commit(bump_catalog_version)
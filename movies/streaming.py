@@ -0,0 +1,163 @@
+# movies/streaming.py
+"""
+Diffusion des fichiers vidéo avec prise en charge des requêtes HTTP Range.
+
+Le corps est servi via FileResponse : sous un serveur WSGI qui fournit
+`wsgi.file_wrapper` (gunicorn, uWSGI), les octets partent par os.sendfile
+sans copie en espace utilisateur. Si FLIXORA_MEDIA_ACCEL est configuré, le
+transfert est entièrement délégué au proxy frontal (X-Accel-Redirect pour
+nginx, X-Sendfile pour Apache/lighttpd).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Taille des blocs lus quand sendfile n'est pas disponible
+STREAM_BLOCK_SIZE = 512 * 1024
+
+
+class RangeFile:
+    """
+    Fichier ouvert restreint à l'intervalle [start, start + length).
+
+    `fileno()` est exposé pour que `wsgi.file_wrapper` puisse utiliser
+    sendfile à partir de la position courante ; `read()` borne la lecture
+    pour les serveurs qui itèrent sur le corps.
+    """
+
+    def __init__(self, path, start, length):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self._file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+def file_etag(stat):
+    """
+    ETag fort calculé à partir de la taille et de la date de modification
+    (If-Range n'accepte que des ETag forts).
+    """
+    return quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+
+
+def parse_range(header, size):
+    """
+    Analyse un en-tête Range à intervalle unique.
+    Retourne (début, fin incluse), None si l'en-tête est absent ou ignoré,
+    ou lève ValueError si l'intervalle n'est pas satisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        # Absent, mal formé ou multi-intervalles : réponse complète
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffixe : les N derniers octets
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('Intervalle non satisfiable')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Intervalle non satisfiable')
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and int(last_modified) <= if_range_date
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def _accel_response(path, content_type):
+    """Délègue le transfert (et la gestion des Range) au proxy frontal."""
+    mode = getattr(settings, 'FLIXORA_MEDIA_ACCEL', None)
+    response = HttpResponse(content_type=content_type)
+    relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'FLIXORA_MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + relative)
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def serve_media_file(request, path, content_type=None):
+    """
+    Sert un fichier média en gérant Range/206, If-Range, ETag et Last-Modified.
+    """
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if getattr(settings, 'FLIXORA_MEDIA_ACCEL', None):
+        return _accel_response(path, content_type)
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = file_etag(stat)
+    last_modified = stat.st_mtime
+
+    if _not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    byte_range = None
+    if _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    length = end - start + 1 if size else 0
+
+    response = FileResponse(RangeFile(path, start, length), content_type=content_type)
+    response.block_size = STREAM_BLOCK_SIZE
+    response.status_code = 206 if byte_range else 200
+    response['Content-Length'] = str(length)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
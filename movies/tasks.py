@@ -0,0 +1,62 @@
+# movies/tasks.py
+"""
+Exécution de tâches en arrière-plan dans un pool de threads du processus.
+
+Les tâches sont soumises après le commit de la transaction courante, pour
+qu'elles voient les lignes qui viennent d'être enregistrées. Avec
+FLIXORA_BACKGROUND_TASKS = False elles s'exécutent de façon synchrone
+(utile pour les tests et les commandes de maintenance).
+"""
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'FLIXORA_TASK_WORKERS', 2),
+                thread_name_prefix='flixora-task',
+            )
+        return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Échec de la tâche %s", getattr(func, '__name__', func))
+    finally:
+        # Les connexions sont propres au thread : les fermer après chaque tâche
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Planifie `func(*args, **kwargs)` après le commit de la transaction courante."""
+    if not getattr(settings, 'FLIXORA_BACKGROUND_TASKS', True):
+        transaction.on_commit(lambda: func(*args, **kwargs))
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, func, args, kwargs))
+
+
+def shutdown(wait=True):
+    """Attend la fin des tâches en cours (appelé à l'arrêt du processus)."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+atexit.register(shutdown)
@@ -0,0 +1,30 @@
+# movies/templatetags/catalog_tags.py
+from django import template
+
+from movies import catalog_cache
+
+register = template.Library()
+
+
+class CatalogFragmentNode(template.Node):
+    def __init__(self, nodelist, vary_on):
+        self.nodelist = nodelist
+        self.vary_on = vary_on
+
+    def render(self, context):
+        parts = [var.resolve(context) for var in self.vary_on]
+        return catalog_cache.cached_fragment(lambda: self.nodelist.render(context), *parts)
+
+
+@register.tag
+def catalog_fragment(parser, token):
+    """
+    Met en cache le rendu d'un bloc jusqu'à la prochaine modification du catalogue.
+    Usage : {% catalog_fragment 'home_row' 'film' films_fav_key %} ... {% endcatalog_fragment %}
+    """
+    bits = token.split_contents()[1:]
+    if not bits:
+        raise template.TemplateSyntaxError("catalog_fragment attend au moins un nom de fragment")
+    nodelist = parser.parse(('endcatalog_fragment',))
+    parser.delete_first_token()
+    return CatalogFragmentNode(nodelist, [parser.compile_filter(bit) for bit in bits])
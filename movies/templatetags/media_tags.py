@@ -0,0 +1,51 @@
+# movies/templatetags/media_tags.py
+from django import template
+from django.utils.html import format_html
+
+from movies import avatars, thumbnails
+
+register = template.Library()
+
+
+def _sizes(sizes):
+    return thumbnails.SIZES.get(sizes, sizes)
+
+
+@register.simple_tag
+def webp_source(fieldfile, sizes='poster'):
+    """
+    Balise <source> WebP à placer dans un <picture>, avant le <img>.
+    Usage : {% webp_source movie.thumbnail 'poster' %}
+    """
+    value = thumbnails.srcset(fieldfile, 'webp')
+    if not value:
+        return ''
+    return format_html('<source type="image/webp" srcset="{}" sizes="{}">', value, _sizes(sizes))
+
+
+@register.simple_tag
+def srcset_attrs(fieldfile, sizes='poster'):
+    """
+    Attributs srcset/sizes JPEG pour un <img> existant.
+    Usage : <img src="{{ movie.thumbnail.url }}" {% srcset_attrs movie.thumbnail 'poster' %}>
+    """
+    value = thumbnails.srcset(fieldfile, 'jpeg')
+    if not value:
+        return ''
+    return format_html('srcset="{}" sizes="{}"', value, _sizes(sizes))
+
+
+@register.simple_tag
+def avatar_srcset_attrs(fieldfile, sizes='avatar'):
+    """
+    Attributs srcset/sizes d'un avatar : tailles carrées WebP pour un avatar
+    par empreinte, déclinaisons JPEG pour un ancien avatar.
+    Usage : <img src="{{ profile.avatar.url }}" {% avatar_srcset_attrs profile.avatar %}>
+    """
+    urls = avatars.avatar_urls(fieldfile)
+    if 'original' in urls:
+        return srcset_attrs(fieldfile, sizes)
+    if not urls:
+        return ''
+    value = ', '.join(f'{url} {size}w' for size, url in urls.items())
+    return format_html('srcset="{}" sizes="{}"', value, _sizes(sizes))
@@ -1,3 +1,1647 @@
-from django.test import TestCase
+import base64
+import json
+import math
+import os
+import shutil
+import struct
+import tempfile
+import time
+from datetime import timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.template import Context, Template
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from PIL import Image
+
+from . import avatars, catalog_cache, db_router, mp4, recommendations, search, thumbnails, trending
+from .blob_storage import TEMP_DIR, blob_storage, file_digest, is_blob_name
+from .checks import check_catalog_cache_backend, check_profile_cache_backend
+from .episodes import EpisodeIndex
+from . import urls as movie_urls
+from .models import (
+    Comment, Episode, Favorite, MediaBlob, Movie, MovieSimilarity, MovieTrending, Rating, UserProfile, WatchHistory,
+)
+from .pagination import decode_cursor, encode_cursor, keyset_paginate, normalize_cursor
+from .profile_cache import ENTRY_KEY
+from .progress import progress_buffer
+from .query_budget import HEADER_NAME, QUERY_BUDGETS, QueryBudgetExceeded, QueryBudgetTestMixin
+from .query_plans import QueryPlanTestMixin, capture
+from .streaming import serve_media_file
+from .video_ingest import ingest_video
+from .recommendations import build_similarities, recommended_for, similar_movies
+from .views import STATUS_MAX_IDS
+
+# Assez de lignes pour qu'une requête par élément dépasse n'importe quel budget
+FIXTURE_SIZE = 15
+
+
+class QueryBudgetDeclarationTests(SimpleTestCase):
+    def test_every_named_url_has_a_budget(self):
+        names = {
+            pattern.name for pattern in movie_urls.urlpatterns
+            if isinstance(pattern, URLPattern) and pattern.name
+        }
+        self.assertEqual(sorted(names - set(QUERY_BUDGETS)), [])
+
+
+@override_settings(FLIXORA_PROGRESS_BUFFER=False, FLIXORA_QUERY_BUDGET_STRICT=True)
+class ViewQueryBudgetTests(QueryBudgetTestMixin, QueryPlanTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', password='secret')
+        cls.profile = cls.user.profile
+        others = [User.objects.create_user(f'user{i}', password='secret').profile for i in range(3)]
+
+        cls.movies = []
+        for i in range(FIXTURE_SIZE):
+            for video_type in ('film', 'anime', 'serie'):
+                cls.movies.append(Movie.objects.create(
+                    title=f'{video_type} {i}', description='Description', director='Réalisateur',
+                    video_type=video_type, thumbnail='thumbnails/poster.jpg', duration=90,
+                ))
+        cls.movie = cls.movies[0]
+        cls.movie.video.save('film.mp4', ContentFile(b'\x00' * 4096))
+
+        cls.series = next(movie for movie in cls.movies if movie.video_type == 'serie')
+        cls.episodes = [
+            Episode.objects.create(
+                movie=cls.series, season_number=season, episode_number=number,
+                title=f'Épisode {number}', video='episodes/episode.mp4',
+            )
+            for season in (1, 2) for number in range(1, FIXTURE_SIZE // 2 + 1)
+        ]
+        cls.episodes[0].video.save('episode.mp4', ContentFile(b'\x00' * 4096))
+
+        for i, movie in enumerate(cls.movies[:FIXTURE_SIZE]):
+            Favorite.objects.create(user_profile=cls.profile, movie=movie)
+            WatchHistory.objects.create(user_profile=cls.profile, movie=movie, duration_watched=i * 60)
+            Rating.objects.create(user_profile=cls.profile, movie=movie, score=i % 5 + 1)
+        for profile in [cls.profile] + others:
+            for i in range(FIXTURE_SIZE // 3):
+                Comment.objects.create(user_profile=profile, movie=cls.movie, content=f'Commentaire {i}')
+                Comment.objects.create(user_profile=profile, movie=cls.series, content=f'Commentaire {i}')
+        # Des goûts partagés avec d'autres utilisateurs : les rangées de recommandations sont remplies
+        for profile in others:
+            for movie in cls.movies[:3] + cls.movies[FIXTURE_SIZE:FIXTURE_SIZE + 5]:
+                Favorite.objects.create(user_profile=profile, movie=movie)
+        call_command('build_recommendations', '--full', stdout=StringIO())
+
+    def setUp(self):
+        # Budgets mesurés à froid : le cache du catalogue ne doit pas masquer les requêtes
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertViewWithinBudget(self, url_name, *args, method='get', data=None, **kwargs):
+        with capture() as captured:
+            response = getattr(self.client, method)(reverse(url_name, args=args), data or {}, **kwargs)
+        self.assertLess(response.status_code, 500)
+        self.assertWithinQueryBudget(response, url_name)
+        # Aucune requête de la vue ne parcourt une table entière ni ne trie hors index
+        self.assertNoPlanIssues(captured)
+        return response
+
+    def test_movie_list(self):
+        self.assertViewWithinBudget('movie_list')
+        self.client.logout()
+        self.assertViewWithinBudget('movie_list')
+
+    def test_movie_detail(self):
+        self.assertViewWithinBudget('movie_detail', self.movie.pk)
+        # Première visite : la ligne d'historique est créée
+        self.assertViewWithinBudget('movie_detail', self.movies[-1].pk)
+        self.assertViewWithinBudget('movie_detail', self.series.pk)
+        self.assertViewWithinBudget('movie_detail', self.series.pk, data={'episode': self.episodes[-1].pk})
+
+    def test_streaming(self):
+        self.assertViewWithinBudget('stream_movie', self.movie.pk, HTTP_RANGE='bytes=0-1023')
+        self.assertViewWithinBudget('stream_episode', self.episodes[0].pk)
+        self.assertViewWithinBudget('episode_navigation', self.series.pk, self.episodes[0].pk)
+
+    def test_catalog_pages(self):
+        for url_name in ('films', 'animes', 'series'):
+            self.assertViewWithinBudget(url_name)
+        self.assertViewWithinBudget('movies_by_type', 'film')
+        self.assertViewWithinBudget('movie_cards', data={'type': 'serie'})
+        self.assertViewWithinBudget('search_api', data={'q': 'film'})
+
+    def test_profile_pages(self):
+        self.assertViewWithinBudget('profile')
+        self.assertViewWithinBudget('watch_history')
+        self.assertViewWithinBudget('get_favorites')
+        self.assertViewWithinBudget('check_watch_history', self.movie.pk)
+
+    def test_movie_comments(self):
+        total = Comment.objects.filter(movie=self.movie).count()
+        seen = []
+        cursor = ''
+        while True:
+            response = self.assertViewWithinBudget('movie_comments', self.movie.pk, data={'cursor': cursor})
+            seen += response.json()['html'].split('class="comment-item"')[1:]
+            cursor = response.json()['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), total)
+        self.assertEqual(self.client.get(reverse('movie_comments', args=[self.movie.pk]), {'cursor': 'x'}).status_code, 400)
+
+    def test_movie_status(self):
+        ids = ','.join(str(movie.pk) for movie in self.movies[:40])
+        response = self.assertViewWithinBudget('movie_status', data={'ids': ids})
+        movies = response.json()['movies']
+        # Films avec un état uniquement, clés omises quand elles sont vides
+        self.assertEqual(len(movies), FIXTURE_SIZE)
+        self.assertEqual(movies[str(self.movies[1].pk)], {'p': 60, 'c': False, 'f': True, 'r': 2})
+
+        too_many = ','.join(str(pk) for pk in range(1, STATUS_MAX_IDS + 2))
+        self.assertEqual(self.client.get(reverse('movie_status'), {'ids': too_many}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('movie_status'), {'ids': '1,x'}).status_code, 400)
+
+    def test_actions(self):
+        self.assertViewWithinBudget('toggle_favorite', self.movies[-1].pk, method='post')
+        self.assertViewWithinBudget('add_comment', self.movie.pk, method='post', data={'content': 'Super'})
+        self.assertViewWithinBudget('add_rating', self.movies[-2].pk, method='post', data={'score': 4})
+        self.assertViewWithinBudget('add_rating', self.movies[-1].pk, method='post', data={'score': 5})
+        self.assertViewWithinBudget('add_rating', self.movie.pk, method='post', data={'score': 2})
+        self.assertViewWithinBudget('add_to_watch_history', self.movie.pk, method='post', data={'duration': 120})
+        self.assertViewWithinBudget('add_to_watch_history', self.movies[-3].pk, method='post', data={'duration': 120})
+        self.assertViewWithinBudget('update_profile', method='post', data={'bio': 'Cinéphile'})
+
+    def test_destructive_actions(self):
+        history = WatchHistory.objects.filter(user_profile=self.profile).first()
+        self.assertViewWithinBudget('remove_from_history', history.pk, method='post')
+        self.assertViewWithinBudget('clear_watch_history', method='post')
+        self.assertViewWithinBudget('clear_favorites', method='post')
+
+    def test_authentication(self):
+        self.assertViewWithinBudget('logout')
+        self.assertViewWithinBudget('login')
+        self.assertViewWithinBudget('login', method='post', data={'username': 'viewer', 'password': 'secret'})
+        self.client.logout()
+        self.assertViewWithinBudget('register')
+
+
+@override_settings(FLIXORA_QUERY_BUDGET_HEADER=True)
+class QueryBudgetMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_debug_header(self):
+        response = self.client.get(reverse('movie_list'))
+        self.assertRegex(response[HEADER_NAME], r'^queries=\d+; duplicates=\d+; time=[\d.]+ms; budget=\d+$')
+
+    @override_settings(FLIXORA_QUERY_BUDGET=False)
+    def test_disabled_outside_debug(self):
+        # Le client de test charge les middlewares à sa première requête
+        response = Client().get(reverse('movie_list'))
+        self.assertNotIn(HEADER_NAME, response)
+        self.assertFalse(hasattr(response, 'query_stats'))
+
+    @override_settings(FLIXORA_QUERY_BUDGET_STRICT=True, FLIXORA_QUERY_BUDGETS={'movie_list': 0})
+    def test_exceeding_budget_raises_in_strict_mode(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('movie_list'))
+
+    @override_settings(FLIXORA_QUERY_BUDGETS={'movie_list': 0})
+    def test_exceeding_budget_logs_warning(self):
+        with self.assertLogs('movies.query_budget', level='WARNING'):
+            self.client.get(reverse('movie_list'))
+
+
+class ProfileStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('stats', password='secret')
+        self.movies = [Movie.objects.create(title=f'Film {i}', description='d') for i in range(3)]
+        self.client.force_login(self.user)
+
+    def assertStats(self, **expected):
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual({field: getattr(profile, field) for field in expected}, expected)
+        # Les compteurs maintenus par les vues correspondent à un recalcul complet
+        out = StringIO()
+        call_command('rebuild_profile_stats', '--dry-run', stdout=out)
+        self.assertIn('0 profil(s)', out.getvalue())
+
+    def test_write_paths_maintain_counters(self):
+        first, second, third = self.movies
+        self.client.post(reverse('toggle_favorite', args=[first.pk]))
+        self.client.post(reverse('toggle_favorite', args=[second.pk]))
+        self.client.post(reverse('toggle_favorite', args=[second.pk]))
+        self.client.post(reverse('add_comment', args=[first.pk]), {'content': 'Bien'})
+        self.client.post(reverse('add_rating', args=[first.pk]), {'score': 4})
+        self.client.post(reverse('add_rating', args=[first.pk]), {'score': 5})
+        self.client.get(reverse('movie_detail', args=[first.pk]))
+        with self.settings(FLIXORA_PROGRESS_BUFFER=False):
+            self.client.post(reverse('add_to_watch_history', args=[second.pk]), {'duration': 60})
+            self.client.post(reverse('add_to_watch_history', args=[second.pk]), {'duration': 90, 'completed': 'true'})
+        self.client.post(reverse('add_to_watch_history', args=[third.pk]), {'duration': 30, 'completed': 'true'})
+        progress_buffer.flush()
+        self.assertStats(favorite_count=1, comment_count=1, rating_count=1,
+                         history_count=3, history_completed_count=2)
+
+        history = WatchHistory.objects.get(user_profile__user=self.user, movie=third)
+        self.client.post(reverse('remove_from_history', args=[history.pk]))
+        self.assertStats(history_count=2, history_completed_count=1)
+
+        self.client.post(reverse('clear_watch_history'))
+        self.client.post(reverse('clear_favorites'))
+        self.assertStats(favorite_count=0, history_count=0, history_completed_count=0)
+
+    def test_deleting_a_movie_releases_cascaded_counters(self):
+        first, second, _ = self.movies
+        other = User.objects.create_user('voisin', password='secret').profile
+        for movie in (first, second):
+            self.client.post(reverse('toggle_favorite', args=[movie.pk]))
+            self.client.post(reverse('add_rating', args=[movie.pk]), {'score': 4})
+            self.client.post(reverse('add_comment', args=[movie.pk]), {'content': 'Bien'})
+        self.client.post(reverse('add_comment', args=[first.pk]), {'content': 'Encore'})
+        with self.settings(FLIXORA_PROGRESS_BUFFER=False):
+            self.client.post(reverse('add_to_watch_history', args=[first.pk]), {'duration': 60, 'completed': 'true'})
+        Favorite.objects.create(user_profile=other, movie=first)
+        UserProfile.objects.filter(pk=other.pk).adjust_stats(favorite_count=1)
+
+        first.delete()
+        self.assertStats(favorite_count=1, history_count=0, history_completed_count=0, comment_count=1, rating_count=1)
+        self.assertEqual(UserProfile.objects.get(pk=other.pk).favorite_count, 0)
+
+    def test_removed_history_is_not_recreated_by_pending_progress(self):
+        movie = self.movies[0]
+        profile = UserProfile.objects.get(user=self.user)
+        history = WatchHistory.objects.create(user_profile=profile, movie=movie, duration_watched=30)
+        UserProfile.objects.filter(pk=profile.pk).adjust_stats(history_count=1)
+        progress_buffer.record(profile.pk, movie.pk, 45, False)
+        self.client.post(reverse('remove_from_history', args=[history.pk]))
+        progress_buffer.flush()
+        self.assertFalse(WatchHistory.objects.filter(user_profile=profile, movie=movie).exists())
+        self.assertStats(history_count=0)
+
+    def test_history_page_flushes_only_the_current_profile(self):
+        profile = UserProfile.objects.get(user=self.user)
+        other = User.objects.create_user('voisin', password='secret').profile
+        progress_buffer.record(profile.pk, self.movies[0].pk, 60, False)
+        progress_buffer.record(other.pk, self.movies[1].pk, 90, False)
+        self.addCleanup(progress_buffer.discard, other.pk)
+
+        response = self.client.get(reverse('watch_history'))
+        self.assertEqual([item.duration_watched for item in response.context['watch_history']], [60])
+        self.assertIsNone(progress_buffer.pending(profile.pk, self.movies[0].pk))
+        # Les positions des autres utilisateurs restent au vidage périodique
+        self.assertEqual(progress_buffer.pending(other.pk, self.movies[1].pk), (90, False))
+        self.assertFalse(WatchHistory.objects.filter(user_profile=other).exists())
+
+    def test_full_save_does_not_overwrite_counters(self):
+        profile = UserProfile.objects.get(user=self.user)
+        UserProfile.objects.filter(pk=profile.pk).adjust_stats(comment_count=2)
+        profile.bio = 'Cinéphile'
+        profile.save()
+        profile.refresh_from_db()
+        self.assertEqual((profile.bio, profile.comment_count), ('Cinéphile', 2))
+
+
+class RatingAggregateTests(TestCase):
+    """Agrégats d'évaluations du film (somme, nombre, histogramme) tenus par les signaux de Rating."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(title='Film', description='d')
+        cls.profiles = [User.objects.create_user(f'juge{i}', password='secret').profile for i in range(4)]
+
+    def assertAggregates(self, histogram):
+        movie = Movie.objects.get(pk=self.movie.pk)
+        expected_count = sum(histogram.values())
+        expected_sum = sum(star * n for star, n in histogram.items())
+        self.assertEqual(movie.rating_histogram, {star: histogram.get(star, 0) for star in range(1, 6)})
+        self.assertEqual((movie.ratings_count, movie.ratings_sum), (expected_count, expected_sum))
+        self.assertEqual(movie.average_rating, expected_sum / expected_count if expected_count else 0)
+        # Les agrégats incrémentaux correspondent à un recalcul complet
+        out = StringIO()
+        call_command('rebuild_rating_stats', stdout=out)
+        self.assertIn('0 film(s)', out.getvalue())
+
+    def test_creation_builds_histogram_and_average(self):
+        for profile, score in zip(self.profiles, (5, 4, 4, 1)):
+            Rating.objects.create(user_profile=profile, movie=self.movie, score=score)
+        self.assertAggregates({5: 1, 4: 2, 1: 1})
+
+    def test_score_changes_move_one_vote(self):
+        rating = Rating.objects.create(user_profile=self.profiles[0], movie=self.movie, score=2)
+        Rating.objects.create(user_profile=self.profiles[1], movie=self.movie, score=5)
+        # Deux modifications successives de la même instance : la seconde part de la note enregistrée
+        rating.score = 3
+        rating.save()
+        rating.score = 4
+        rating.save()
+        self.assertAggregates({4: 1, 5: 1})
+
+        # Instance chargée depuis la base, puis instance construite sans lecture préalable
+        loaded = Rating.objects.get(pk=rating.pk)
+        loaded.score = 1
+        loaded.save()
+        Rating(pk=rating.pk, user_profile=self.profiles[0], movie=self.movie, score=5).save(update_fields=['score'])
+        self.assertAggregates({5: 2})
+
+        # Même note : aucune variation
+        loaded = Rating.objects.get(pk=rating.pk)
+        loaded.save()
+        self.assertAggregates({5: 2})
+
+    def test_view_updates_existing_vote(self):
+        self.client.force_login(self.profiles[0].user)
+        url = reverse('add_rating', args=[self.movie.pk])
+        self.client.post(url, {'score': 2})
+        response = self.client.post(url, {'score': 4})
+        self.assertEqual(response.json()['average_rating'], 4.0)
+        self.assertAggregates({4: 1})
+
+    def test_deletion_removes_the_stored_score(self):
+        ratings = [Rating.objects.create(user_profile=profile, movie=self.movie, score=score)
+                   for profile, score in zip(self.profiles, (5, 3, 3, 2))]
+        # Note modifiée en mémoire mais pas enregistrée : c'est la note en base qui est retirée
+        ratings[0].score = 1
+        ratings[0].delete()
+        self.assertAggregates({3: 2, 2: 1})
+        Rating.objects.filter(score=3).delete()
+        self.assertAggregates({2: 1})
+        self.assertEqual(UserProfile.objects.get(pk=self.profiles[1].pk).rating_count, 0)
+
+    def test_rebuild_reconciles_drifted_counts(self):
+        for profile, score in zip(self.profiles, (5, 4, 4)):
+            Rating.objects.create(user_profile=profile, movie=self.movie, score=score)
+        Comment.objects.create(user_profile=self.profiles[0], movie=self.movie, content='Bien')
+        other = Movie.objects.create(title='Autre', description='d')
+        # Écritures directes en base : les signaux ne passent pas
+        Movie.objects.filter(pk=self.movie.pk).update(ratings_count=7, ratings_sum=2, ratings_star1=3, comments_count=0)
+
+        out = StringIO()
+        call_command('rebuild_rating_stats', '--batch-size', '1', stdout=out)
+        self.assertIn('1 film(s) corrigé(s)', out.getvalue())
+        self.assertAggregates({5: 1, 4: 2})
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).comments_count, 1)
+        self.assertEqual(Movie.objects.get(pk=other.pk).ratings_count, 0)
+
+class EpisodeIndexTests(TestCase):
+    """Navigation entre épisodes : saisons, bornes de la série et invalidation du cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.series = Movie.objects.create(title='Série', description='d', video_type='serie')
+        # Créés dans le désordre : l'index trie par (saison, numéro)
+        self.episodes = {
+            (season, number): Episode.objects.create(movie=self.series, season_number=season,
+                                                     episode_number=number, title=f'S{season}E{number}')
+            for season, number in ((2, 1), (1, 2), (3, 1), (1, 1), (2, 2))
+        }
+
+    def ep(self, season, number):
+        return self.episodes[(season, number)]
+
+    def test_order_and_seasons(self):
+        index = EpisodeIndex.for_series(self.series.pk)
+        self.assertEqual([episode.title for episode in index], ['S1E1', 'S1E2', 'S2E1', 'S2E2', 'S3E1'])
+        self.assertEqual([(season, len(episodes)) for season, episodes in index.seasons], [(1, 2), (2, 2), (3, 1)])
+
+    def test_navigation_across_season_boundaries(self):
+        index = EpisodeIndex.for_series(self.series.pk)
+        self.assertEqual(index.next(self.ep(1, 2)), self.ep(2, 1))
+        self.assertEqual(index.previous(self.ep(2, 1)), self.ep(1, 2))
+        self.assertEqual(index.next(self.ep(2, 1)), self.ep(2, 2))
+        self.assertEqual(index.next_season(self.ep(1, 1)), self.ep(2, 1))
+        self.assertEqual(index.next_season(self.ep(2, 2)), self.ep(3, 1))
+
+    def test_first_and_last_episode(self):
+        index = EpisodeIndex.for_series(self.series.pk)
+        self.assertIsNone(index.previous(self.ep(1, 1)))
+        self.assertIsNone(index.next(self.ep(3, 1)))
+        self.assertIsNone(index.next_season(self.ep(3, 1)))
+        # Épisode demandé absent, invalide ou d'une autre série : le premier épisode
+        other = Movie.objects.create(title='Autre', description='d', video_type='serie')
+        foreign = Episode.objects.create(movie=other, episode_number=1, title='Ailleurs')
+        self.assertEqual(index.current(), self.ep(1, 1))
+        self.assertEqual(index.current('x'), self.ep(1, 1))
+        self.assertEqual(index.current(foreign.pk), self.ep(1, 1))
+        self.assertIsNone(index.next(foreign))
+        self.assertEqual(index.current(str(self.ep(2, 2).pk)), self.ep(2, 2))
+        empty = EpisodeIndex.for_series(other.pk + 1)
+        self.assertIsNone(empty.current())
+
+    def test_cached_index_is_invalidated_by_episode_changes(self):
+        EpisodeIndex.for_series(self.series.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(EpisodeIndex.for_series(self.series.pk)), 5)
+
+        added = Episode.objects.create(movie=self.series, season_number=3, episode_number=2, title='S3E2')
+        index = EpisodeIndex.for_series(self.series.pk)
+        self.assertEqual(index.next(self.ep(3, 1)), added)
+        self.assertEqual(index.seasons[-1][1], [self.ep(3, 1), added])
+
+        added.delete()
+        self.assertIsNone(EpisodeIndex.for_series(self.series.pk).next(self.ep(3, 1)))
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.movies = [Movie.objects.create(title=f'Film {i}', description='d') for i in range(5)]
+        self.profiles = [User.objects.create_user(f'fan{i}', password='secret').profile for i in range(4)]
+
+    def like(self, profile, *indexes):
+        for i in indexes:
+            Favorite.objects.create(user_profile=profile, movie=self.movies[i])
+
+    def neighbours(self, index):
+        return [movie.pk for movie in similar_movies(self.movies[index].pk, 10)]
+
+    def test_full_build_ranks_co_watched_movies(self):
+        a, b, c, d = self.profiles
+        self.like(a, 0, 1)
+        self.like(b, 0, 1, 2)
+        self.like(c, 0, 1)
+        self.like(d, 3)
+        build_similarities(full=True)
+
+        self.assertEqual(self.neighbours(0), [self.movies[1].pk, self.movies[2].pk])
+        self.assertEqual(self.neighbours(3), [])
+        # Les favoris et les films vus sont exclus des recommandations
+        recommended = recommended_for(a.user, {self.movies[0].pk, self.movies[1].pk}, 10)
+        self.assertEqual([movie.pk for movie in recommended], [self.movies[2].pk])
+
+    def test_incremental_build_updates_changed_movies_and_their_neighbours(self):
+        a, b, c, d = self.profiles
+        self.like(a, 0, 1)
+        self.like(b, 0, 1)
+        build_similarities(full=True)
+        self.assertEqual(build_similarities(), (0, 0))
+
+        self.like(c, 0, 4)
+        self.like(d, 0, 4)
+        computed, merged = build_similarities()
+        self.assertEqual(computed, 2)
+        self.assertIn(self.movies[4].pk, self.neighbours(0))
+        # Le voisin 1 n'a pas été recalculé mais reçoit le nouveau score symétrique
+        self.assertEqual(merged, 1)
+        rows = MovieSimilarity.objects.filter(movie=self.movies[1])
+        self.assertEqual(
+            {row.similar_id: round(row.score, 6) for row in rows},
+            {self.movies[0].pk: round(MovieSimilarity.objects.get(movie=self.movies[0], similar=self.movies[1]).score, 6)},
+        )
+
+
+    def test_incremental_build_sees_updated_history_and_loads_only_affected_rows(self):
+        a, b, c, d = self.profiles
+        self.like(a, 0, 1)
+        self.like(c, 3, 4)
+        history = WatchHistory.objects.create(user_profile=b, movie=self.movies[0])
+        WatchHistory.objects.create(user_profile=b, movie=self.movies[2], completed=True)
+        build_similarities(full=True)
+        full = {(row.movie_id, row.similar_id): row.score for row in MovieSimilarity.objects.all()}
+
+        # Interactions antérieures au calcul, puis modification d'une ligne existante (watched_at ne bouge pas)
+        past = timezone.now() - timedelta(hours=1)
+        Favorite.objects.update(added_at=past)
+        WatchHistory.objects.update(watched_at=past, updated_at=past)
+        history.completed = True
+        history.save()
+        self.assertEqual(recommendations.changed_movies(recommendations.last_build()), {self.movies[0].pk})
+        matrix = recommendations.affected_interactions({self.movies[0].pk})
+        self.assertEqual(set(matrix), {a.pk, b.pk})
+        self.assertNotIn(self.movies[4].pk, {movie_id for row in matrix.values() for movie_id in row})
+
+        self.assertEqual(build_similarities()[0], 1)
+        incremental = {(row.movie_id, row.similar_id): row.score for row in MovieSimilarity.objects.all()}
+        self.assertGreater(incremental[(self.movies[0].pk, self.movies[2].pk)],
+                           full[(self.movies[0].pk, self.movies[2].pk)])
+        # Même résultat qu'un calcul complet
+        build_similarities(full=True)
+        self.assertEqual(
+            {key: round(score, 6) for key, score in incremental.items()},
+            {(row.movie_id, row.similar_id): round(row.score, 6) for row in MovieSimilarity.objects.all()},
+        )
+
+
+@override_settings(FLIXORA_TRENDING_HALF_LIFE=100)
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.film, self.other = [Movie.objects.create(title=f'Film {i}', description='d') for i in range(2)]
+        self.anime = Movie.objects.create(title='Anime', description='d', video_type='anime')
+
+    def scores(self, at):
+        # Scores ramenés à l'instant `at` (indépendants de la référence courante)
+        rate = trending.decay_rate()
+        return {
+            row.movie_id: round(row.score * math.exp(rate * (row.epoch - at)), 6)
+            for row in MovieTrending.objects.all()
+        }
+
+    def test_events_decay_with_half_life_and_survive_rebase(self):
+        trending.record([(self.film.pk, 4.0)], at=1000)
+        trending.record([(self.film.pk, 1.0), (self.other.pk, 2.0)], at=1100)
+        self.assertEqual(self.scores(1100), {self.film.pk: 3.0, self.other.pk: 2.0})
+
+        trending.rebase(at=1200)
+        self.assertEqual(MovieTrending.objects.filter(epoch=1200).count(), 2)
+        self.assertEqual(self.scores(1200), {self.film.pk: 1.5, self.other.pk: 1.0})
+        # Après une vingtaine de demi-vies, les scores sont supprimés
+        self.assertEqual(trending.rebase(at=3200), (2, 2))
+
+    @override_settings(FLIXORA_BACKGROUND_TASKS=False)
+    def test_signals_feed_rows_by_type(self):
+        profile = User.objects.create_user('fan', password='secret').profile
+        with self.captureOnCommitCallbacks() as callbacks:
+            Favorite.objects.create(user_profile=profile, movie=self.other)
+            Rating.objects.create(user_profile=profile, movie=self.film, score=1)
+            WatchHistory.objects.create(user_profile=profile, movie=self.anime)
+        # Rien n'est écrit avant le commit
+        self.assertFalse(MovieTrending.objects.exists())
+        for callback in callbacks:
+            callback()
+        progress_buffer.record(profile.pk, self.film.pk, 60, False)
+        progress_buffer.flush()
+
+        rows = trending.trending_rows(10)
+        self.assertEqual(rows['film'], [self.other, self.film])
+        self.assertEqual(rows['anime'], [self.anime])
+        self.assertEqual(rows['serie'], [])
+
+        # Le type suit les modifications du film
+        self.anime.video_type = 'serie'
+        self.anime.save()
+        self.assertEqual(MovieTrending.objects.get(pk=self.anime.pk).video_type, 'serie')
+
+
+class AsyncEndpointTests(QueryBudgetTestMixin, TestCase):
+    """Vues AJAX asynchrones servies par le gestionnaire ASGI (AsyncClient)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('async', password='secret')
+        cls.movie = Movie.objects.create(title='Film', description='d')
+
+    @override_settings(FLIXORA_QUERY_BUDGET_STRICT=True)
+    async def test_toggle_favorite_and_rating(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('toggle_favorite', args=[self.movie.pk])
+        response = await self.async_client.post(url)
+        self.assertEqual(response.json()['action'], 'added')
+        self.assertEqual(response.json()['favorite_count'], 1)
+        # Les requêtes de l'ORM asynchrone sont comptées par le middleware
+        self.assertGreater(response.query_stats.count, 0)
+        self.assertWithinQueryBudget(response, 'toggle_favorite')
+        response = await self.async_client.post(url)
+        self.assertEqual(response.json()['action'], 'removed')
+
+        response = await self.async_client.post(reverse('add_rating', args=[self.movie.pk]), {'score': 4})
+        self.assertEqual(response.json()['average_rating'], 4.0)
+        self.assertWithinQueryBudget(response, 'add_rating')
+
+    async def test_login_required(self):
+        response = await self.async_client.get(reverse('check_watch_history', args=[self.movie.pk]))
+        self.assertEqual(response.status_code, 302)
+
+
+class CommentCountTests(TestCase):
+    def test_counter_follows_creation_moderation_and_deletion(self):
+        movie = Movie.objects.create(title='Film', description='d')
+        profile = User.objects.create_user('critique', password='secret').profile
+        comments = [Comment.objects.create(user_profile=profile, movie=movie, content=str(i)) for i in range(3)]
+        Comment.objects.create(user_profile=profile, movie=movie, content='masqué', is_approved=False)
+        movie.refresh_from_db()
+        self.assertEqual(movie.comment_count, 3)
+
+        comment = Comment.objects.get(pk=comments[0].pk)
+        comment.is_approved = False
+        comment.save()
+        comments[1].delete()
+        movie.refresh_from_db()
+        self.assertEqual(movie.comment_count, 1)
+
+        out = StringIO()
+        call_command('rebuild_rating_stats', stdout=out)
+        self.assertIn('0 film(s)', out.getvalue())
+
+
+class KeysetPaginationTests(TestCase):
+    """Curseurs du catalogue : aller-retour, égalités de date, curseurs invalides."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = [
+            Movie.objects.create(title=f'Film {i}', description='', video_type='film', thumbnail='')
+            for i in range(7)
+        ]
+        # Égalités sur created_at : l'id départage
+        tie = timezone.now() - timedelta(days=1)
+        Movie.objects.filter(pk__in=[movie.pk for movie in cls.movies[1:5]]).update(created_at=tie)
+        cls.expected = list(Movie.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def _raw_cursor(self, raw):
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def test_cursor_round_trip(self):
+        movie = Movie.objects.get(pk=self.movies[2].pk)
+        cursor = encode_cursor(movie)
+        self.assertEqual(decode_cursor(cursor), (movie.created_at, movie.pk))
+        self.assertEqual(normalize_cursor(cursor), cursor)
+        self.assertIsNone(normalize_cursor(''))
+        # Même position écrite autrement (fuseau, remplissage, zéros) : même curseur canonique
+        local = movie.created_at.astimezone(dt_timezone(timedelta(hours=2))).isoformat()
+        self.assertEqual(normalize_cursor(self._raw_cursor(f'{local}|00{movie.pk}')), cursor)
+
+    def test_ties_on_created_at(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_paginate(Movie.objects.all(), cursor, 2)
+            seen.extend(movie.pk for movie in page)
+            if not cursor:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_invalid_cursors(self):
+        naive = timezone.now().replace(tzinfo=None).isoformat()
+        for cursor in ('x', self._raw_cursor('hier|3'), self._raw_cursor(f'{naive}|3'),
+                       self._raw_cursor(f'{timezone.now().isoformat()}|0')):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                normalize_cursor(cursor)
+        response = self.client.get(reverse('movie_cards'), {'type': 'film', 'cursor': 'x'})
+        self.assertEqual(response.status_code, 400)
+        # Page HTML : retour à la première page
+        response = self.client.get(reverse('movies_by_type', args=['film']), {'cursor': 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([movie.pk for movie in response.context['movies']], self.expected)
+        self.assertEqual(response.context['page_key'], 'first')
+
+    def test_movie_cards_follow_next_cursor(self):
+        seen, cursor = 0, ''
+        while True:
+            data = self.client.get(reverse('movie_cards'), {'type': 'film', 'limit': 3, 'cursor': cursor}).json()
+            seen += data['count']
+            if not data['next_cursor']:
+                break
+            self.assertEqual(normalize_cursor(data['next_cursor']), data['next_cursor'])
+            cursor = data['next_cursor']
+        self.assertEqual(seen, len(self.expected))
+
+        # Une autre écriture du même curseur reprend la page et le fragment déjà en cache
+        created_at, pk = decode_cursor(cursor)
+        variant = self._raw_cursor(f'{created_at.astimezone(dt_timezone(timedelta(hours=-5))).isoformat()}|{pk}')
+        with self.assertNumQueries(0):
+            data = self.client.get(reverse('movie_cards'), {'type': 'film', 'limit': 3, 'cursor': variant}).json()
+        self.assertEqual(data['count'], 1)
+
+
+@override_settings(FLIXORA_DB_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routage lecture / écriture (sans réplica réel : seules les décisions sont vérifiées)."""
+
+    def setUp(self):
+        self.router = db_router.PrimaryReplicaRouter()
+        self.routing = db_router.RequestRouting()
+        token = db_router._routing.set(self.routing)
+        self.addCleanup(db_router._routing.reset, token)
+
+    def _view(self, request):
+        return db_router.replica_reads(lambda request: self.router.db_for_read(Movie))(request)
+
+    def test_catalog_reads_go_to_replica_until_a_write(self):
+        self.assertEqual(self._view(RequestFactory().get('/')), 'replica')
+        # Comptes et sessions restent sur la base principale
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.router.db_for_write(Favorite), 'default')
+        self.assertEqual(self.router.db_for_read(Movie), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'movies'))
+
+    def test_pinned_and_unsafe_requests_read_primary(self):
+        request = RequestFactory().get('/')
+        request.COOKIES[db_router.PIN_COOKIE] = '1'
+        self.assertEqual(self._view(request), 'default')
+        self.assertEqual(self._view(RequestFactory().post('/')), 'default')
+
+    def test_outside_a_request_reads_primary(self):
+        db_router._routing.set(None)
+        self.assertEqual(self.router.db_for_read(Movie), 'default')
+
+
+@override_settings(FLIXORA_DB_REPLICAS=['replica'])
+class ReplicaCacheFillTests(TransactionTestCase):
+    """
+    Le cache partagé du catalogue n'est jamais rempli depuis un réplica.
+    Hors transaction de test, pour que le routeur choisisse vraiment le réplica.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(title='Titre initial', description='', video_type='film', thumbnail='')
+        self.reads = []
+        route = db_router.PrimaryReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            self.reads.append((model, route(router, model, **hints)))
+            # Pas de réplica réel : la décision est vérifiée, la lecture faite sur la base principale
+            return db_router.PRIMARY
+
+        patcher = mock.patch.object(db_router.PrimaryReplicaRouter, 'db_for_read', record)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_write_then_replica_read_fills_cache_from_primary(self):
+        # Écriture d'un autre navigateur : celui-ci n'est pas épinglé et le réplica peut être en retard
+        self.movie.title = 'Titre à jour'
+        self.movie.save()
+        self.reads.clear()
+        html = self.client.get(reverse('movie_cards'), {'type': 'film'}).json()['html']
+        self.assertIn('Titre à jour', html)
+        self.assertIn((Movie, db_router.PRIMARY), self.reads)
+        self.assertNotIn((Movie, 'replica'), self.reads)
+
+    @override_settings(FLIXORA_CATALOG_CACHE_ALLOW_LOCAL=False)
+    def test_uncached_reads_use_the_replica(self):
+        # Sans mise en cache, rien n'est conservé : la lecture peut rester sur le réplica
+        self.client.get(reverse('movie_cards'), {'type': 'film'})
+        self.assertIn((Movie, 'replica'), self.reads)
+
+
+class PrimaryPinningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pin', password='secret')
+        cls.movie = Movie.objects.create(title='Film', description='d')
+
+    @override_settings(FLIXORA_DB_REPLICAS=['replica'])
+    def test_write_pins_browser_to_primary(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('get_favorites'))
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+        response = self.client.post(reverse('toggle_favorite', args=[self.movie.pk]))
+        self.assertEqual(response.cookies[db_router.PIN_COOKIE]['max-age'], 10)
+
+    def test_no_pin_without_replicas(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('toggle_favorite', args=[self.movie.pk]))
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+
+class ProfileCacheTests(TestCase):
+    """Utilisateur et profil gardés en cache entre les requêtes d'une session."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('habitue', email='h@example.com', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def _reads(self, response, table):
+        return [sql for sql, _, _ in response.query_stats.queries if f'FROM "{table}"' in sql]
+
+    def test_warm_requests_skip_user_and_profile_queries(self):
+        first = self.client.get(reverse('get_favorites'))
+        self.assertTrue(self._reads(first, 'auth_user'))
+        self.assertTrue(self._reads(first, 'movies_userprofile'))
+        second = self.client.get(reverse('get_favorites'))
+        self.assertFalse(self._reads(second, 'auth_user'))
+        self.assertFalse(self._reads(second, 'movies_userprofile'))
+
+    def test_profile_and_password_changes_invalidate(self):
+        self.client.get(reverse('get_favorites'))
+        self.client.post(reverse('update_profile'), {'username': 'habitue', 'email': 'h@example.com', 'bio': 'Cinéphile'})
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['profile'].bio, 'Cinéphile')
+
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('nouveau')
+        user.save()
+        self.assertEqual(self.client.get(reverse('get_favorites')).status_code, 302)
+
+
+    @override_settings(FLIXORA_PROFILE_CACHE_ALLOW_LOCAL=False)
+    def test_process_local_cache_is_not_used(self):
+        # Un autre processus ne verrait pas l'invalidation : chaque requête relit l'utilisateur
+        self.client.get(reverse('get_favorites'))
+        second = self.client.get(reverse('get_favorites'))
+        self.assertTrue(self._reads(second, 'auth_user'))
+        self.assertIsNone(cache.get(ENTRY_KEY.format(session_key=self.client.session.session_key)))
+        self.assertEqual([message.id for message in check_profile_cache_backend(None)], ['movies.W001'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                           'LOCATION': tempfile.gettempdir() + '/flixora-test-cache'}},
+                       FLIXORA_PROFILE_CACHE_ALLOW_LOCAL=False)
+    def test_shared_cache_passes_check(self):
+        self.assertEqual(check_profile_cache_backend(None), [])
+
+class CatalogCacheTests(TestCase):
+    """Pages et fragments du catalogue invalidés par les modifications de Movie."""
+
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(title='Titre initial', description='', video_type='film', thumbnail='')
+
+    def _pages(self):
+        return [
+            self.client.get(reverse('movie_list')).content.decode(),
+            self.client.get(reverse('movies_by_type', args=['film'])).content.decode(),
+            self.client.get(reverse('movie_cards'), {'type': 'film'}).json()['html'],
+        ]
+
+    def test_movie_save_and_delete_invalidate_pages_and_fragments(self):
+        for html in self._pages():
+            self.assertIn('Titre initial', html)
+        self._pages()
+        stats = catalog_cache.stats()
+        self.assertGreater(stats['data']['hits'], 0)
+        self.assertGreater(stats['fragment']['hits'], 0)
+
+        self.movie.title = 'Titre corrigé'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.save()
+        for html in self._pages():
+            self.assertIn('Titre corrigé', html)
+            self.assertNotIn('Titre initial', html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.delete()
+        for html in self._pages():
+            self.assertNotIn('Titre corrigé', html)
+
+    @override_settings(FLIXORA_CATALOG_CACHE_ALLOW_LOCAL=False)
+    def test_process_local_cache_is_bypassed(self):
+        self._pages()
+        self._pages()
+        stats = catalog_cache.stats()
+        self.assertEqual((stats['data']['hits'], stats['data']['misses']), (0, 0))
+        self.assertEqual((stats['fragment']['hits'], stats['fragment']['misses']), (0, 0))
+        # Sans cache, une écriture directe (sans signal) est visible immédiatement
+        Movie.objects.filter(pk=self.movie.pk).update(title='Titre direct')
+        for html in self._pages():
+            self.assertIn('Titre direct', html)
+        self.assertEqual([message.id for message in check_catalog_cache_backend(None)], ['movies.W002'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                           'LOCATION': tempfile.gettempdir() + '/flixora-test-cache'}},
+                       FLIXORA_CATALOG_CACHE_ALLOW_LOCAL=False)
+    def test_shared_cache_passes_check(self):
+        self.assertEqual(check_catalog_cache_backend(None), [])
+
+
+class ProfileBackfillTests(TestCase):
+    def test_backfill_creates_missing_profiles_in_batches(self):
+        users = [User.objects.create_user(f'ancien{i}') for i in range(5)]
+        UserProfile.objects.filter(user__in=users[:3]).delete()
+        progress = []
+        with self.assertNumQueries(5):
+            # Comptage, puis deux lots (sélection + insertion), le second incomplet
+            created = UserProfile.objects.backfill(batch_size=2, progress=lambda *args: progress.append(args))
+        self.assertEqual(created, 3)
+        self.assertEqual(progress, [(2, 3), (3, 3)])
+        self.assertFalse(User.objects.filter(profile__isnull=True).exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(UserProfile.objects.backfill(), 0)
+
+    def test_login_does_not_write_profile(self):
+        User.objects.create_user('fidele', password='secret')
+        response = self.client.post(reverse('login'), {'username': 'fidele', 'password': 'secret'})
+        self.assertFalse([sql for sql, _, _ in response.query_stats.queries if sql.startswith('UPDATE "movies_userprofile"')])
+
+
+@override_settings(FLIXORA_BACKGROUND_TASKS=False)
+class AvatarProcessingTests(TestCase):
+    """Avatars traités en arrière-plan et dédupliqués par empreinte."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('portrait', password='secret')
+        cls.other = User.objects.create_user('sosie', password='secret')
+
+    def _upload(self, color='red'):
+        buffer = BytesIO()
+        image = Image.new('RGB', (400, 200), color)
+        exif = Image.Exif()
+        exif[0x010F] = 'Appareil'
+        image.save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def _post(self, user, upload):
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('update_avatar'), {'avatar': upload}).json()
+
+    def test_upload_is_processed_in_background(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            data = self.client.post(reverse('update_avatar'), {'avatar': self._upload('blue')}).json()
+        self.assertEqual(data['status'], 'pending')
+        self.assertEqual(self.client.get(data['status_url']).json()['status'], 'pending')
+
+        for callback in callbacks:
+            callback()
+        data = self.client.get(reverse('avatar_status')).json()
+        self.assertEqual(data['status'], 'ready')
+        self.assertEqual(sorted(data['avatar_urls'], key=int), [str(size) for size in avatars.AVATAR_SIZES])
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertTrue(avatars.is_content_addressed(profile.avatar.name))
+        for size in avatars.AVATAR_SIZES:
+            with default_storage.open(avatars.avatar_name(profile.avatar_digest, size)) as f, Image.open(f) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (size, size)))
+                self.assertFalse(image.getexif())
+
+    def test_identical_upload_reuses_stored_sizes(self):
+        first = self._post(self.user, self._upload())
+        self.assertEqual(first['status'], 'pending')
+        second = self._post(self.other, self._upload())
+        self.assertEqual(second['status'], 'ready')
+        self.assertEqual(
+            UserProfile.objects.get(user=self.user).avatar.name,
+            UserProfile.objects.get(user=self.other).avatar.name,
+        )
+        directory = avatars.avatar_name(UserProfile.objects.get(user=self.other).avatar_digest, 0).rsplit('/', 1)[0]
+        self.assertEqual(len(default_storage.listdir(directory)[1]), len(avatars.AVATAR_SIZES))
+
+    def test_unreadable_image_fails(self):
+        upload = SimpleUploadedFile('photo.png', b'pas une image', content_type='image/png')
+        with self.assertLogs('movies.avatars', 'ERROR'):
+            self._post(self.user, upload)
+        self.assertEqual(self.client.get(reverse('avatar_status')).json()['status'], 'failed')
+
+
+@override_settings(FLIXORA_BACKGROUND_TASKS=False)
+class BlobStorageTests(TestCase):
+    """Médias du catalogue stockés une fois par contenu, avec comptage des références."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.series = Movie.objects.create(title='Série', description='', video_type='serie', thumbnail='')
+
+    def _episode(self, number, content):
+        episode = Episode(movie=self.series, episode_number=number, title=f'Épisode {number}')
+        episode.video.save('episode.mp4', ContentFile(content))
+        return episode
+
+    def _refcount(self, name):
+        return MediaBlob.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self._episode(1, b'generique' * 1000)
+        second = self._episode(2, b'generique' * 1000)
+        other = self._episode(3, b'autre episode')
+        self.assertTrue(is_blob_name(first.video.name))
+        self.assertEqual(first.video.name, second.video.name)
+        self.assertNotEqual(first.video.name, other.video.name)
+        self.assertEqual(self._refcount(first.video.name), 2)
+        usage = MediaBlob.objects.disk_usage()
+        self.assertEqual(usage['logical'] - usage['physical'], 9000)
+
+        first.delete()
+        self.assertEqual(self._refcount(second.video.name), 1)
+        other.video = second.video.name
+        other.save()
+        self.assertEqual(self._refcount(second.video.name), 2)
+        self.assertEqual(self._refcount(self._episode(4, b'autre episode').video.name), 1)
+
+    def test_gc_removes_unreferenced_blobs(self):
+        kept = self._episode(1, b'garde')
+        dropped = self._episode(2, b'supprime')
+        name = dropped.video.name
+        dropped.delete()
+        # Compteur faussé par une écriture sans save() : recalculé par le ramasse-miettes
+        MediaBlob.objects.filter(name=kept.video.name).update(refcount=0)
+
+        call_command('gc_media', grace=0, stdout=StringIO())
+        self.assertTrue(blob_storage().exists(kept.video.name))
+        self.assertEqual(self._refcount(kept.video.name), 1)
+        self.assertFalse(blob_storage().exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_dedup_media_converts_legacy_files(self):
+        for path in ('videos/a.mp4', 'episodes/b.mp4', 'episodes/c.mp4'):
+            default_storage.save(path, ContentFile(b'bande-annonce' if path != 'episodes/c.mp4' else b'autre'))
+        Movie.objects.create(title='Film', description='', video='videos/a.mp4', thumbnail='')
+        Episode.objects.bulk_create([
+            Episode(movie=self.series, episode_number=1, title='1', video='episodes/b.mp4'),
+            Episode(movie=self.series, episode_number=2, title='2', video='episodes/c.mp4'),
+        ])
+
+        out = StringIO()
+        call_command('dedup_media', stdout=out)
+        names = set(Movie.objects.exclude(video='').values_list('video', flat=True))
+        names |= set(Episode.objects.values_list('video', flat=True))
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(is_blob_name(name) for name in names))
+        self.assertFalse(default_storage.exists('videos/a.mp4'))
+        self.assertEqual(MediaBlob.objects.disk_usage(), {'references': 3, 'blobs': 2, 'logical': 31, 'physical': 18})
+
+
+@override_settings(FLIXORA_BACKGROUND_TASKS=False)
+class ThumbnailTests(TestCase):
+    """Déclinaisons responsives des affiches et avatars, et leur srcset."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def _jpeg(self, size):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'orange').save(buffer, 'JPEG')
+        return ContentFile(buffer.getvalue())
+
+    def _movie(self, size=(1000, 1500)):
+        movie = Movie(title='Affiche', description='')
+        with self.captureOnCommitCallbacks(execute=True):
+            movie.thumbnail.save('affiche.jpg', self._jpeg(size))
+        return movie
+
+    def _render(self, source, **context):
+        return Template('{% load media_tags %}' + source).render(Context(context))
+
+    def test_derivative_name(self):
+        self.assertEqual(thumbnails.derivative_name('thumbnails/a.b.jpg', 320, 'webp'), 'thumbnails/a.b.w320.webp')
+        self.assertEqual(thumbnails.derivative_name('thumbnails/a.png', 160, 'jpeg'), 'thumbnails/a.w160.jpg')
+
+    def test_upload_produces_every_width_and_format(self):
+        movie = self._movie()
+        storage = blob_storage()
+        for width in thumbnails.DERIVATIVE_WIDTHS:
+            for fmt, (pil_format, _) in thumbnails.DERIVATIVE_FORMATS.items():
+                with storage.open(thumbnails.derivative_name(movie.thumbnail.name, width, fmt)) as f, \
+                        Image.open(f) as image:
+                    self.assertEqual((image.format, image.size), (pil_format, (width, width * 3 // 2)))
+
+    def test_small_image_is_not_upscaled(self):
+        movie = self._movie((200, 100))
+        largest = thumbnails.derivative_name(movie.thumbnail.name, max(thumbnails.DERIVATIVE_WIDTHS), 'jpeg')
+        with blob_storage().open(largest) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (200, 100))
+
+    def test_regeneration_replaces_files_in_place(self):
+        movie = self._movie()
+        storage = blob_storage()
+        directory = os.path.dirname(storage.path(movie.thumbnail.name))
+        before = sorted(os.listdir(directory))
+        # Aucune suppression : le fichier existant est remplacé par renommage
+        with mock.patch.object(type(storage), 'delete', side_effect=AssertionError):
+            written = thumbnails.generate_derivatives(movie.thumbnail.name, storage)
+        self.assertEqual(written, len(thumbnails.DERIVATIVE_WIDTHS) * len(thumbnails.DERIVATIVE_FORMATS))
+        # Ni fichier temporaire restant, ni déclinaison rangée sous une empreinte
+        self.assertEqual(sorted(os.listdir(directory)), before)
+        self.assertEqual(len(before), 1 + written)
+
+    def test_srcset_tags(self):
+        movie = Movie(title='Sans image', description='', thumbnail='thumbnails/absente.jpg')
+        self.assertEqual(self._render("{% webp_source movie.thumbnail 'poster' %}", movie=movie), '')
+        self.assertEqual(thumbnails.srcset(movie.thumbnail), '')
+
+        movie = Movie.objects.get(pk=self._movie().pk)
+        value = ', '.join(
+            f"{blob_storage().url(thumbnails.derivative_name(movie.thumbnail.name, width, 'webp'))} {width}w"
+            for width in thumbnails.DERIVATIVE_WIDTHS
+        )
+        self.assertHTMLEqual(
+            self._render("<picture>{% webp_source movie.thumbnail 'poster' %}</picture>", movie=movie),
+            f'<picture><source type="image/webp" srcset="{value}" sizes="{thumbnails.SIZES["poster"]}"></picture>',
+        )
+        html = self._render("<img {% srcset_attrs movie.thumbnail 'episode' %}>", movie=movie)
+        self.assertIn(f'sizes="{thumbnails.SIZES["episode"]}"', html)
+        self.assertEqual(html.count('.jpg '), len(thumbnails.DERIVATIVE_WIDTHS))
+        self.assertNotIn('.webp', html)
+
+    def test_generate_thumbnails_uses_each_field_storage(self):
+        poster = blob_storage().save('affiche.jpg', self._jpeg((600, 900)))
+        avatar = default_storage.save('avatars/ancien.jpg', self._jpeg((300, 300)))
+        Movie.objects.create(title='Catalogue', description='', thumbnail=poster)
+        user = User.objects.create_user('ancien', password='secret')
+        UserProfile.objects.filter(user=user).update(avatar=avatar)
+
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIn('2 image(s) déclinée(s), 0 échec(s)', out.getvalue())
+        self.assertTrue(blob_storage().exists(thumbnails.derivative_name(poster, 800, 'webp')))
+        with default_storage.open(thumbnails.derivative_name(avatar, 800, 'jpeg')) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (300, 300))
+        profile = UserProfile.objects.get(user=user)
+        self.assertIn('/avatars/ancien.w160.jpg 160w', self._render('{% avatar_srcset_attrs profile.avatar %}', profile=profile))
+
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIn('0 image(s) à traiter', out.getvalue())
+
+
+class SearchTests(TestCase):
+    """Recherche plein texte (FTS5 sous SQLite) et repli par sous-chaîne."""
+
+    @classmethod
+    def setUpTestData(cls):
+        def movie(title, video_type='film', **fields):
+            return Movie.objects.create(title=title, description=fields.pop('description', ''),
+                                        video_type=video_type, thumbnail='', **fields)
+
+        cls.nuit = movie('La Nuit Étoilée', description='Un peintre et ses nuits blanches')
+        cls.mention = movie('Souvenirs', description='Une nuit de tempête')
+        cls.realisateur = movie('Portrait', director='Nuitomir Kovac')
+        cls.anime = movie('Nuit des Dragons', video_type='anime')
+        cls.series = movie('Les Gardiens', video_type='serie')
+        Episode.objects.create(movie=cls.series, episode_number=1, title='Le Phare englouti', video='')
+
+    def _titles(self, query, **kwargs):
+        return [movie.title for movie in search.search_movies(query, **kwargs)[0]]
+
+    def test_prefix_terms_all_required(self):
+        self.assertEqual(set(self._titles('étoil')), {'La Nuit Étoilée'})
+        self.assertEqual(self._titles('nuit peintre'), ['La Nuit Étoilée'])
+        self.assertEqual(self._titles('   '), [])
+
+    def test_title_matches_rank_before_description_and_director(self):
+        titles = self._titles('nuit')
+        self.assertEqual(set(titles[:2]), {'La Nuit Étoilée', 'Nuit des Dragons'})
+        self.assertLess(titles.index('Portrait'), titles.index('Souvenirs'))
+
+    def test_episode_titles_and_type_filter(self):
+        self.assertEqual(self._titles('englouti'), ['Les Gardiens'])
+        self.assertEqual(self._titles('nuit', video_type='anime'), ['Nuit des Dragons'])
+        self.assertEqual(self._titles('englouti', video_type='film'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.nuit.title = 'Aube Dorée'
+        self.nuit.save()
+        self.assertEqual(self._titles('aube'), ['Aube Dorée'])
+        self.assertNotIn('Aube Dorée', self._titles('étoilée'))
+        Episode.objects.create(movie=self.series, episode_number=2, title='Tempête sur la lande', video='')
+        self.assertEqual(self._titles('lande'), ['Les Gardiens'])
+        self.anime.delete()
+        self.assertNotIn('Nuit des Dragons', self._titles('dragons'))
+
+    def test_icontains_fallback(self):
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            self.assertEqual(set(self._titles('nuit')), {'La Nuit Étoilée', 'Souvenirs', 'Portrait', 'Nuit des Dragons'})
+            self.assertEqual(self._titles('englouti'), ['Les Gardiens'])
+            self.assertEqual(self._titles('nuit', video_type='anime'), ['Nuit des Dragons'])
+            self.assertEqual(self._titles('?!'), [])
+
+
+class MediaStreamingTests(SimpleTestCase):
+    """Requêtes Range, If-Range et requêtes conditionnelles sur un fichier vidéo."""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.mp4')
+        with open(fd, 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        self.addCleanup(os.remove, self.path)
+        self.factory = RequestFactory()
+        self.stat = os.stat(self.path)
+
+    def _get(self, path=None, **headers):
+        return serve_media_file(self.factory.get('/', headers=headers), path or self.path)
+
+    def _body(self, response):
+        body = b''.join(response.streaming_content)
+        response.close()
+        return body
+
+    def test_full_response(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(len(self._body(response)), 1024)
+
+    def test_partial_ranges(self):
+        response = self._get(Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(self._body(response), bytes(range(10, 20)))
+
+        response = self._get(Range='bytes=1000-')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(len(self._body(response)), 24)
+
+        # Suffixe : les N derniers octets, borné à la taille du fichier
+        response = self._get(Range='bytes=-4')
+        self.assertEqual(response['Content-Range'], 'bytes 1020-1023/1024')
+        self.assertEqual(self._body(response), bytes(range(252, 256)))
+        response = self._get(Range='bytes=-5000')
+        self.assertEqual(response['Content-Range'], 'bytes 0-1023/1024')
+        response.close()
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=1024-', 'bytes=-0', 'bytes=20-10'):
+            response = self._get(Range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        fd, empty = tempfile.mkstemp(suffix='.mp4')
+        os.close(fd)
+        self.addCleanup(os.remove, empty)
+        response = self._get(empty, Range='bytes=-10')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    def test_ignored_ranges_serve_whole_file(self):
+        for header in ('bytes=0-1,5-6', 'octets=0-10', 'bytes=-'):
+            response = self._get(Range=header)
+            self.assertEqual(response.status_code, 200, header)
+            response.close()
+
+    def test_if_range(self):
+        etag = self._get()['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        modified = http_date(self.stat.st_mtime)
+
+        for validator in (etag, modified):
+            response = self._get(Range='bytes=0-9', **{'If-Range': validator})
+            self.assertEqual(response.status_code, 206, validator)
+            response.close()
+        # Validateur périmé : le fichier a changé, réponse complète
+        for validator in ('"autre"', 'W/' + etag, http_date(self.stat.st_mtime - 3600)):
+            response = self._get(Range='bytes=0-9', **{'If-Range': validator})
+            self.assertEqual(response.status_code, 200, validator)
+            response.close()
+
+    def test_conditional_requests(self):
+        response = self._get()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        response.close()
+
+        self.assertEqual(self._get(**{'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self._get(**{'If-None-Match': f'"autre", {etag}'}).status_code, 304)
+        self.assertEqual(self._get(**{'If-Modified-Since': last_modified}).status_code, 304)
+        for headers in ({'If-None-Match': '"autre"'}, {'If-Modified-Since': http_date(self.stat.st_mtime - 3600)}):
+            response = self._get(**headers)
+            self.assertEqual(response.status_code, 200, headers)
+            response.close()
+        # If-None-Match l'emporte sur If-Modified-Since
+        response = self._get(**{'If-None-Match': '"autre"', 'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+def _mp4_box(box_type, payload):
+    return struct.pack('>I4s', len(payload) + 8, box_type) + payload
+
+
+class Mp4SampleMixin:
+    """Petits MP4 synthétiques (moov en fin de fichier par défaut) écrits dans `self.dir`."""
+
+    CHUNKS = (b'A' * 100, b'B' * 50, b'C' * 30)
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def _mvhd(self, version, timescale, duration):
+        if version == 1:
+            payload = struct.pack('>B3xQQIQ', 1, 0, 0, timescale, duration)
+        else:
+            payload = struct.pack('>B3xIIII', 0, 0, 0, timescale, duration)
+        return _mp4_box(b'mvhd', payload + b'\x00' * 80)
+
+    def _write(self, name='source.mp4', co64=False, large_mdat=False, large_moov=False, moov_first=False, version=0):
+        ftyp = _mp4_box(b'ftyp', b'isom\x00\x00\x02\x00isom')
+        data = b''.join(self.CHUNKS)
+        if large_mdat:
+            mdat = struct.pack('>I4sQ', 1, b'mdat', len(data) + 16) + data
+        else:
+            mdat = _mp4_box(b'mdat', data)
+        start = len(ftyp) + len(mdat) - len(data)
+        offsets, position = [], start
+        for chunk in self.CHUNKS:
+            offsets.append(position)
+            position += len(chunk)
+        if co64:
+            table = _mp4_box(b'co64', struct.pack(f'>II{len(offsets)}Q', 0, len(offsets), *offsets))
+        else:
+            table = _mp4_box(b'stco', struct.pack(f'>II{len(offsets)}I', 0, len(offsets), *offsets))
+        moov_payload = self._mvhd(version, 1000, 90500) + _mp4_box(
+            b'trak', _mp4_box(b'mdia', _mp4_box(b'minf', _mp4_box(b'stbl', table))))
+        if large_moov:
+            # Taille 64 bits (champ taille = 1) : en-tête de 16 octets
+            moov = struct.pack('>I4sQ', 1, b'moov', len(moov_payload) + 16) + moov_payload
+        else:
+            moov = _mp4_box(b'moov', moov_payload)
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(ftyp + (moov + mdat if moov_first else mdat + moov))
+        return path
+
+
+class Mp4FaststartTests(Mp4SampleMixin, SimpleTestCase):
+    """Réécriture faststart sur de petits MP4 synthétiques (moov en fin de fichier)."""
+
+    def _chunk_table(self, path):
+        """(type de table, offsets) de la piste, lus dans le moov du fichier."""
+        boxes = [(b'moov', mp4._read_moov(path))]
+        while boxes:
+            box_type, payload = boxes.pop()
+            if box_type in (b'stco', b'co64'):
+                count = struct.unpack('>I', payload[4:8])[0]
+                fmt = 'I' if box_type == b'stco' else 'Q'
+                return box_type, list(struct.unpack(f'>{count}{fmt}', payload[8:8 + count * struct.calcsize(fmt)]))
+            if box_type in mp4.CONTAINER_BOXES:
+                boxes.extend(mp4._children(payload))
+        return None, []
+
+    def _read_chunks(self, path, offsets):
+        with open(path, 'rb') as f:
+            chunks = []
+            for offset, chunk in zip(offsets, self.CHUNKS):
+                f.seek(offset)
+                chunks.append(f.read(len(chunk)))
+        return chunks
+
+    def _assert_rewritten(self, source, target, expected_table):
+        self.assertTrue(mp4.needs_faststart(source))
+        self.assertTrue(mp4.faststart(source, target))
+        self.assertEqual([box[0] for box in mp4.top_level_boxes(target)], [b'ftyp', b'moov', b'mdat'])
+        self.assertFalse(mp4.needs_faststart(target))
+
+        _, old_offsets = self._chunk_table(source)
+        table, new_offsets = self._chunk_table(target)
+        self.assertEqual(table, expected_table)
+        moov_size = next(box[2] for box in mp4.top_level_boxes(target) if box[0] == b'moov')
+        self.assertEqual(new_offsets, [offset + moov_size for offset in old_offsets])
+        self.assertEqual(self._read_chunks(target, new_offsets), list(self.CHUNKS))
+        self.assertEqual(os.path.getsize(target), os.path.getsize(source) + moov_size
+                         - next(box[2] for box in mp4.top_level_boxes(source) if box[0] == b'moov'))
+
+    def test_moves_moov_before_mdat_and_shifts_offsets(self):
+        self._assert_rewritten(self._write(), os.path.join(self.dir, 'out.mp4'), b'stco')
+
+    def test_reads_co64_and_64_bit_box_sizes(self):
+        # Les offsets décalés tiennent sur 32 bits : la table est réécrite en stco
+        self._assert_rewritten(self._write(co64=True, large_mdat=True), os.path.join(self.dir, 'out.mp4'), b'stco')
+
+    def test_upgrades_stco_to_co64_when_offsets_overflow(self):
+        source = self._write()
+        # Limite 32 bits abaissée : les offsets décalés la dépassent sans fichier de 4 Go
+        with mock.patch.object(mp4, 'UINT32_MAX', 250):
+            self._assert_rewritten(source, os.path.join(self.dir, 'out.mp4'), b'co64')
+
+    def test_already_faststart_file_is_left_untouched(self):
+        source = self._write(moov_first=True)
+        target = os.path.join(self.dir, 'out.mp4')
+        self.assertFalse(mp4.needs_faststart(source))
+        self.assertFalse(mp4.faststart(source, target))
+        self.assertFalse(os.path.exists(target))
+
+    def test_duration_from_mvhd_versions(self):
+        for version in (0, 1):
+            path = self._write(f'v{version}.mp4', version=version)
+            self.assertAlmostEqual(mp4.duration_seconds(path), 90.5)
+
+    def test_moov_with_64_bit_size(self):
+        path = self._write(large_moov=True)
+        self.assertAlmostEqual(mp4.duration_seconds(path), 90.5)
+        target = os.path.join(self.dir, 'out.mp4')
+        self.assertTrue(mp4.faststart(path, target))
+        self.assertAlmostEqual(mp4.duration_seconds(target), 90.5)
+        _, offsets = self._chunk_table(target)
+        self.assertEqual(self._read_chunks(target, offsets), list(self.CHUNKS))
+
+    def test_truncated_file_is_rejected(self):
+        path = self._write()
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 10)
+        with self.assertRaises(mp4.MP4Error):
+            mp4.needs_faststart(path)
+
+
+@override_settings(FLIXORA_BACKGROUND_TASKS=False)
+class VideoIngestTests(Mp4SampleMixin, TestCase):
+    """Faststart d'une vidéo partagée par plusieurs lignes du stockage par contenu."""
+
+    def setUp(self):
+        super().setUp()
+        media_override = override_settings(MEDIA_ROOT=os.path.join(self.dir, 'media'))
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def test_shared_blob_is_rewritten_once_under_its_new_digest(self):
+        with open(self._write(), 'rb') as f:
+            data = f.read()
+        movies = [
+            Movie.objects.create(title=f'Film {i}', description='d', video=SimpleUploadedFile('film.mp4', data))
+            for i in range(2)
+        ]
+        episode = Episode.objects.create(movie=movies[0], episode_number=1, title='Pilote',
+                                         video=SimpleUploadedFile('ep.mp4', data))
+        old_name = movies[0].video.name
+        self.assertEqual(MediaBlob.objects.get(name=old_name).refcount, 3)
+
+        self.assertTrue(ingest_video('movies.Movie', movies[0].pk))
+        new_name = Movie.objects.get(pk=movies[0].pk).video.name
+        self.assertNotEqual(new_name, old_name)
+        path = blob_storage().path(new_name)
+        self.assertFalse(mp4.needs_faststart(path))
+        self.assertEqual(os.path.basename(new_name), file_digest(path) + '.mp4')
+        # Toutes les références suivent le nouveau blob, compteurs et taille compris
+        self.assertEqual(set(Movie.objects.values_list('video', flat=True)), {new_name})
+        self.assertEqual(Episode.objects.get(pk=episode.pk).video.name, new_name)
+        blob = MediaBlob.objects.get(name=new_name)
+        self.assertEqual((blob.refcount, blob.size), (3, os.path.getsize(path)))
+        self.assertEqual(MediaBlob.objects.get(name=old_name).refcount, 0)
+        self.assertEqual(os.listdir(blob_storage().path(TEMP_DIR)), [])
+
+        # Tâche d'une autre ligne planifiée avant le report : rien à réécrire, la durée est renseignée
+        self.assertFalse(ingest_video('movies.Episode', episode.pk))
+        self.assertFalse(ingest_video('movies.Movie', movies[1].pk))
+        self.assertEqual(set(Movie.objects.values_list('duration', flat=True)), {2})
+        self.assertEqual(Episode.objects.get(pk=episode.pk).duration, 2)
+
+        call_command('gc_media', '--grace', '0', stdout=StringIO())
+        self.assertFalse(blob_storage().exists(old_name))
+        self.assertTrue(blob_storage().exists(new_name))
+
+class ImportCatalogTests(TestCase):
+    """Import du catalogue en flux : lots, reprise, lignes invalides et fichiers."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=os.path.join(self.dir, 'media'))
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def _manifest(self, rows, name='catalogue.jsonl'):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write((row if isinstance(row, str) else json.dumps(row)) + '\n')
+        return path
+
+    def _import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, '--skip-media-processing', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def _series_rows(self):
+        return [
+            {'type': 'serie', 'title': 'Les Gardiens', 'release_year': 2020, 'description': 'Série'},
+            *({'type': 'episode', 'series': 'Les Gardiens', 'season': 1, 'episode': n, 'title': f'Épisode {n}'}
+              for n in range(1, 4)),
+        ]
+
+    def test_jsonl_import_skips_invalid_rows(self):
+        path = self._manifest([
+            {'type': 'film', 'title': 'Aube', 'release_year': 2001, 'category': 'drama', 'description': 'd'},
+            '{pas du json',
+            {'type': 'film', 'title': 'Sans année', 'release_year': 'vers 2000'},
+            {'type': 'film', 'title': 'Genre inconnu', 'category': 'western'},
+            {'type': 'documentaire', 'title': 'Type inconnu'},
+            '[1]',
+            '"x"',
+            '5',
+            *self._series_rows(),
+        ])
+        out, err = self._import(path, '--batch-size', '2')
+        self.assertIn('errors=7', out)
+        for line_no in (2, 3, 4, 5):
+            self.assertIn(f'ligne {line_no} :', err)
+        for line_no in (6, 7, 8):
+            self.assertIn(f'ligne {line_no} : objet JSON attendu', err)
+        self.assertEqual(sorted(Movie.objects.values_list('title', flat=True)), ['Aube', 'Les Gardiens'])
+        series = Movie.objects.get(title='Les Gardiens')
+        self.assertEqual((series.video_type, series.release_year), ('serie', 2020))
+        self.assertEqual(list(series.episodes.order_by('episode_number').values_list('title', flat=True)),
+                         ['Épisode 1', 'Épisode 2', 'Épisode 3'])
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_csv_import(self):
+        path = os.path.join(self.dir, 'catalogue.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write('type,title,release_year,category,duration,description\n'
+                    'film,Aube,2001,drama,95,Un film\n'
+                    'anime,Nuit des Dragons,,action,,\n')
+        self._import(path)
+        self.assertEqual(Movie.objects.get(title='Aube').duration, 95)
+        anime = Movie.objects.get(title='Nuit des Dragons')
+        self.assertEqual((anime.video_type, anime.release_year, anime.category), ('anime', None, 'action'))
+
+    def test_reimport_updates_without_duplicates(self):
+        rows = self._series_rows() + [{'type': 'film', 'title': 'Aube', 'release_year': 2001, 'director': 'A'}]
+        self._import(self._manifest(rows))
+        rows[-1]['director'] = 'B'
+        rows[1]['title'] = 'Pilote'
+        out, _ = self._import(self._manifest(rows, 'v2.jsonl'))
+        self.assertIn('movies_created=0', out)
+        self.assertEqual(Movie.objects.count(), 2)
+        self.assertEqual(Episode.objects.count(), 3)
+        self.assertEqual(Movie.objects.get(title='Aube').director, 'B')
+        self.assertTrue(Episode.objects.filter(title='Pilote', episode_number=1).exists())
+
+    def test_resume_after_interrupted_import(self):
+        rows = [{'type': 'film', 'title': f'Film {i}', 'release_year': 2000 + i} for i in range(6)]
+        rows.insert(4, {'type': 'film'})
+        path = self._manifest(rows)
+        with self.assertRaises(CommandError):
+            self._import(path, '--batch-size', '2', '--max-errors', '0')
+        # Les deux premiers lots sont validés et le point de reprise les couvre
+        self.assertEqual(Movie.objects.count(), 4)
+        with open(path + '.checkpoint', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['rows'], 4)
+
+        out, _ = self._import(path, '--batch-size', '2')
+        self.assertIn('Reprise après la ligne 4', out)
+        self.assertIn('movies_created=2', out)
+        self.assertEqual(Movie.objects.count(), 6)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+        # Manifeste modifié : la reprise est refusée tant que --restart n'est pas demandé
+        with open(path + '.checkpoint', 'w', encoding='utf-8') as f:
+            json.dump({'rows': 2, 'size': 1}, f)
+        with self.assertRaises(CommandError):
+            self._import(path)
+        out, _ = self._import(path, '--restart')
+        self.assertIn('movies_created=0', out)
+        self.assertEqual(Movie.objects.count(), 6)
+
+    def test_unknown_series_counts_toward_error_budget(self):
+        path = self._manifest([{'type': 'episode', 'series': 'Inconnue', 'episode': 1}])
+        with self.assertRaises(CommandError):
+            self._import(path, '--max-errors', '0')
+        out, err = self._import(path, '--restart')
+        self.assertIn('errors=1', out)
+        self.assertIn('ligne 1 : série introuvable : Inconnue', err)
+
+    def test_media_files_are_stored_once_by_content(self):
+        os.makedirs(os.path.join(self.dir, 'src'))
+        for name, content in (('a.mp4', b'bande-annonce'), ('b.mp4', b'bande-annonce'), ('poster.jpg', b'affiche')):
+            with open(os.path.join(self.dir, 'src', name), 'wb') as f:
+                f.write(content)
+        path = self._manifest([
+            {'type': 'film', 'title': 'Aube', 'video': 'src/a.mp4', 'thumbnail': 'src/poster.jpg'},
+            {'type': 'film', 'title': 'Crépuscule', 'video': 'src/b.mp4', 'thumbnail': 'src/poster.jpg'},
+            {'type': 'film', 'title': 'Absent', 'video': 'src/absent.mp4'},
+        ])
+        old = time.time() - 7 * 24 * 60 * 60
+        for name in ('a.mp4', 'b.mp4', 'poster.jpg'):
+            os.utime(os.path.join(self.dir, 'src', name), (old, old))
+        out, err = self._import(path)
+        self.assertIn('fichier introuvable : src/absent.mp4', err)
+        self.assertIn('files_copied=2', out)
+        self.assertIn('files_deduplicated=2', out)
+        videos = set(Movie.objects.values_list('video', flat=True))
+        self.assertEqual(len(videos), 1)
+        video = videos.pop()
+        self.assertTrue(is_blob_name(video))
+        self.assertEqual(MediaBlob.objects.disk_usage(), {'references': 4, 'blobs': 2, 'logical': 40, 'physical': 20})
+        # Copie : modifier la source ne change pas le blob, qui porte la date de l'import
+        stored = blob_storage().path(video)
+        self.assertFalse(os.path.samefile(stored, os.path.join(self.dir, 'src', 'a.mp4')))
+        self.assertGreater(os.path.getmtime(stored), old + 60)
+
+    def test_link_media_refreshes_the_blob_date(self):
+        os.makedirs(os.path.join(self.dir, 'src'))
+        source = os.path.join(self.dir, 'src', 'a.mp4')
+        with open(source, 'wb') as f:
+            f.write(b'bande-annonce')
+        old = time.time() - 7 * 24 * 60 * 60
+        os.utime(source, (old, old))
+        out, _ = self._import(self._manifest([{'type': 'film', 'title': 'Aube', 'video': 'src/a.mp4'}]), '--link-media')
+        self.assertIn('files_linked=1', out)
+        stored = blob_storage().path(Movie.objects.get().video.name)
+        self.assertTrue(os.path.samefile(stored, source))
+        # Le délai de grâce de gc_media part du rangement, pas de la date de la source
+        self.assertGreater(os.path.getmtime(stored), old + 60)
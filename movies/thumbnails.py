@@ -0,0 +1,130 @@
+# movies/thumbnails.py
+"""
+Déclinaisons responsives des images (affiches, vignettes d'épisodes, avatars).
+
+Chaque image est déclinée en plusieurs largeurs, en WebP et en JPEG, sous des
+noms déterministes à côté de l'original :
+    thumbnails/affiche.jpg -> thumbnails/affiche.w320.webp, thumbnails/affiche.w320.jpg
+Les templates n'ont donc besoin d'aucune requête pour construire le srcset.
+Les déclinaisons sont écrites dans le stockage du champ de l'image (stockage
+par contenu pour le catalogue) ; une régénération remplace chaque fichier par
+renommage, sans qu'il disparaisse entre-temps.
+"""
+import io
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Largeurs produites (px) : couvrent les cartes en 1x/2x et l'affiche de détail
+DERIVATIVE_WIDTHS = (160, 320, 480, 800)
+
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+DERIVATIVE_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+# Valeurs `sizes` selon l'emplacement de l'image dans la page
+SIZES = {
+    'poster': '(max-width: 600px) 45vw, 220px',
+    'poster_large': '(max-width: 768px) 80vw, 350px',
+    'episode': '(max-width: 600px) 90vw, 280px',
+    'history': '120px',
+    'avatar': '150px',
+}
+
+
+def derivative_name(name, width, fmt):
+    """Nom de la déclinaison `width`/`fmt` d'un fichier stocké."""
+    root, _ = os.path.splitext(name)
+    return f'{root}.w{width}.{DERIVATIVE_EXTENSIONS[fmt]}'
+
+
+def derivatives_ready(fieldfile):
+    """Vrai si les déclinaisons de l'image existent (mémorisé sur le FieldFile)."""
+    if not fieldfile:
+        return False
+    if not hasattr(fieldfile, '_derivatives_ready'):
+        fieldfile._derivatives_ready = fieldfile.storage.exists(
+            derivative_name(fieldfile.name, DERIVATIVE_WIDTHS[0], 'webp')
+        )
+    return fieldfile._derivatives_ready
+
+
+def srcset(fieldfile, fmt='jpeg'):
+    """Valeur de l'attribut srcset, ou chaîne vide si rien n'est encore généré."""
+    if not derivatives_ready(fieldfile):
+        return ''
+    storage = fieldfile.storage
+    return ', '.join(
+        f'{storage.url(derivative_name(fieldfile.name, width, fmt))} {width}w'
+        for width in DERIVATIVE_WIDTHS
+    )
+
+
+def _encode(image, fmt):
+    pil_format, options = DERIVATIVE_FORMATS[fmt]
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _write(storage, name, data):
+    """Écrit `data` sous `name` : fichier temporaire voisin puis renommage atomique."""
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # Stockage distant : pas de renommage, simple remplacement
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(data))
+        return
+    # Pas de storage.save() : le stockage par contenu rangerait le fichier sous sa propre empreinte
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if storage.file_permissions_mode is not None:
+            os.chmod(temp_path, storage.file_permissions_mode)
+        # Les lecteurs voient l'ancienne ou la nouvelle version, jamais un 404
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def generate_derivatives(name, storage):
+    """
+    Produit toutes les déclinaisons d'une image stockée sous `name` dans
+    `storage` (le stockage du champ, `fieldfile.storage`).
+    Les largeurs supérieures à l'original sont produites à la taille
+    d'origine (jamais d'agrandissement) pour que chaque nom existe.
+    Retourne le nombre de fichiers écrits.
+    """
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        # Décodage JPEG réduit directement à la plus grande taille utile
+        image.draft('RGB', (max(DERIVATIVE_WIDTHS), max(DERIVATIVE_WIDTHS) * 4))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    written = 0
+    # Du plus grand au plus petit : chaque réduction part de la précédente
+    source = image
+    for width in sorted(DERIVATIVE_WIDTHS, reverse=True):
+        if source.width > width:
+            height = max(1, round(source.height * width / source.width))
+            source = source.resize((width, height), Image.LANCZOS)
+        for fmt in DERIVATIVE_FORMATS:
+            _write(storage, derivative_name(name, width, fmt), _encode(source, fmt))
+            written += 1
+    return written
@@ -0,0 +1,167 @@
+# movies/trending.py
+"""
+Tendances : popularité à décroissance exponentielle, matérialisée par film.
+
+Chaque événement (visionnage, favori, évaluation) ajoute son poids au score
+du film, un événement perdant la moitié de sa valeur toutes les
+FLIXORA_TRENDING_HALF_LIFE secondes. Les vues n'écrivent pas ce score :
+les signaux le confient à une tâche d'arrière-plan (record_later).
+
+Plutôt que de faire décroître tous les scores en permanence, ils sont exprimés à une date de référence commune
+(`epoch`) : un événement survenu à l'instant t ajoute
+`poids × exp(λ (t − epoch))`. Le classement reste celui des scores décroissants,
+donc lisible directement dans l'index (video_type, -score).
+
+`update_trending` (à planifier, par ex. toutes les heures) ramène
+périodiquement la référence à maintenant pour que les exposants restent
+petits, et supprime les scores devenus négligeables.
+"""
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Subquery, Value, When
+from django.db.models.functions import Exp
+
+from . import catalog_cache
+from .models import Favorite, Movie, MovieTrending, Rating, WatchHistory
+from .tasks import run_in_background
+
+VIEW_WEIGHT = 1.0
+FAVORITE_WEIGHT = 2.0
+# Note -> poids ; les mauvaises notes ne font pas monter un film
+RATING_WEIGHTS = {5: 2.0, 4: 1.5, 3: 0.5}
+# Scores supprimés lors du recalage (un événement isolé vieux d'une dizaine de demi-vies)
+PRUNE_BELOW = 1e-3
+
+
+def half_life():
+    return getattr(settings, 'FLIXORA_TRENDING_HALF_LIFE', 3 * 24 * 60 * 60)
+
+
+def decay_rate():
+    """λ tel que exp(-λ × demi-vie) = 1/2."""
+    return math.log(2) / half_life()
+
+
+def rating_weight(score):
+    return RATING_WEIGHTS.get(score, 0)
+
+
+def _growth(at):
+    """exp(λ (at − epoch)) évalué par la base pour chaque ligne."""
+    return Exp(Value(decay_rate()) * (Value(float(at)) - F('epoch')), output_field=FloatField())
+
+
+def record(events, at=None):
+    """
+    Ajoute des événements [(film, poids)] aux scores : un seul UPDATE dans le
+    cas courant, deux requêtes de plus au premier événement d'un film.
+    """
+    totals = defaultdict(float)
+    for movie_id, weight in events:
+        if weight:
+            totals[movie_id] += weight
+    if not totals:
+        return
+    at = time.time() if at is None else at
+
+    if len(totals) == 1:
+        weight = Value(next(iter(totals.values())))
+    else:
+        weight = Case(*[When(movie_id=movie_id, then=Value(total)) for movie_id, total in totals.items()],
+                      default=Value(0.0), output_field=FloatField())
+    updated = MovieTrending.objects.filter(movie_id__in=list(totals)).update(score=F('score') + weight * _growth(at))
+    if updated == len(totals):
+        return
+
+    # Premier événement de certains films : créer leur ligne à la référence commune
+    missing = Movie.objects.filter(pk__in=list(totals), trending__isnull=True).annotate(
+        epoch=Subquery(MovieTrending.objects.values('epoch')[:1]),
+    ).values_list('pk', 'video_type', 'epoch')
+    rate = decay_rate()
+    # Une création concurrente du même film l'emporte (ignore_conflicts) : un événement au plus est perdu
+    MovieTrending.objects.bulk_create([
+        MovieTrending(movie_id=movie_id, video_type=video_type, epoch=epoch or at,
+                      score=totals[movie_id] * math.exp(rate * (at - (epoch or at))))
+        for movie_id, video_type, epoch in missing
+    ], ignore_conflicts=True)
+
+
+def record_later(events):
+    """
+    Planifie record() en arrière-plan après le commit : les vues ne paient
+    pas l'écriture des tendances, et un événement annulé n'est pas compté.
+    L'instant de l'événement est fixé dès maintenant.
+    """
+    events = [(movie_id, weight) for movie_id, weight in events if weight]
+    if events:
+        run_in_background(record, events, at=time.time())
+
+
+def rebase(at=None):
+    """Ramène tous les scores à la référence `at` et supprime les scores négligeables."""
+    at = time.time() if at is None else at
+    with transaction.atomic():
+        # Dans un UPDATE, F('epoch') désigne encore l'ancienne référence
+        updated = MovieTrending.objects.update(
+            score=F('score') * Exp(Value(decay_rate()) * (F('epoch') - Value(float(at))), output_field=FloatField()),
+            epoch=float(at),
+        )
+        pruned, _ = MovieTrending.objects.filter(score__lt=PRUNE_BELOW).delete()
+    return updated, pruned
+
+
+def rebuild(at=None, half_lives=10):
+    """
+    Recalcule tous les scores à partir des événements des `half_lives`
+    dernières demi-vies (données importées en masse, sans signaux).
+    """
+    at = time.time() if at is None else at
+    rate = decay_rate()
+    since = datetime.fromtimestamp(at - half_lives * half_life(), tz=timezone.utc)
+    scores = defaultdict(float)
+
+    def add(movie_id, moment, weight):
+        if weight:
+            scores[movie_id] += weight * math.exp(rate * (moment.timestamp() - at))
+
+    for movie_id, moment in WatchHistory.objects.filter(watched_at__gte=since) \
+            .values_list('movie_id', 'watched_at').iterator():
+        add(movie_id, moment, VIEW_WEIGHT)
+    for movie_id, moment in Favorite.objects.filter(added_at__gte=since) \
+            .values_list('movie_id', 'added_at').iterator():
+        add(movie_id, moment, FAVORITE_WEIGHT)
+    for movie_id, moment, score in Rating.objects.filter(created_at__gte=since) \
+            .values_list('movie_id', 'created_at', 'score').iterator():
+        add(movie_id, moment, rating_weight(score))
+
+    video_types = dict(Movie.objects.filter(pk__in=list(scores)).values_list('pk', 'video_type'))
+    with transaction.atomic():
+        MovieTrending.objects.all().delete()
+        MovieTrending.objects.bulk_create([
+            MovieTrending(movie_id=movie_id, video_type=video_types[movie_id], score=score, epoch=float(at))
+            for movie_id, score in scores.items()
+            if movie_id in video_types and score >= PRUNE_BELOW
+        ], batch_size=1000)
+    return len(scores)
+
+
+def trending_rows(limit):
+    """
+    Films les plus en vogue par type : {video_type: [films]}.
+    Lus dans l'index (video_type, -score) et gardés en cache quelques minutes.
+    """
+    def build():
+        return {
+            video_type: list(
+                Movie.objects.filter(trending__video_type=video_type, trending__score__gt=0)
+                .order_by('-trending__score')[:limit]
+            )
+            for video_type, _ in Movie.VIDEO_TYPE_CHOICES
+        }
+    bucket = int(time.time() // getattr(settings, 'FLIXORA_TRENDING_REFRESH', 300))
+    return catalog_cache.cached_data(build, 'trending', limit, bucket)
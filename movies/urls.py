@@ -6,12 +6,18 @@ urlpatterns = [
     # Pages principales
     path('', views.movie_list, name='movie_list'),
     path('movie/<int:pk>/', views.movie_detail, name='movie_detail'),
+    path('movie/<int:pk>/stream/', views.stream_movie, name='stream_movie'),
+    path('episode/<int:pk>/stream/', views.stream_episode, name='stream_episode'),
+    path('movie/<int:movie_id>/episodes/<int:episode_id>/navigation/', views.episode_navigation, name='episode_navigation'),
 
     # Pages par type
     path('films/', views.films_view, name='films'),
     path('animes/', views.animes_view, name='animes'),
     path('series/', views.series_view, name='series'),
     path('type/<str:video_type>/', views.movies_by_type, name='movies_by_type'),
+    path('api/movies/', views.movie_cards, name='movie_cards'),
+    path('api/search/', views.search_api, name='search_api'),
+    path('api/catalog-cache-stats/', views.catalog_cache_stats, name='catalog_cache_stats'),
 
     # Authentification
     path('login/', views.login_view, name='login'),
@@ -21,6 +27,7 @@ urlpatterns = [
     # Profil
     path('profile/', views.profile_view, name='profile'),
     path('profile/update-avatar/', views.update_avatar, name='update_avatar'),
+    path('profile/avatar-status/', views.avatar_status, name='avatar_status'),
     path('profile/update/', views.update_profile, name='update_profile'),
     
     # Favoris
@@ -30,6 +37,7 @@ urlpatterns = [
 
     # Commentaires et évaluations
     path('movie/<int:movie_id>/comment/', views.add_comment, name='add_comment'),
+    path('movie/<int:movie_id>/comments/', views.movie_comments, name='movie_comments'),
     path('movie/<int:movie_id>/rate/', views.add_rating, name='add_rating'),
     path('movie/<int:movie_id>/watch/', views.add_to_watch_history, name='add_to_watch_history'),
 
@@ -39,6 +47,7 @@ urlpatterns = [
     path('remove-from-history/<int:history_id>/', views.remove_from_history, name='remove_from_history'),
     # urls.py
     path('api/check-watch-history/<int:movie_id>/', views.check_watch_history, name='check_watch_history'),
+    path('api/movie-status/', views.movie_status, name='movie_status'),
 
 
     #path('movie/<int:movie_id>/add-episode/', views.add_episode, name='add_episode'),
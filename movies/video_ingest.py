@@ -0,0 +1,126 @@
+# movies/video_ingest.py
+"""
+Traitement des vidéos téléversées : déplacement de la boîte `moov` en tête
+de fichier (lecture immédiate dans le navigateur) et extraction de la durée.
+
+Une vidéo du stockage par contenu peut être partagée par plusieurs lignes.
+Sa version faststart est rangée sous sa propre empreinte et toutes les
+références à l'ancien blob y sont reportées : un nom de blob reste
+l'empreinte de son contenu, et la taille enregistrée dans MediaBlob celle du
+fichier. L'ancien blob, qui n'est plus référencé, est supprimé par `gc_media`
+(les lectures en cours gardent le fichier ouvert).
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+from django.apps import apps
+from django.db import transaction
+
+from .blob_storage import TEMP_DIR, is_blob_name
+from .catalog_cache import bump_catalog_version
+from .models import MediaBlob, blob_reference_fields
+from .mp4 import MP4Error, duration_seconds, faststart, needs_faststart
+
+logger = logging.getLogger(__name__)
+
+MP4_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+
+# Un verrou par fichier : les tâches des lignes qui partagent une vidéo ne la réécrivent qu'une fois
+_file_locks = weakref.WeakValueDictionary()
+_file_locks_guard = threading.Lock()
+
+
+def _file_lock(name):
+    with _file_locks_guard:
+        lock = _file_locks.get(name)
+        if lock is None:
+            lock = _file_locks[name] = threading.Lock()
+        return lock
+
+
+def _is_referenced(name):
+    return any(
+        model._default_manager.filter(**{field: name}).exists()
+        for model, field in blob_reference_fields()
+    )
+
+
+def _move_references(old_name, new_name):
+    """Reporte toutes les références de `old_name` sur `new_name` et leurs compteurs."""
+    with transaction.atomic():
+        moved = 0
+        for model, field in blob_reference_fields():
+            # update() : pas de signal, donc pas de nouvelle ingestion
+            moved += model._default_manager.filter(**{field: old_name}).update(**{field: new_name})
+        MediaBlob.objects.adjust({old_name: -moved, new_name: moved})
+    # Les fragments en cache contiennent l'ancien nom de fichier
+    bump_catalog_version()
+
+
+def _faststart(storage, name):
+    """Réécrit la vidéo `name` en faststart ; retourne le nom du fichier obtenu."""
+    path = storage.path(name)
+    temp_dir = storage.path(TEMP_DIR)
+    os.makedirs(temp_dir, exist_ok=True)
+    # Nom unique : deux réécritures simultanées n'écrivent jamais dans le même fichier
+    fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(name)[1], dir=temp_dir)
+    os.close(fd)
+    try:
+        faststart(path, temp_path)
+        shutil.copymode(path, temp_path)
+        if not is_blob_name(name):
+            # Ancien nom (hors stockage par contenu) : remplacement atomique
+            os.replace(temp_path, path)
+            return name
+        # Rangé sous l'empreinte du fichier réécrit (lien physique : le fichier temporaire est supprimé ensuite)
+        new_name, _ = storage.save_path(temp_path, link=True)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    _move_references(name, new_name)
+    return new_name
+
+
+def ingest_video(model_label, pk):
+    """
+    Optimise la vidéo d'un Movie ou d'un Episode et renseigne sa durée
+    (en minutes) si elle est vide. Retourne True si le fichier a été réécrit.
+    """
+    model = apps.get_model(model_label)
+    obj = model.objects.filter(pk=pk).only('video', 'duration').first()
+    if obj is None or not obj.video:
+        return False
+    storage, name = obj.video.storage, obj.video.name
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # Stockage distant : pas d'accès direct au fichier
+        return False
+    if not path.lower().endswith(MP4_EXTENSIONS) or not os.path.isfile(path):
+        return False
+
+    rewritten = False
+    try:
+        with _file_lock(name):
+            # Une autre ligne a pu faire traiter ce blob pendant l'attente du verrou
+            if needs_faststart(path) and (not is_blob_name(name) or _is_referenced(name)):
+                path = storage.path(_faststart(storage, name))
+                rewritten = True
+
+        if obj.duration is None:
+            seconds = duration_seconds(path)
+            if seconds:
+                # update() : pas de signal post_save, donc pas de nouvelle ingestion
+                updated = model.objects.filter(pk=pk, duration__isnull=True).update(
+                    duration=max(1, round(seconds / 60))
+                )
+                if updated:
+                    # Les cartes affichent la durée
+                    bump_catalog_version()
+    except (MP4Error, OSError) as e:
+        logger.warning("Vidéo %s #%s non traitée : %s", model_label, pk, e)
+    return rewritten
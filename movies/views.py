@@ -1,108 +1,149 @@
 # movies/views.py
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import JsonResponse, Http404
+from django.views.decorators.http import require_POST, require_safe
 from django.views.decorators.csrf import csrf_exempt
 import os
 import json
+from collections import defaultdict
 from django.http import JsonResponse
 import uuid
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.template.loader import render_to_string
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from asgiref.sync import sync_to_async
 from .models import Movie, UserProfile, Favorite, Comment, Rating, WatchHistory,Episode
+from .pagination import keyset_paginate, normalize_cursor
+from .search import search_movies
+from .streaming import serve_media_file
+from .progress import progress_buffer
+from .episodes import EpisodeIndex
+from .recommendations import recommended_for, similar_movies
+from .trending import trending_rows
+from .db_router import replica_reads
+from .tasks import run_in_background
+from .profile_cache import aget_or_create_profile, get_or_create_profile, refresh_stats
+from . import avatars, catalog_cache
 
-# Helper function pour obtenir ou créer un profil
-def get_or_create_profile(user):
-    try:
-        return user.profile
-    except UserProfile.DoesNotExist:
-        # Créer le profil si non existant
-        return UserProfile.objects.create(user=user)
+# Taille des pages du catalogue (pagination par curseur)
+HOME_ROW_SIZE = 8
+RECOMMENDED_ROW_SIZE = 8
+TRENDING_ROW_SIZE = 8
+SIMILAR_MOVIES_SIZE = 6
+CATALOG_PAGE_SIZE = 24
+CATALOG_MAX_PAGE_SIZE = 48
+VALID_VIDEO_TYPES = ['film', 'anime', 'serie']
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+COMMENTS_PAGE_SIZE = 10
+# Nombre maximal de films par appel à movie_status
+STATUS_MAX_IDS = 100
 
 # Pages principales
+def _favorite_movie_ids(request):
+    """
+    Ensemble des IDs de films favoris de l'utilisateur courant.
+    Résolu en une seule requête puis mémorisé sur la requête.
+    """
+    if not hasattr(request, '_favorite_movie_ids'):
+        if request.user.is_authenticated:
+            request._favorite_movie_ids = frozenset(
+                Favorite.objects.filter(user_profile__user_id=request.user.pk)
+                .order_by().values_list('movie_id', flat=True)
+            )
+        else:
+            request._favorite_movie_ids = frozenset()
+    return request._favorite_movie_ids
+
+def _catalog_page(video_type, cursor, limit):
+    """
+    Page du catalogue (films, curseur suivant), en cache jusqu'à la prochaine
+    modification. `cursor` doit venir de normalize_cursor : il entre dans la clé.
+    """
+    def build():
+        movies = Movie.objects.all()
+        if video_type:
+            movies = movies.filter(video_type=video_type)
+        return keyset_paginate(movies, cursor, limit)
+    return catalog_cache.cached_data(build, 'page', video_type or 'all', cursor or 'first', limit)
+
+@replica_reads
 def movie_list(request):
-    # Récupérer tous les films
-    all_movies = Movie.objects.all().order_by('-created_at')  # ou '-id' si pas de created_at
-    
-    # Récupérer les films par type
-    films = Movie.objects.filter(video_type='film').order_by('-created_at')[:8]
-    animes = Movie.objects.filter(video_type='anime').order_by('-created_at')[:8]
-    series = Movie.objects.filter(video_type='serie').order_by('-created_at')[:8]
-    
-    for movie in all_movies:
-        movie.category_display = movie.get_category_display()
-        movie.category_lower = movie.category.lower()
-        movie.is_fav = movie.is_favorite_for_user(request.user)
-    
-    return render(request, 'movies/movie_list.html', {
-        'movies': all_movies,
-        'films': films,
-        'animes': animes,
-        'series': series,
-    })
+    # Rangées par type depuis le cache ; l'état favori vient d'une seule requête
+    favorite_ids = _favorite_movie_ids(request)
+    context = {}
+    for video_type, name in (('film', 'films'), ('anime', 'animes'), ('serie', 'series')):
+        movies, _ = _catalog_page(video_type, None, HOME_ROW_SIZE)
+        context[name] = catalog_cache.mark_favorites(movies, favorite_ids)
+        context[f'{name}_fav_key'] = catalog_cache.favorites_key(movies, favorite_ids)
+
+    # Tendances par type : lecture de l'index (video_type, -score), en cache quelques minutes
+    trending = trending_rows(TRENDING_ROW_SIZE)
+    context['trending'] = [
+        (label, catalog_cache.mark_favorites(trending[video_type], favorite_ids))
+        for video_type, label in (('film', 'Films'), ('anime', 'Animes'), ('serie', 'Séries'))
+        if trending.get(video_type)
+    ]
+
+    # Recommandations : lecture des similarités précalculées (build_recommendations)
+    if request.user.is_authenticated:
+        context['recommended'] = catalog_cache.mark_favorites(
+            recommended_for(request.user, favorite_ids, RECOMMENDED_ROW_SIZE), favorite_ids
+        )
+    
+    return render(request, 'movies/movie_list.html', context)
 # views.py - REMPLACE ta fonction movie_detail existante par CELLE-CI :
 
+@replica_reads
 def movie_detail(request, pk):
     movie = get_object_or_404(Movie, pk=pk)
     
     # ============ PARTIE POUR LES ÉPISODES ============
-    episodes = []
-    seasons = []
-    current_episode = None
-    
-    # Récupérer les épisodes
-    episodes = Episode.objects.filter(movie=movie).order_by('season_number', 'episode_number')
-    
-    if episodes.exists():  # Seulement si le film a des épisodes
-        # Organiser par saisons
-        seasons_dict = {}
-        for episode in episodes:
-            if episode.season_number not in seasons_dict:
-                seasons_dict[episode.season_number] = []
-            seasons_dict[episode.season_number].append(episode)
-        
-        # Convertir en liste de tuples pour le template
-        seasons = sorted(seasons_dict.items())
-        
-        # Récupérer l'épisode demandé (depuis l'URL)
-        episode_id = request.GET.get('episode')
-        
-        if episode_id:
-            try:
-                current_episode = Episode.objects.get(id=episode_id, movie=movie)
-            except Episode.DoesNotExist:
-                # Si l'épisode n'existe pas, prendre le premier
-                current_episode = episodes.first()
-        else:
-            # Par défaut, premier épisode
-            current_episode = episodes.first()
+    # Index des épisodes : une requête (ou le cache), navigation comprise
+    episode_index = EpisodeIndex.for_series(movie.pk)
+    current_episode = episode_index.current(request.GET.get('episode'))
     # =================================================
     
     # Enregistrer automatiquement la visite dans l'historique
     if request.user.is_authenticated:
-        profile = get_or_create_profile(request.user)
-        WatchHistory.objects.get_or_create(
-            user_profile=profile,
-            movie=movie,
-            defaults={
-                'duration_watched': 0,
-                'completed': False
-            }
-        )
+        profile = request.profile
+        # Cas courant (film déjà dans l'historique) : une seule lecture, sans transaction
+        if not WatchHistory.objects.filter(user_profile=profile, movie=movie).exists():
+            try:
+                with transaction.atomic():
+                    WatchHistory.objects.create(
+                        user_profile=profile,
+                        movie=movie,
+                        duration_watched=0,
+                        completed=False
+                    )
+                    UserProfile.objects.filter(pk=profile.pk).adjust_stats(history_count=1)
+            except IntegrityError:
+                # Ajouté entre-temps par une requête concurrente
+                pass
     
     # Vérifier si le film est favori
-    is_favorite = movie.is_favorite_for_user(request.user)
+    favorite_ids = _favorite_movie_ids(request)
+    is_favorite = movie.pk in favorite_ids
+
+    # « Les spectateurs ont aussi regardé » : voisins précalculés, en cache
+    also_watched = catalog_cache.cached_data(
+        lambda: similar_movies(movie.pk, SIMILAR_MOVIES_SIZE), 'similar', movie.pk
+    )
     
-    # Récupérer les commentaires et évaluations
-    comments = movie.comments.all().order_by('-created_at')
+    # Première page des commentaires ; les suivantes sont chargées au défilement
+    comments, comments_next_cursor = _comments_page(movie.pk, None)
     user_rating = None
     if request.user.is_authenticated:
-        profile = get_or_create_profile(request.user)
+        profile = request.profile
         try:
             user_rating = Rating.objects.get(user_profile=profile, movie=movie)
         except Rating.DoesNotExist:
@@ -112,28 +153,58 @@ def movie_detail(request, pk):
     return render(request, 'movies/movie_detail.html', {
         'movie': movie,
         'current_episode': current_episode,
-        'seasons': seasons,
-        'episodes': episodes,
+        'seasons': episode_index.seasons,
+        'episodes': episode_index.episodes,
+        'previous_episode': episode_index.previous(current_episode) if current_episode else None,
+        'next_episode': episode_index.next(current_episode) if current_episode else None,
         'is_favorite': is_favorite,
+        'also_watched': also_watched,
         'comments': comments,
+        'comments_next_cursor': comments_next_cursor,
         'user_rating': user_rating
     })
 
+# Lecture vidéo (Range / 206)
+def _stream_video(request, video):
+    if not video:
+        raise Http404("Aucune vidéo disponible")
+    try:
+        return serve_media_file(request, video.path)
+    except FileNotFoundError:
+        raise Http404("Fichier vidéo introuvable")
+
+@require_safe
+def stream_movie(request, pk):
+    """Diffuser la vidéo d'un film avec prise en charge du déplacement (seek)"""
+    movie = get_object_or_404(Movie.objects.only('video'), pk=pk)
+    return _stream_video(request, movie.video)
+
+@require_safe
+def stream_episode(request, pk):
+    """Diffuser la vidéo d'un épisode avec prise en charge du déplacement (seek)"""
+    episode = get_object_or_404(Episode.objects.only('video'), pk=pk)
+    return _stream_video(request, episode.video)
+
 # Pages filtrées par type
+@replica_reads
 def movies_by_type(request, video_type):
     """Affiche les films filtrés par type (film, anime, serie)"""
     
     # Valider le type
-    valid_types = ['film', 'anime', 'serie']
-    if video_type not in valid_types:
+    if video_type not in VALID_VIDEO_TYPES:
         video_type = 'film'
     
-    # Filtrer les films par type
-    movies = Movie.objects.filter(video_type=video_type).order_by('-created_at')
+    # Première page seulement : la suite est chargée au défilement (movie_cards)
+    try:
+        cursor = normalize_cursor(request.GET.get('cursor'))
+    except ValueError:
+        # Curseur illisible : retour à la première page
+        cursor = None
+    movies, next_cursor = _catalog_page(video_type, cursor, CATALOG_PAGE_SIZE)
     
-    # Marquer les films favoris pour l'utilisateur connecté
-    for movie in movies:
-        movie.is_fav = movie.is_favorite_for_user(request.user)
+    # Marquer les favoris de l'utilisateur connecté (une seule requête)
+    favorite_ids = _favorite_movie_ids(request)
+    catalog_cache.mark_favorites(movies, favorite_ids)
     
     # Titre de la page selon le type
     page_titles = {
@@ -144,10 +215,128 @@ def movies_by_type(request, video_type):
     
     return render(request, 'movies/movies_by_type.html', {
         'movies': movies,
+        'next_cursor': next_cursor,
+        'page_key': cursor or 'first',
+        'fav_key': catalog_cache.favorites_key(movies, favorite_ids),
         'video_type': video_type,
         'page_title': page_titles.get(video_type, 'Films')
     })
 
+@replica_reads
+def movie_cards(request):
+    """Page suivante de cartes du catalogue (JSON) pour le défilement infini"""
+    video_type = request.GET.get('type') or None
+    if video_type and video_type not in VALID_VIDEO_TYPES:
+        return JsonResponse({'success': False, 'error': 'Type de vidéo invalide'}, status=400)
+    
+    try:
+        cursor = normalize_cursor(request.GET.get('cursor'))
+        limit = min(max(int(request.GET.get('limit', CATALOG_PAGE_SIZE)), 1), CATALOG_MAX_PAGE_SIZE)
+        movies, next_cursor = _catalog_page(video_type, cursor, limit)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    favorite_ids = _favorite_movie_ids(request)
+    catalog_cache.mark_favorites(movies, favorite_ids)
+    html = catalog_cache.cached_fragment(
+        lambda: render_to_string('movies/partials/movie_cards.html', {'movies': movies}, request=request),
+        'cards', video_type or 'all', cursor or 'first', limit, catalog_cache.favorites_key(movies, favorite_ids),
+    )
+    
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'count': len(movies),
+        'next_cursor': next_cursor,
+    })
+
+@login_required
+def catalog_cache_stats(request):
+    """Compteurs du cache du catalogue (réservé à l'équipe)"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Accès réservé'}, status=403)
+    return JsonResponse({'success': True, 'stats': catalog_cache.stats()})
+
+def search_api(request):
+    """Recherche plein texte dans le catalogue (JSON paginé, trié par pertinence)"""
+    query = request.GET.get('q', '').strip()
+    video_type = request.GET.get('type') or None
+    if video_type and video_type not in VALID_VIDEO_TYPES:
+        return JsonResponse({'success': False, 'error': 'Type de vidéo invalide'}, status=400)
+    
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        limit = min(max(int(request.GET.get('limit', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Paramètres de pagination invalides'}, status=400)
+    
+    movies, has_more = search_movies(query, video_type=video_type, limit=limit, offset=(page - 1) * limit)
+    
+    return JsonResponse({
+        'success': True,
+        'query': query,
+        'page': page,
+        'has_more': has_more,
+        'results': [{
+            'id': movie.id,
+            'title': movie.title,
+            'category': movie.category,
+            'category_display': movie.get_category_display(),
+            'video_type': movie.video_type,
+            'thumbnail_url': movie.thumbnail.url if movie.thumbnail else None,
+            'url': reverse('movie_detail', args=[movie.pk]),
+        } for movie in movies],
+    })
+
+def _comments_page(movie_id, cursor):
+    """Page de commentaires approuvés (auteurs compris en une requête), curseur suivant"""
+    comments = Comment.objects.filter(movie_id=movie_id, is_approved=True).select_related('user_profile__user')
+    return keyset_paginate(comments, cursor, COMMENTS_PAGE_SIZE)
+
+@require_safe
+def movie_comments(request, movie_id):
+    """Page suivante des commentaires d'un film (HTML des éléments + curseur suivant)"""
+    try:
+        comments, next_cursor = _comments_page(movie_id, request.GET.get('cursor') or None)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Curseur invalide'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'html': render_to_string('movies/partials/comment_list.html', {'comments': comments}, request=request),
+        'next_cursor': next_cursor,
+    })
+
+def _episode_payload(episode):
+    if episode is None:
+        return None
+    return {
+        'id': episode.id,
+        'title': episode.title,
+        'full_title': episode.full_episode_title,
+        'season_number': episode.season_number,
+        'episode_number': episode.episode_number,
+        'duration': episode.duration,
+        'stream_url': reverse('stream_episode', args=[episode.pk]),
+        'page_url': '{}?episode={}'.format(reverse('movie_detail', args=[episode.movie_id]), episode.pk),
+    }
+
+@require_safe
+def episode_navigation(request, movie_id, episode_id):
+    """Épisodes voisins (pour le préchargement et la lecture automatique)"""
+    episode_index = EpisodeIndex.for_series(movie_id)
+    episode = episode_index.get(episode_id)
+    if episode is None:
+        return JsonResponse({'success': False, 'error': 'Épisode introuvable'}, status=404)
+    
+    return JsonResponse({
+        'success': True,
+        'current': _episode_payload(episode),
+        'previous': _episode_payload(episode_index.previous(episode)),
+        'next': _episode_payload(episode_index.next(episode)),
+        'next_season': _episode_payload(episode_index.next_season(episode)),
+    })
+
 # Vues spécifiques pour chaque type
 def films_view(request):
     return movies_by_type(request, 'film')
@@ -244,30 +433,27 @@ def logout_view(request):
 # Profil
 @login_required
 def profile_view(request):
-    profile = get_or_create_profile(request.user)
+    # Écrire les positions en attente de l'utilisateur avant de lire le profil et ses compteurs
+    progress_buffer.flush(request.profile.pk)
+    # Le profil peut venir du cache : relire ses compteurs
+    profile = refresh_stats(request.profile)
     
     # Récupérer les films favoris
-    favorite_movies_ids = Favorite.objects.filter(
-        user_profile=profile
-    ).values_list('movie__id', flat=True)
-    
-    favorite_movies = Movie.objects.filter(id__in=favorite_movies_ids)
+    favorite_movies = Movie.objects.filter(favorites__user_profile=profile)
     
     # Récupérer l'historique récent
     recent_history = WatchHistory.objects.filter(
         user_profile=profile
-    ).order_by('-watched_at')[:10]
-    
-    # Compter les commentaires
-    comment_count = Comment.objects.filter(user_profile=profile).count()
+    ).select_related('movie').order_by('-watched_at')[:10]
     
+    # Les compteurs sont lus sur le profil (dénormalisés)
     return render(request, 'movies/profile.html', {
         'profile': profile,
         'favorite_movies': favorite_movies,
-        'favorite_count': favorite_movies.count(),
+        'favorite_count': profile.favorite_count,
         'recent_history': recent_history,
-        'watch_history_count': WatchHistory.objects.filter(user_profile=profile).count(),
-        'comment_count': comment_count,
+        'watch_history_count': profile.history_count,
+        'comment_count': profile.comment_count,
     })
 
 # Mise à jour de l'avatar
@@ -275,9 +461,13 @@ def profile_view(request):
 @require_POST
 @csrf_exempt
 def update_avatar(request):
-    """Mettre à jour l'avatar de l'utilisateur"""
+    """
+    Mettre à jour l'avatar de l'utilisateur. L'image est recadrée et
+    réencodée en arrière-plan : la réponse indique l'état du traitement
+    ('ready' ou 'pending'), à suivre via la vue avatar_status.
+    """
     try:
-        profile = get_or_create_profile(request.user)
+        profile = request.profile
         
         # Gérer l'avatar uploadé
         if 'avatar' in request.FILES:
@@ -292,32 +482,35 @@ def update_avatar(request):
             if avatar_file.content_type not in allowed_types:
                 return JsonResponse({'success': False, 'error': 'Format de fichier non supporté. Utilisez JPG, PNG, GIF ou WebP.'})
             
-            # Supprimer l'ancien avatar s'il existe
-            if profile.avatar and os.path.isfile(profile.avatar.path):
-                try:
-                    os.remove(profile.avatar.path)
-                except:
-                    pass
-            
-            # Générer un nom de fichier unique
-            filename = f'avatar_{request.user.id}_{uuid.uuid4().hex[:8]}.{avatar_file.name.split(".")[-1]}'
-            
-            # Sauvegarder le nouvel avatar
-            profile.avatar.save(filename, avatar_file, save=True)
+            path, digest = avatars.receive_upload(avatar_file)
+            if avatars.already_processed(digest):
+                # Image déjà connue : les tailles existent, aucun traitement
+                os.remove(path)
+                previous = profile.avatar.name
+                profile.avatar = avatars.avatar_name(digest, max(avatars.AVATAR_SIZES))
+                profile.avatar_status = 'ready'
+                profile.avatar_digest = digest
+                profile.save(update_fields=['avatar', 'avatar_status', 'avatar_digest'])
+                if previous != profile.avatar.name:
+                    avatars.discard_legacy_avatar(previous)
+            else:
+                # L'ancien avatar reste affiché jusqu'à la fin du traitement
+                profile.avatar_status = 'pending'
+                profile.avatar_digest = digest
+                profile.save(update_fields=['avatar_status', 'avatar_digest'])
+                run_in_background(avatars.process_avatar, profile.pk, path, digest)
             
         # Gérer les avatars par défaut
         elif 'default_avatar' in request.POST:
             default_avatar = request.POST.get('default_avatar')
             
-            # Supprimer l'ancien avatar s'il existe
-            if profile.avatar and os.path.isfile(profile.avatar.path):
-                try:
-                    os.remove(profile.avatar.path)
-                except:
-                    pass
+            # Supprimer l'ancien avatar s'il n'est pas partagé
+            avatars.discard_legacy_avatar(profile.avatar.name)
             
             # Définir l'avatar par défaut (stockage dans un champ séparé)
             profile.avatar = None
+            profile.avatar_status = 'ready'
+            profile.avatar_digest = ''
             # Si vous avez un champ default_avatar_type dans votre modèle UserProfile :
             # profile.default_avatar_type = default_avatar
             profile.save()
@@ -325,21 +518,34 @@ def update_avatar(request):
         else:
             return JsonResponse({'success': False, 'error': 'Aucune image fournie'})
         
-        # Rafraîchir l'objet profile
-        profile.refresh_from_db()
-        
-        # Construire l'URL de l'avatar
-        avatar_url = profile.avatar.url if profile.avatar else None
-        
         return JsonResponse({
             'success': True,
-            'avatar_url': avatar_url,
+            **_avatar_state(profile),
             'message': 'Photo de profil mise à jour avec succès'
         })
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def _avatar_state(profile):
+    """État du traitement de l'avatar et URLs par taille une fois prêt"""
+    state = {'status': profile.avatar_status}
+    if profile.avatar_status == 'pending':
+        state['status_url'] = reverse('avatar_status')
+    elif profile.avatar:
+        state['avatar_url'] = profile.avatar.url
+        state['avatar_urls'] = avatars.avatar_urls(profile.avatar)
+    else:
+        state['avatar_url'] = None
+    return state
+
+# État du traitement de l'avatar
+@login_required
+@require_safe
+def avatar_status(request):
+    """Suivi du traitement de l'avatar envoyé (interrogé par la page de profil)"""
+    return JsonResponse({'success': True, **_avatar_state(request.profile)})
+
 # Mise à jour du profil
 @login_required
 @require_POST
@@ -348,7 +554,7 @@ def update_profile(request):
     """Mettre à jour les informations du profil"""
     try:
         user = request.user
-        profile = get_or_create_profile(user)
+        profile = request.profile
         
         # Récupérer les données du formulaire
         username = request.POST.get('username', '').strip()
@@ -397,8 +603,15 @@ def update_profile(request):
 def remove_from_history(request, history_id):
     """Retirer un film de l'historique"""
     try:
-        history_item = get_object_or_404(WatchHistory, id=history_id, user_profile=request.user.profile)
-        history_item.delete()
+        history_item = get_object_or_404(WatchHistory, id=history_id, user_profile=request.profile)
+        # Avant la suppression : une position en attente ne doit pas recréer la ligne
+        progress_buffer.discard(history_item.user_profile_id, history_item.movie_id)
+        with transaction.atomic():
+            history_item.delete()
+            UserProfile.objects.filter(pk=history_item.user_profile_id).adjust_stats(
+                history_count=-1,
+                history_completed_count=-int(history_item.completed),
+            )
         
         return JsonResponse({
             'success': True,
@@ -411,48 +624,47 @@ def remove_from_history(request, history_id):
         })
 
 # Favoris (AJAX)
+@transaction.atomic
+def _toggle_favorite(profile, movie):
+    """Retire le film des favoris s'il y est, l'ajoute sinon. Retourne True s'il a été ajouté."""
+    removed, _ = Favorite.objects.filter(
+        user_profile=profile,
+        movie=movie
+    ).delete()
+    if not removed:
+        Favorite.objects.create(
+            user_profile=profile,
+            movie=movie
+        )
+    UserProfile.objects.filter(pk=profile.pk).adjust_stats(favorite_count=-removed if removed else 1)
+    return not removed
+
 @login_required
 @require_POST
 @csrf_exempt
-def toggle_favorite(request, movie_id):
+async def toggle_favorite(request, movie_id):
     try:
-        movie = get_object_or_404(Movie, pk=movie_id)
-        profile = get_or_create_profile(request.user)
+        movie = await aget_object_or_404(Movie, pk=movie_id)
+        profile = await aget_or_create_profile(await request.auser())
         
-        # Vérifier si le film est déjà en favori
-        favorite_exists = Favorite.objects.filter(
-            user_profile=profile,
-            movie=movie
-        ).exists()
-        
-        if favorite_exists:
-            # Retirer des favoris
-            Favorite.objects.filter(
-                user_profile=profile,
-                movie=movie
-            ).delete()
-            is_favorite = False
-            action = 'removed'
-            message = 'Film retiré des favoris'
-        else:
-            # Ajouter aux favoris
-            Favorite.objects.create(
-                user_profile=profile,
-                movie=movie
-            )
-            is_favorite = True
+        # Les transactions restent synchrones : le bloc atomique passe par un thread
+        is_favorite = await sync_to_async(_toggle_favorite)(profile, movie)
+        if is_favorite:
             action = 'added'
             message = 'Film ajouté aux favoris !'
+        else:
+            action = 'removed'
+            message = 'Film retiré des favoris'
         
-        # Compter les favoris
-        favorite_count = Favorite.objects.filter(user_profile=profile).count()
+        # Relire le compteur maintenu ci-dessus (une seule ligne)
+        await profile.arefresh_from_db(fields=['favorite_count'])
         
         return JsonResponse({
             'success': True,
             'action': action,
             'is_favorite': is_favorite,
             'message': message,
-            'favorite_count': favorite_count
+            'favorite_count': profile.favorite_count
         })
     except Exception as e:
         return JsonResponse({
@@ -462,8 +674,9 @@ def toggle_favorite(request, movie_id):
 
 # Vue pour récupérer les favoris (optionnel)
 @login_required
+@replica_reads
 def get_favorites(request):
-    profile = get_or_create_profile(request.user)
+    profile = request.profile
     
     # Récupérer les films favoris via Favorite
     favorites = Favorite.objects.filter(user_profile=profile).select_related('movie')
@@ -485,42 +698,52 @@ def get_favorites(request):
 @login_required
 @require_POST
 def clear_favorites(request):
-    profile = get_or_create_profile(request.user)
-    count = Favorite.objects.filter(user_profile=profile).count()
+    profile = request.profile
     
     # Supprimer tous les favoris
-    Favorite.objects.filter(user_profile=profile).delete()
+    with transaction.atomic():
+        count, _ = Favorite.objects.filter(user_profile=profile).delete()
+        UserProfile.objects.filter(pk=profile.pk).adjust_stats(favorite_count=-count)
     
     messages.success(request, f'Tous les favoris ont été supprimés ({count} films).')
     return redirect('profile')
 
 # Vues pour les commentaires et évaluations
+@transaction.atomic
+def _create_comment(profile, movie, content):
+    comment = Comment.objects.create(
+        user_profile=profile,
+        movie=movie,
+        content=content
+    )
+    UserProfile.objects.filter(pk=profile.pk).adjust_stats(comment_count=1)
+    return comment
+
 @login_required
 @require_POST
 @csrf_exempt
-def add_comment(request, movie_id):
+async def add_comment(request, movie_id):
     """Ajouter un commentaire"""
     try:
-        movie = get_object_or_404(Movie, pk=movie_id)
-        profile = get_or_create_profile(request.user)
+        movie = await aget_object_or_404(Movie, pk=movie_id)
+        user = await request.auser()
+        profile = await aget_or_create_profile(user)
         content = request.POST.get('content', '').strip()
         
         if not content:
             return JsonResponse({'success': False, 'error': 'Le commentaire ne peut pas être vide'})
         
-        comment = Comment.objects.create(
-            user_profile=profile,
-            movie=movie,
-            content=content
-        )
+        comment = await sync_to_async(_create_comment)(profile, movie, content)
+        # Compteur maintenu par les signaux de Comment (une seule ligne)
+        await movie.arefresh_from_db(fields=['comments_count'])
         
         return JsonResponse({
             'success': True,
             'comment_id': comment.id,
             'content': comment.content,
-            'username': request.user.username,
+            'username': user.username,
             'created_at': comment.created_at.strftime('%d/%m/%Y %H:%M'),
-            'comment_count': movie.comments.count()
+            'comment_count': movie.comment_count
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -528,11 +751,11 @@ def add_comment(request, movie_id):
 @login_required
 @require_POST
 @csrf_exempt
-def add_rating(request, movie_id):
+async def add_rating(request, movie_id):
     """Ajouter ou mettre à jour une évaluation"""
     try:
-        movie = get_object_or_404(Movie, pk=movie_id)
-        profile = get_or_create_profile(request.user)
+        movie = await aget_object_or_404(Movie, pk=movie_id)
+        profile = await aget_or_create_profile(await request.auser())
         score = int(request.POST.get('score', 5))
         
         # Valider le score
@@ -540,56 +763,80 @@ def add_rating(request, movie_id):
             return JsonResponse({'success': False, 'error': 'Le score doit être entre 1 et 5'})
         
         # Créer ou mettre à jour l'évaluation
-        rating, created = Rating.objects.update_or_create(
+        rating, created = await Rating.objects.aupdate_or_create(
             user_profile=profile,
             movie=movie,
             defaults={'score': score}
         )
         
-        # Recalculer la moyenne
-        ratings = movie.ratings.all()
-        if ratings.exists():
-            average = sum(r.score for r in ratings) / ratings.count()
-        else:
-            average = 0
+        # Relire les agrégats maintenus par les signaux (une seule ligne)
+        await movie.arefresh_from_db(fields=['ratings_sum', 'ratings_count'])
         
         return JsonResponse({
             'success': True,
             'created': created,
             'score': rating.score,
-            'average_rating': round(average, 1),
-            'rating_count': ratings.count(),
+            'average_rating': round(movie.average_rating, 1),
+            'rating_count': movie.rating_count,
             'user_rating': rating.score
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def _write_watch_history(profile, movie, duration, completed):
+    """Écriture immédiate de la progression. Retourne True si la ligne a été créée."""
+    try:
+        return _lock_and_write_watch_history(profile, movie, duration, completed)
+    except IntegrityError:
+        # Ligne créée entre-temps par une requête concurrente : elle est désormais verrouillable
+        return _lock_and_write_watch_history(profile, movie, duration, completed)
+
+@transaction.atomic
+def _lock_and_write_watch_history(profile, movie, duration, completed):
+    # Pas de get_or_create : son point de sauvegarde autour de l'INSERT coûte deux requêtes
+    history = WatchHistory.objects.select_for_update().filter(user_profile=profile, movie=movie).first()
+    if history is None:
+        WatchHistory.objects.create(
+            user_profile=profile,
+            movie=movie,
+            duration_watched=duration,
+            completed=completed
+        )
+        was_completed = None
+    else:
+        was_completed = history.completed
+        history.duration_watched = duration
+        history.completed = completed
+        history.save(update_fields=['duration_watched', 'completed', 'updated_at'])
+    UserProfile.objects.filter(pk=profile.pk).adjust_stats(
+        **WatchHistory.stats_changes(was_completed, completed)
+    )
+    return history is None
+
 @login_required
 @require_POST
 @csrf_exempt
-def add_to_watch_history(request, movie_id):
+async def add_to_watch_history(request, movie_id):
     """Ajouter un film à l'historique de visionnage"""
     try:
-        movie = get_object_or_404(Movie, pk=movie_id)
-        profile = get_or_create_profile(request.user)
+        movie = await aget_object_or_404(Movie, pk=movie_id)
+        profile = await aget_or_create_profile(await request.auser())
         completed = request.POST.get('completed', 'false').lower() == 'true'
         duration = int(request.POST.get('duration', 0))
         
-        # Créer ou mettre à jour l'historique
-        history, created = WatchHistory.objects.update_or_create(
-            user_profile=profile,
-            movie=movie,
-            defaults={
-                'duration_watched': duration,
-                'completed': completed
-            }
-        )
+        # Mettre à jour l'historique : écrit immédiatement ou regroupé par le tampon
+        if getattr(settings, 'FLIXORA_PROGRESS_BUFFER', True):
+            # Simple dépôt en mémoire : ne bloque pas la boucle d'événements
+            progress_buffer.record(profile.pk, movie.pk, duration, completed)
+            created = False
+        else:
+            created = await sync_to_async(_write_watch_history)(profile, movie, duration, completed)
         
         return JsonResponse({
             'success': True,
             'created': created,
             'movie_title': movie.title,
-            'completed': history.completed
+            'completed': completed
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -597,28 +844,38 @@ def add_to_watch_history(request, movie_id):
 @login_required
 def watch_history_view(request):
     """Page de l'historique de visionnage"""
-    profile = get_or_create_profile(request.user)
-    history = WatchHistory.objects.filter(user_profile=profile).order_by('-watched_at')
-    
-    # Calculer les statistiques
-    completed_count = history.filter(completed=True).count()
-    in_progress_count = history.filter(completed=False).count()
+    # Écrire les positions en attente de l'utilisateur pour afficher un historique à jour
+    progress_buffer.flush(request.profile.pk)
+    profile = refresh_stats(request.profile)
+    history = WatchHistory.objects.filter(user_profile=profile).select_related('movie').order_by('-watched_at')
     
+    # Statistiques lues sur le profil (dénormalisées)
     return render(request, 'movies/watch_history.html', {
         'profile': profile,
         'watch_history': history,
-        'history_count': history.count(),
-        'completed_count': completed_count,
-        'in_progress_count': in_progress_count,
+        'history_count': profile.history_count,
+        'completed_count': profile.history_completed_count,
+        'in_progress_count': profile.history_in_progress_count,
     })
 
 @login_required
 @require_POST
 def clear_watch_history(request):
     """Vider l'historique de visionnage"""
-    profile = get_or_create_profile(request.user)
-    count = WatchHistory.objects.filter(user_profile=profile).count()
-    WatchHistory.objects.filter(user_profile=profile).delete()
+    profile = request.profile
+    progress_buffer.discard(profile.pk)
+    history = WatchHistory.objects.filter(user_profile=profile)
+    with transaction.atomic():
+        removed = history.aggregate(
+            count=Count('id'),
+            completed=Count('id', filter=Q(completed=True)),
+        )
+        history.delete()
+        UserProfile.objects.filter(pk=profile.pk).adjust_stats(
+            history_count=-removed['count'],
+            history_completed_count=-removed['completed'],
+        )
+    count = removed['count']
     
     messages.success(request, f'Historique vidé ({count} films supprimés).')
     return redirect('watch_history')
@@ -627,16 +884,21 @@ def clear_watch_history(request):
 from django.http import JsonResponse
 
 @login_required
-def check_watch_history(request, movie_id):
+async def check_watch_history(request, movie_id):
     """Vérifier si un film est dans l'historique de l'utilisateur"""
     try:
-        movie = get_object_or_404(Movie, pk=movie_id)
-        profile = get_or_create_profile(request.user)
+        movie = await aget_object_or_404(Movie, pk=movie_id)
+        profile = await aget_or_create_profile(await request.auser())
         
-        history_item = WatchHistory.objects.filter(
+        history_item = await WatchHistory.objects.filter(
             user_profile=profile,
             movie=movie
-        ).first()
+        ).afirst()
+        
+        # Une position plus récente peut encore être dans le tampon d'écriture
+        pending = progress_buffer.pending(profile.pk, movie.pk)
+        if history_item and pending:
+            history_item.duration_watched, history_item.completed = pending
         
         if history_item:
             return JsonResponse({
@@ -645,6 +907,13 @@ def check_watch_history(request, movie_id):
                 'duration_watched': history_item.duration_watched,
                 'last_watched': history_item.watched_at.strftime('%d/%m/%Y %H:%M')
             })
+        elif pending:
+            return JsonResponse({
+                'in_history': True,
+                'completed': pending[1],
+                'duration_watched': pending[0],
+                'last_watched': None
+            })
         else:
             return JsonResponse({
                 'in_history': False
@@ -655,6 +924,43 @@ def check_watch_history(request, movie_id):
             'error': str(e)
         })
 
+@login_required
+@require_safe
+async def movie_status(request):
+    """
+    État de plusieurs films pour l'utilisateur (progression, favori, note) en un appel,
+    avec une requête SQL par relation : `?ids=1,2,3` (au plus STATUS_MAX_IDS films).
 
-
-
+    Réponse compacte : seuls les films ayant un état figurent, et seules les clés utiles :
+    {"success": true, "movies": {"12": {"p": 340, "c": false, "f": true, "r": 4}}}
+    p = secondes regardées, c = terminé, f = favori, r = note de l'utilisateur.
+    """
+    try:
+        movie_ids = {int(value) for value in request.GET.get('ids', '').split(',') if value.strip()}
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Identifiants de films invalides'}, status=400)
+    if len(movie_ids) > STATUS_MAX_IDS:
+        return JsonResponse(
+            {'success': False, 'error': f'Au plus {STATUS_MAX_IDS} films par requête'}, status=400
+        )
+    
+    status = defaultdict(dict)
+    user = await request.auser()
+    profile_id = await UserProfile.objects.filter(user_id=user.pk).values_list('pk', flat=True).afirst()
+    if movie_ids and profile_id is not None:
+        history = WatchHistory.objects.filter(user_profile_id=profile_id, movie_id__in=movie_ids)
+        async for movie_id, duration, completed in history.order_by().values_list('movie_id', 'duration_watched', 'completed'):
+            status[movie_id].update(p=duration, c=completed)
+        # Une position plus récente peut encore être dans le tampon d'écriture
+        for movie_id, (duration, completed) in progress_buffer.pending_many(profile_id, movie_ids).items():
+            status[movie_id].update(p=duration, c=completed)
+        
+        favorites = Favorite.objects.filter(user_profile_id=profile_id, movie_id__in=movie_ids)
+        async for movie_id in favorites.order_by().values_list('movie_id', flat=True):
+            status[movie_id]['f'] = True
+        
+        ratings = Rating.objects.filter(user_profile_id=profile_id, movie_id__in=movie_ids)
+        async for movie_id, score in ratings.values_list('movie_id', 'score'):
+            status[movie_id]['r'] = score
+    
+    return JsonResponse({'success': True, 'movies': status})